@@ -23,21 +23,31 @@
 # hub. The goal is to demonstrate AllStarLink functionaltion without
 # dependency on the Asterisk infrastructure.
 #
-import time
-import requests
+import asyncio
 import socket
 import random
-from enum import Enum
-import base64
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import serialization
-from scipy.signal import firwin, lfilter, lfilter_zi
+from time import perf_counter_ns
+from scipy.signal import firwin
 import numpy as np
-# TODO: THIS IS DEPRECATED AS OF PYTHON 3.13, NEED TO REPLACE
-import audioop
-import alsaaudio
-import struct 
+from dsp import Upsampler, Downsampler, SosFilter, make_s16_le
+from dsp import ASL_LPF_TAPS, ASL_LPF_SHIFT, ASL_HPF_B, ASL_HPF_A
+from iax2 import FrameHeader, FrameFormatError, parse_frame, find_information_element
+from iax2 import FRAME_TYPE_VOICE, FRAME_TYPE_IAX, IAX_NEW, IAX_PING, IAX_ACK, \
+    IAX_HANGUP, IAX_AUTHREP, IAX_LAGRQ, VOICE_ULAW, MINI_FRAME, FULL_HEADER_SIZE, \
+    IE_CALLTOKEN, IE_RSA_RESULT
+from iax2 import FrameBuilder
+from registration import Registrar
+from eventloop import EventLoop, AsyncioEventLoop
+from audio import AudioThread
+from mixer import ConferenceMixer
+from jitter import JitterBuffer
+from auth import Authenticator
+from hub import State, Call, CallTable
+from workers import fork_workers, call_number_range, make_reuseport_socket
+from mediaclock import monotonic_ms, monotonic_ms_int, TickScheduler
+from logger import Logger, parse_level
+from metrics import Histogram, MetricWriter, MetricsServer
+from audiodev import open_audio
 
 # ===========================================================================
 # USER CONFIGURATION AREA - PLEASE CUSTOMIZE HERE
@@ -46,8 +56,17 @@ import struct
 node_id = "61057"
 # Put in your node password here:
 node_password = "xxxxxx"
+# Where the radio's audio comes from and goes to: "alsa" (the sound card
+# named below), "null" (silence, for a conference of network callers only)
+# or "wav" (the files below)
+audio_backend = "alsa"
 # Name of ALSA audio device used for output
 audio_device_name = "default"
+# For the "wav" backend: a 48kHz 16-bit mono file that stands in for the
+# radio (it is played in a loop), and a file to record what the radio 
+# hears to
+audio_capture_file = "capture.wav"
+audio_play_file = "play.wav"
 # ===========================================================================
 
 # ===========================================================================
@@ -69,252 +88,173 @@ MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQCu3h0BZQQ+s5kNM64gKxZ5PCpQ\n\
 BUjdw8Vh6wPFmf3ozR6iDFcps4/+RkCUb+uc9v0BqZIzyIdpFC6dZnJuG5Prp7gJ\n\
 hUaYIFwQxTB3v1h+1QIDAQAB\n\
 -----END PUBLIC KEY-----\n"
+# TEST MODE ONLY: the path of a PEM public key to trust instead of the
+# AllStarLink key above, so that a local load generator can sign its own
+# calls (see net-test/loadgen-1.py). Leave this as None for normal use.
+test_public_key_file = None
 # Interval between registrations (in milliseconds)
 reg_interval_ms = 5 * 60 * 1000
+# How long a call can wait for its AUTHREP before it is dropped (in 
+# milliseconds)
+auth_timeout_ms = 10 * 1000
+# Number of worker processes used to check the RSA signatures of incoming 
+# calls, so that a burst of connects doesn't hold up the audio. Set to 0
+# to check them inline. Set auth_use_processes to False to use threads 
+# instead (lighter, but they compete with the audio for the GIL).
+auth_workers = 2
+auth_use_processes = True
+# The most parties (calls plus the local radio) in the conference
+max_conference_parties = 64
+# Limits on the playout delay of each call's jitter buffer (in 
+# milliseconds). Within these the delay follows the measured network 
+# jitter.
+jitter_min_delay_ms = 40
+jitter_max_delay_ms = 300
+# The most captured audio (in 20ms blocks) that can wait for the network.
+# This bounds the radio-to-network latency if the sound card clock runs
+# fast. The extra is removed by dropping the oldest blocks ("drop-oldest")
+# or by crossfading two blocks into one ("compress").
+capture_max_depth = 4
+capture_overflow_policy = "drop-oldest"
+# What the 20ms tick does when the loop falls more than a tick behind: 
+# "skip" the missed ticks, or "burst" to run up to tick_max_burst of them
+# back to back to catch up.
+tick_late_policy = "skip"
+tick_max_burst = 2
+# How often the tick timing and audio counters are logged (in 
+# milliseconds)
+status_interval_ms = 60 * 1000
+# The least important messages that are logged: "debug" (every frame 
+# sent and received, which is expensive on a busy hub), "info", "warning"
+# or "error".
+log_level = "info"
+# The most repeated warnings (like sequence errors) logged per second in
+# each category. The rest are counted but not shown.
+log_warning_rate = 2
+# Where the metrics (stage timings and per-call counters, in Prometheus
+# text format) are served: a (host, port) for HTTP or a path for a Unix
+# socket. With more than one worker, each worker adds its index to the 
+# port (or the path). Set to None to turn the endpoint off.
+metrics_address = ("127.0.0.1", 9169)
+# Set this to True to run the resampling filters with the integer 
+# coefficients and the >> 15 from chan_simpleusb.c. This is only for 
+# when the output has to match an ASL3 node sample for sample (e.g. when
+# comparing recordings). It is a little slower than the normal filters
+# and doesn't sound any better, so leave it off otherwise.
+resample_fixed_point = False
+# Set this to True to apply the 300Hz high-pass filter from chan_simpleusb.c
+# (hpass6) to the captured audio before it goes out to the network. This 
+# strips CTCSS tones and hum coming from the radio.
+capture_hpf_enabled = True
+# Set this to True to run the hub on an asyncio event loop (with the IAX2
+# socket served by an asyncio.DatagramProtocol) instead of the built-in
+# selector loop. Use this when other asyncio services need to share the
+# loop.
+use_asyncio = False
+# Number of worker processes. With more than one, a supervisor process
+# forks the workers and each of them binds the IAX2 port with 
+# SO_REUSEPORT. The kernel spreads the peers across the workers and each
+# worker owns the calls of the peers it is handed (see workers.py).
+# THIS IS ONLY A LOAD-TEST MODE. The workers don't share a conference: 
+# each worker only mixes its own calls, and only worker 0 opens the 
+# audio device and registers the node. Callers on different workers 
+# can't hear each other and callers on workers 1 and up can't hear the 
+# radio. More than one worker is refused unless workers_load_test is 
+# also set.
+workers = 1
+workers_load_test = False
 # ===========================================================================
 
-def is_full_frame(frame):
-    return frame[0] & 0b10000000 == 0b10000000
-
-def is_mini_voice_packet(frame):
-    return frame[0] & 0b10000000 == 0b00000000
-
-def get_full_source_call(frame):
-    return ((frame[0] & 0b01111111) << 8) | frame[1]
-
-def get_full_r_bit(frame):
-    return frame[2] & 0b10000000 == 0b10000000
-
-def get_full_dest_call(frame):
-    return ((frame[2] & 0b01111111) << 8) | frame[3]
-
-def get_full_timestamp(frame):
-    return (frame[4] << 24) | (frame[5] << 16) | (frame[6] << 8) | frame[7]
-
-def get_full_outseq(frame):
-    return frame[8]
-
-def get_full_inseq(frame):
-    return frame[9]
-
-def get_full_type(frame):
-    return frame[10]
-
-def get_full_subclass_c_bit(frame):
-    return frame[11] & 0b10000000 == 0b10000000
-
-def get_full_subclass(frame):
-    return frame[11] & 0b01111111
-
 def make_call_token():
     # TODO: RANDOMIZE
     return "1759883232?e4b9017e102c1f831e6db6ab1bc85ebce1ea240e".encode("utf-8")
 
-def make_information_element(id: int, content):
-    result = bytearray()
-    result += id.to_bytes(1, byteorder='big')
-    result += len(content).to_bytes(1, byteorder='big')
-    result += content
-    return result
-
-def encode_information_elements(ie_map: dict): 
-    result = bytearray()
-    for key in ie_map.keys():
-        if not isinstance(key, int):
-            raise Exception("Type error")
-        result += make_information_element(key, ie_map[key])
-    return result
-
-def decode_information_elements(data: bytes):
-    """
-    Takes a byte array containing zero or more information elements
-    and unpacks it into a dictionary. The key of the dictionary is 
-    the integer element ID and the value of the dictionary is a byte
-    array with the content of the element.
-    """
-    result = dict()
-    state = 0
-    working_id = 0
-    working_length = 0
-    working_data = None
-    # Cycle across all data
-    for b in data:
-        if state == 0:
-            working_id = b
-            state = 1
-        elif state == 1:
-            working_length = b 
-            working_data = bytearray()
-            if working_length == 0:
-                result[working_id] = working_data
-                state = 0
-            else:
-                state = 2
-        elif state == 2:
-            working_data.append(b)
-            if len(working_data) == working_length:
-                result[working_id] = working_data
-                state = 0
-        else:
-            raise Exception()
-    # Sanity check - we should end in the zero state
-    if state != 0:
-        raise Exception("Data format error")
-    return result
-
-def is_NEW_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 1
-
-def is_ACK_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 4
-
-def is_HANGUP_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 5
-
-def is_LAGRQ_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 11
-
-def is_PING_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 2
-
-def is_VOICE_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 2 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 4
-
-def make_frame_header(source_call: int, dest_call: int, timestamp: int, 
-    out_seq: int, in_seq: int, frame_type: int, frame_subclass: int):
-    result = bytearray()
-    result += source_call.to_bytes(2, byteorder='big')
-    result[0] = result[0] | 0b10000000
-    result += dest_call.to_bytes(2, byteorder='big')
-    result[2] = result[2] & 0b01111111
-    result += timestamp.to_bytes(4, byteorder='big')
-    result += out_seq.to_bytes(1, byteorder='big')
-    result += in_seq.to_bytes(1, byteorder='big')
-    # Type
-    result += int(frame_type).to_bytes(1, byteorder='big')
-    # Subclass
-    result += int(frame_subclass).to_bytes(1, byteorder='big')
-    return result
-
-def make_CALLTOKEN_frame(source_call: int, dest_call: int, timestamp: int, 
-    out_seq: int, in_seq: int, token):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 40)
-    result += encode_information_elements({ 54: token })
-    return result
-
-def make_ACK_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 4)
-    return result
-
-def make_AUTHREQ_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int, challenge: str):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 8)
-    # Information elements
-    result += encode_information_elements({ 
-        14: int(4).to_bytes(2, byteorder='big'),
-        15: challenge.encode("utf-8"), 
-        6: "allstar-sys".encode("utf-8") 
-    })
-    return result
-
-def make_ACCEPT_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 7)
-    # Information elements
-    result += encode_information_elements({ 
-        9: int(4).to_bytes(4, byteorder='big'),
-        56: b'\x00\x00\x00\x00\x00\x00\x00\x00\x04'
-    })
-    return result
-
-def make_RINGING_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 4, 3)
-
-def make_ANSWER_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 4, 4)
-
-def make_STOP_SOUNDS_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 4, 255)
-
-def make_LAGRP_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 6, 12)
-
-def make_PONG_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 6, 3)
-
-def make_VOICE_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int, audio_block: bytes):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        2, 4)
-    result += audio_block
-    return result
-
-def make_VOICE_miniframe(source_call: int, timestamp: int, audio_data: bytes):
-    result = bytearray()
-    result += source_call.to_bytes(2, byteorder='big')
-    # Make sure the top bit is zero (indicates mini-frame)
-    result[0] = result[0] & 0b01111111
-    # Per RFC 5456 section 8.1.2: the timestamp on a mini-frame is 
-    # just the lower 16 bits
-    full_32bit_stamp = timestamp.to_bytes(4, byteorder='big')
-    result.append(full_32bit_stamp[2])
-    result.append(full_32bit_stamp[3])
-    result += audio_data
-    return result
-
-def encode_ulaw(pcm_data):
-    # TODO: REMOVE DEPENDENCY ON THIS DEPRECATED LIBRARY
-    return audioop.lin2ulaw(pcm_data, 2)
-
-def decode_ulaw(g711_data: bytes):
-    # TODO: REMOVE DEPENDENCY ON THIS DEPRECATED LIBRARY
-    # Testing has shown that this created little-endian integers
-    b = audioop.ulaw2lin(g711_data, 2)
-    return struct.unpack(f'<{160}h', b)
-
+# Everything runs on the monotonic media clock so that a change to the 
+# wall clock can't disturb the timers or the IAX2 timestamps
 def current_ms():
-    return int(time.time() * 1000)
+    return monotonic_ms_int()
 
 def current_ms_frac():
-    return time.time() * 1000
-
-public_key = serialization.load_pem_public_key(public_key_pem.encode("utf-8"))
-
-# ALSA audio hardware setup
+    return monotonic_ms()
+
+if workers > 1 and not workers_load_test:
+    raise Exception("workers > 1 splits the conference between the workers, " +
+        "set workers_load_test to run it anyway")
+
+# The workers are forked before anything else is opened
+worker_index = fork_workers(workers) if workers > 1 else 0
+
+# Messages are queued here and written out by a background thread. The
+# thread isn't started until the signature checking processes have been
+# forked (see below).
+log = Logger(parse_level(log_level))
+log.limit("seq", log_warning_rate)
+log.limit("ignored", log_warning_rate)
+log.limit("malformed", log_warning_rate)
+log.limit("voice", log_warning_rate)
+log.limit("audio", log_warning_rate)
+
+# Timing of each stage of the audio path (see metrics.py). The device 
+# reads and writes are timed by the audio thread.
+stage_recvfrom = Histogram("hub_stage_recvfrom_seconds", 
+    "Time to read one datagram from the socket")
+stage_parse = Histogram("hub_stage_parse_seconds", "Time to decode one frame header")
+stage_decode = Histogram("hub_stage_decode_seconds",
+    "Time to take a call's next frame out of its jitter buffer and decode the u-law")
+stage_upsample = Histogram("hub_stage_upsample_seconds", 
+    "Time to upsample the radio's mix from 8K to 48K")
+stage_s16le = Histogram("hub_stage_make_s16_le_seconds",
+    "Time to convert the radio's mix to S16_LE in the playback ring")
+stage_downsample = Histogram("hub_stage_downsample_seconds",
+    "Time to downsample a captured block from 48K to 8K")
+stage_mix = Histogram("hub_stage_mix_seconds", 
+    "Time to mix the conference and u-law encode everyone's mix")
+stage_build = Histogram("hub_stage_frame_build_seconds", 
+    "Time to build one outbound voice frame")
+stage_sendto = Histogram("hub_stage_sendto_seconds", "Time to send one outbound frame")
+stage_tick = Histogram("hub_stage_tick_seconds", "Time for all of the work of one tick")
+stages = (stage_recvfrom, stage_parse, stage_decode, stage_upsample, stage_s16le,
+    stage_downsample, stage_mix, stage_build, stage_sendto, stage_tick)
+
+# Logs an outbound full frame. The frame buffer is reused, so it is 
+# copied.
+def log_sent(name: str, call: Call, resp):
+    log.debug("tx", "Sending " + name, call=call.local_call, frame=bytes(resp),
+        outseq=call.outseq, inseq=call.expected_inseq)
+
+# Sends a frame to a call's peer
+def send_frame(call: Call, resp):
+    call.tx_packets += 1
+    call.tx_bytes += len(resp)
+    net.sendto(resp, call.addr)
+
+# The signature checking processes (if any) are forked next. The event 
+# loop is attached once it exists.
+if test_public_key_file is not None:
+    with open(test_public_key_file) as f:
+        public_key_pem = f.read()
+    log.warning("auth", "TEST MODE: trusting the key in", file=test_public_key_file)
+authenticator = Authenticator(public_key_pem.encode("utf-8"), None, auth_workers,
+    auth_use_processes, log)
+# No threads may be running when the processes are forked, so the logger
+# only starts now. Anything logged before this is held in its ring.
+log.start()
+
+# Audio hardware setup (see audiodev.py for the backends)
 # Note everything here runs at 48kHz. One block is 960 samples.
-audio_device_play = alsaaudio.PCM(channels=1, rate=48000, format=alsaaudio.PCM_FORMAT_S16_LE, 
-    periodsize=160*6, device=audio_device_name)
-audio_device_capture = alsaaudio.PCM(alsaaudio.PCM_CAPTURE, alsaaudio.PCM_NONBLOCK,
-    channels=1, rate=48000, format=alsaaudio.PCM_FORMAT_S16_LE, 
-    periodsize=160*6, device=audio_device_name)
+# Both devices are blocking since they are only used from the audio 
+# thread, which exchanges 20ms blocks with the event loop through rings.
+# The devices aren't opened until the audio thread is started.
+def open_audio_devices():
+    return open_audio(audio_backend, 160 * 6, 48000, audio_device_name,
+        audio_capture_file, audio_play_file)
+
+if worker_index == 0:
+    audio_thread = AudioThread(None, None, 160 * 6,
+        capture_max_depth=capture_max_depth, capture_policy=capture_overflow_policy,
+        open_devices=open_audio_devices, log=log)
+else:
+    audio_thread = None
 
 # FIR filter used for resampling
 # Please see https://mackinnon.info/2025/10/24/asl-usb-audio.html
@@ -328,78 +268,56 @@ lpf_beta = 3.0
 # Use a Kaiser window to create a lowpass FIR filter:
 lpf_taps = firwin(lpf_N, lpf_cutoff_hz / nyq_rate, window=('kaiser', lpf_beta))
 
-# The zi object is used to maintain the state inside of the
-# FIR since we are applying data one block at a time. State is important
-# to maintain continuity between blocks.
-us_lpf_zi = lfilter_zi(lpf_taps, [1])
+# The capture side can run the 8K output of the decimator through the
+# high-pass filter in the same step.
+capture_hpf = SosFilter(ASL_HPF_B, ASL_HPF_A) if capture_hpf_enabled else None
+
+# Polyphase resamplers, one per direction. Each one holds the filter 
+# history between blocks. State is important to maintain continuity 
+# between blocks.
+if resample_fixed_point:
+    play_upsampler = Upsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT)
+    capture_downsampler = Downsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT, capture_hpf)
+else:
+    play_upsampler = Upsampler(lpf_taps, 6)
+    capture_downsampler = Downsampler(lpf_taps, 6, post_filter=capture_hpf)
 
 # Changes 8K audio to 48K audio
 def upsample(pcm_data_8k):
-    global us_lpf_zi
-    pcm_data_48k = []
-    # First do the 1:6 expansion
-    for s in pcm_data_8k:
-        for i in range(0,6):
-            pcm_data_48k.append(s)
-    # Apply the LPF to the expanded data to prevent aliasing
-    # NOTE: zi is being passed around each time to maintain state
-    pcm_data_48k, us_lpf_zi = lfilter(lpf_taps, [1.0], pcm_data_48k, zi=us_lpf_zi)
-    return pcm_data_48k
-
-# The zi object is used to maintain the state inside of the
-# FIR since we are applying data one block at a time.
-ds_lpf_zi = lfilter_zi(lpf_taps, [1])
+    return play_upsampler.process(pcm_data_8k)
 
 # Changes 48K audio to 8K audio
-# TODO: Use a more efficient decimation filter
 def downsample(pcm_data_48k):
-    global ds_lpf_zi
-    # Apply the LPF to the expanded data to prevent aliasing
-    # NOTE: zi is being passed around each time to maintain state
-    pcm_data_48k, ds_lpf_zi = lfilter(lpf_taps, [1.0], pcm_data_48k, zi=ds_lpf_zi)
-    pcm_data_8k = []
-    # Do the 6:1 decimation
-    i = 0
-    for j in range(0, 160):
-        pcm_data_8k.append(pcm_data_48k[i])
-        i += 6
-    return pcm_data_8k
-
-# TODO: Look at struct.pack()
-def make_s16_le(data):
-    result = bytearray()
-    for d in data:
-        i = int(d) 
-        low = i & 0xff
-        high = (i >> 8) & 0xff
-        result.append(low)
-        result.append(high)
-    return result
-
-call_id_counter = 1
-last_reg_ms = 0
-first_tick_ms = current_ms()
-tick_counter = 0
-
-class State(Enum):
-    IDLE = 1
-    NEW1 = 2 
-    NEW2 = 3
-    RINGING = 4
-    IN_CALL = 5
-
-state = State.IDLE
-state_source_call_id = 0
-state_call_id = 0
-state_call_start_ms = 0
-state_call_start_stamp = 0
-state_challenge = ""
-state_expected_inseq = 0
-state_outseq = 0
-state_voice_sent_count = 0
-
-# Audio packets received
-audio_capture_queue = []
+    return capture_downsampler.process(pcm_data_48k)
+
+# Preallocated S16_LE buffer for the captured audio on its way to the 
+# conference mixer. The playback audio is built directly in the audio 
+# thread's ring.
+audio_capture_buffer = np.zeros(160, dtype='<i2')
+
+# Everyone in the conference (the calls and the local radio) hears 
+# everyone else. The radio is a party if this process has the audio 
+# device.
+mixer = ConferenceMixer(max_conference_parties)
+radio_slot = mixer.join() if audio_thread is not None else None
+
+# Queues a block of 8K audio for the audio thread to play
+def play_pcm(pcm_audio_8k):
+    start_ns = perf_counter_ns()
+    pcm_audio_48k = upsample(pcm_audio_8k)
+    start_ns = stage_upsample.since(start_ns)
+    block = audio_thread.play_ring.write_block()
+    if block is None:
+        log.warning("audio", "Playback overrun")
+    else:
+        make_s16_le(pcm_audio_48k, block)
+        stage_s16le.since(start_ns)
+        audio_thread.play_ring.commit()
+
+# All of the active calls. Each worker hands out call numbers from its
+# own range.
+first_call, last_call = call_number_range(worker_index, workers)
+calls = CallTable(first_call=first_call, last_call=last_call)
 
 # Structures used for communicating with the registration server
 reg_node_msg = {
@@ -417,395 +335,596 @@ reg_msg = {
 }
 reg_msg["data"]["nodes"][node_id] = reg_node_msg
 
-# Create a UDP socket and bind 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, iax2_port))
-# This prevents the recvfrom() call below from blocking forever. 
-sock.setblocking(False)
+# Create a UDP socket and bind. The event loop tells us when there is 
+# something to read, but the socket is drained until it would block.
+if workers > 1:
+    sock = make_reuseport_socket(UDP_IP, iax2_port)
+else:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((UDP_IP, iax2_port))
+    sock.setblocking(False)
 
-print(f"Listening on IAX2 port {UDP_IP}:{iax2_port}")
+# Outbound frames go through net. This is the socket itself, or the 
+# asyncio transport when running under asyncio.
+net = sock
 
-# ---- Main event loop -----------------------------------------------------
+log.info("net", "Listening on IAX2 port", worker=worker_index, ip=UDP_IP, port=iax2_port)
 
-while True:
-
-    # A tick cycle happens every 20ms. There are some special activities
-    # that can happen in a tick cycle.
-    is_tick_cycle = False
-    now = current_ms_frac()
-    if now >= first_tick_ms + tick_counter * 20:
-        is_tick_cycle = True
-        tick_counter += 1
-
-    # Pull in local audio no matter what (non-blocking) to keep the hardware
-    # queues clear.
-    audio_in_l, audio_in_data = audio_device_capture.read()
-    # If we are in a call this audio packet is queued for later delivery to 
-    # the network.
-    if state == State.IN_CALL:
-        if audio_in_l > 0:
-            audio_capture_queue.append(audio_in_data)
-
-    # Process any timer-based activity
-
-    # Periodically register the node so that other peers known where to find us
-    if (current_ms() - last_reg_ms) > reg_interval_ms:
-        reg_response = requests.post(reg_url, json=reg_msg)
-        print("Registration response:", reg_response.text)
-        last_reg_ms = current_ms()
-
-    if state == State.RINGING:
-
-        # Look for timeout on the ringer
-        if current_ms() > state_timeout:
-
-            resp = make_ANSWER_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending ANSWER", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            state_outseq += 1
-
-            resp = make_STOP_SOUNDS_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending STOP_SOUNDS", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            state_outseq += 1
-
-            state = State.IN_CALL
-
-    # If we are in an active call and there is audio waiting to be delievered out
-    # to the network then send it now.
-    if state == State.IN_CALL:
-
-        # TODO: CONFIGURABLE DEPTH BEFORE WE ALLOW SERVICING?
-        if is_tick_cycle and len(audio_capture_queue) > 0:
-            # Pull the oldest auto block
-            audio_in_data = audio_capture_queue.pop(0)
-            assert(len(audio_in_data) == 160 * 6 * 2)
-            # Convert the data into PCM numbers. The hardware
-            # is running at 48K so there are 160 * 6 samples.
-            # The audio device uses little-endian.
-            audio_in_pcm_48k = struct.unpack(f'<{960}h', audio_in_data)
-            # Downsample 48k->8k
-            audio_in_pcm_8k = downsample(audio_in_pcm_48k)
-            assert(len(audio_in_pcm_8k) == 160)
-            # Convert from numbers into S16_LE format
-            audio_in_s16le_8k = make_s16_le(audio_in_pcm_8k)
-            assert(len(audio_in_s16le_8k) == 160 * 2)
-            # Convert to G711 format
-            audio_in_ulaw = encode_ulaw(audio_in_s16le_8k)
-            assert(len(audio_in_ulaw) == 160)
-
-            # TODO: THIS LOGIC NEEDS TO BE IMPROVED. THE FULL VOICE
-            # FRAME SHOULD BE SENT WHENEVER THE 16-BIT TIMESTAMP ROLLS.
-            if state_voice_sent_count == 0:
-                # For the first audio frame, make a full voice frame. 
-                resp = make_VOICE_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq,
-                    audio_in_ulaw)
-                print("Sending VOICE", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                state_outseq += 1
-            # After the first we can use mini-frames.
-            else:
-                resp = make_VOICE_miniframe(state_call_id, 
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    audio_in_ulaw)
-                sock.sendto(resp, addr)
-
-            state_voice_sent_count += 1
+# ---- Frame handlers ------------------------------------------------------
+#
+# Each received frame is dispatched to one of these based on its
+# (frame type, subclass). The header has already been decoded, the
+# frame has been matched up with its call and the generic sequence
+# number tracking has been done. Frames are built with the shared frame
+# builder (tx), which is handed the call numbers with every frame. The 
+# call is None only for a NEW that doesn't belong to an existing call.
+
+# When an ACK is processed there's nothing left to do with it
+def on_ACK(call: Call, hdr: FrameHeader, frame, addr):
+    pass
+
+# Deal with LAGRQ messages by sending a LAGRP
+def on_LAGRQ(call: Call, hdr: FrameHeader, frame, addr):
+    resp = tx.lagrp(call.local_call, call.remote_call, hdr.timestamp, 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("LAGRP", call, resp)
+    call.outseq += 1
+    send_frame(call, resp)
+
+# Deal with PING messages by sending a PONG
+def on_PING(call: Call, hdr: FrameHeader, frame, addr):
+    resp = tx.pong(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("PONG", call, resp)
+    call.outseq += 1
+    send_frame(call, resp)
+
+def on_NEW(call: Call, hdr: FrameHeader, frame, addr):
+
+    # A retransmission of the NEW for a call that is already underway
+    if call is not None:
+        log.warning("ignored", "Ignoring unknown message", call=call.local_call, 
+            state=call.state)
+        return
+
+    # Pull out the token (no need to decode the other elements)
+    token = find_information_element(frame, IE_CALLTOKEN, FULL_HEADER_SIZE)
+
+    # The first NEW has no token so send a CALLTOKEN challenge. Nothing
+    # is stored until the peer comes back with the right token, so a 
+    # flood of NEWs can't fill up the call table.
+    if token is None:
+        # NOTE: The call ID is set to 1 until the call is created. The 
+        # NEW always resets the sequence numbers.
+        resp = tx.calltoken(1, hdr.source_call, hdr.timestamp, 0, 1, make_call_token())
+        if log.debug_on:
+            log.debug("tx", "Sending CALLTOKEN", frame=bytes(resp), addr=addr)
+        net.sendto(resp, addr)
+        return
+
+    # Make sure we have the right token
+    if token != make_call_token():
+        log.warning("auth", "Invalid token", addr=addr)
+        return
+
+    # Generate the unique ID for this call
+    call = calls.create(hdr.source_call, addr, hdr.timestamp, current_ms())
+    if call is None:
+        log.warning("call", "Call table full", addr=addr)
+        return
+    # When a NEW is received the inbound sequence counter is reset.
+    call.expected_inseq = 1
+    call.outseq = 0
+    # Generate the authentication challenge data
+    call.challenge = "{:09d}".format(random.randint(1,999999999))
+
+    log.info("call", "Starting call", call=call.local_call, addr=addr)
+
+    # Send ACK
+    resp = tx.ack(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ACK", call, resp)
+    send_frame(call, resp)
+    # IMPORTANT: We don't move the outseq forward!
+
+    # Send AUTHREQ
+    resp = tx.authreq(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq, call.challenge)
+    if log.debug_on:
+        log_sent("AUTHREQ", call, resp)
+    send_frame(call, resp)
+    call.outseq += 1                
+    call.state = State.NEW2
+    # Give up on the call if the AUTHREP never comes
+    call.timer = loop.call_later(auth_timeout_ms, lambda: on_auth_timeout(call))
+
+# In this state we are waiting for an AUTHREP
+def on_AUTHREP(call: Call, hdr: FrameHeader, frame, addr):
+
+    if call.state != State.NEW2:
+        log.warning("ignored", "Ignoring unknown message", call=call.local_call, 
+            state=call.state)
+        return
+
+    # Pull out the signed challenge 
+    rsa_result = find_information_element(frame, IE_RSA_RESULT, FULL_HEADER_SIZE)
+
+    if hdr.dest_call == call.local_call and rsa_result is not None:
+        # Here is where the actual validation happens. The call is parked
+        # until the result comes back.
+        call.state = State.AUTHENTICATING
+        authenticator.verify(bytes(rsa_result), call.challenge, 
+            lambda ok: on_auth_result(call, ok))
+    else:
+        log.warning("auth", "AUTHREP error", call=call.local_call)
+
+# Called on the loop once the AUTHREP signature has been checked
+def on_auth_result(call: Call, ok: bool):
+
+    # The call may have hung up or timed out in the meantime
+    if call.state != State.AUTHENTICATING:
+        return
+
+    if not ok:
+        log.warning("auth", "Authentication failed", call=call.local_call)
+        calls.remove(call)
+        return
+
+    log.info("auth", "Authenticated", call=call.local_call)
+    call.timer.cancel()
+
+    # Send ACK
+    resp = tx.ack(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ACK", call, resp)
+    send_frame(call, resp)
+    # IMPORTANT: We don't move the outseq forward!
+
+    # Send the ACCEPT
+    resp = tx.accept(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ACCEPT", call, resp)
+    send_frame(call, resp)
+    call.outseq += 1
+
+    # Send the RINGING
+    resp = tx.ringing(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("RINGING", call, resp)
+    send_frame(call, resp)
+    call.outseq += 1
+
+    call.state = State.RINGING
+    # Join the conference
+    call.mixer_slot = mixer.join()
+    if call.mixer_slot is None:
+        log.warning("call", "Conference full, call has no audio", call=call.local_call)
+    else:
+        call.jitter_buffer = JitterBuffer(min_delay_ms=jitter_min_delay_ms,
+            max_delay_ms=jitter_max_delay_ms)
+    # Answer after 2 seconds of ringing
+    call.timer = loop.call_later(2000, lambda: on_ring_timeout(call))
+
+# The peer can hang up at any point once the call exists
+def on_HANGUP(call: Call, hdr: FrameHeader, frame, addr):
+
+    resp = tx.ack(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ACK", call, resp)
+    send_frame(call, resp)
+    # IMPORTANT: We don't move the outseq forward!
+
+    log.info("call", "Hangup", call=call.local_call)
+    if call.mixer_slot is not None:
+        mixer.leave(call.mixer_slot)
+        call.mixer_slot = None
+        call.jitter_buffer = None
+    calls.remove(call)
+
+def on_VOICE(call: Call, hdr: FrameHeader, frame, addr):
+
+    if call.state != State.RINGING and call.state != State.IN_CALL:
+        log.warning("ignored", "Ignoring unknown message", call=call.local_call, 
+            state=call.state)
+        return
+
+    # Send ACK
+    resp = tx.ack(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ACK", call, resp)
+    send_frame(call, resp)
+    # IMPORTANT: We don't move the outseq forward!
+
+    receive_voice(call, hdr.timestamp, frame[12:])
+
+def on_mini_voice(call: Call, hdr: FrameHeader, frame, addr):
+
+    if call.state != State.RINGING and call.state != State.IN_CALL:
+        log.warning("ignored", "Ignoring unknown message", call=call.local_call, 
+            state=call.state)
+        return
+
+    if call.jitter_buffer is None:
+        return
+    # Mini-frames only carry the bottom 16 bits of the timestamp. They
+    # can't be placed until a full voice frame has been seen.
+    timestamp = call.jitter_buffer.extend(hdr.timestamp)
+    if timestamp is None:
+        return
+    receive_voice(call, timestamp, frame[4:])
+
+# The audio is held in the call's jitter buffer, ordered by its 
+# timestamp, until it is due to be played into the conference
+def receive_voice(call: Call, timestamp: int, g711_audio):
+    if call.jitter_buffer is None:
+        return
+    if len(g711_audio) != 160:
+        log.warning("voice", "Unexpected voice block size", call=call.local_call,
+            size=len(g711_audio))
+        return
+    call.jitter_buffer.put(timestamp, g711_audio, current_ms_frac())
+
+NEW_KEY = (FRAME_TYPE_IAX, IAX_NEW)
+ACK_KEY = (FRAME_TYPE_IAX, IAX_ACK)
+
+frame_handlers = {
+    NEW_KEY: on_NEW,
+    ACK_KEY: on_ACK,
+    (FRAME_TYPE_IAX, IAX_LAGRQ): on_LAGRQ,
+    (FRAME_TYPE_IAX, IAX_PING): on_PING,
+    (FRAME_TYPE_IAX, IAX_AUTHREP): on_AUTHREP,
+    (FRAME_TYPE_IAX, IAX_HANGUP): on_HANGUP,
+    (FRAME_TYPE_VOICE, VOICE_ULAW): on_VOICE,
+    MINI_FRAME: on_mini_voice
+}
 
-    # Look for new network messages from the peer (non-blocking)
+# Reused for every received frame
+rx_hdr = FrameHeader()
+# Reused for every transmitted frame. Each build is given the call 
+# numbers, so a frame can't go out with another call's numbers.
+tx = FrameBuilder()
+
+# ---- Event handlers ------------------------------------------------------
+
+# Called when the UDP socket is readable
+def on_network_readable():
+    # Drain everything that is waiting
+    while True:
+        start_ns = perf_counter_ns()
+        try:
+            frame, addr = sock.recvfrom(1024)
+        except BlockingIOError:
+            return
+        stage_recvfrom.since(start_ns)
+        process_frame(frame, addr)
+
+def process_frame(frame, addr):
+
+    # Decode the header once. Everything below works from this.
+    start_ns = perf_counter_ns()
     try:
-        frame, addr = sock.recvfrom(1024)
-    except BlockingIOError:
-        continue
+        hdr = parse_frame(frame, rx_hdr)
+    except FrameFormatError as ex:
+        log.warning("malformed", "Malformed frame", addr=addr, error=ex)
+        return
+    stage_parse.since(start_ns)
+
+    # Both full frames and mini-frames carry the sender's call number,
+    # which together with the address identifies the call.
+    call = calls.find_peer(addr, hdr.source_call)
+    if call is not None:
+        call.rx_packets += 1
+        call.rx_bytes += len(frame)
 
     # Generic processing of full frames (regardless of state)
-    if is_full_frame(frame):
-
-        print("---------------------------------------")
-        if is_ACK_frame(frame):
-            print(f"ACK from {addr}")
-        elif is_NEW_frame(frame):
-            print(f"NEW from {addr}")
-        else:    
-            print(f"Full Frame from {addr}")        
-        print("R", get_full_r_bit(frame), "Source", get_full_source_call(frame), "Dest", get_full_dest_call(frame))
-        print("Oseqno", get_full_outseq(frame), "Iseqno", get_full_inseq(frame))
-        print("Type", get_full_type(frame), "Subclass", get_full_subclass(frame))
+    if hdr.full:
 
-        # ---------------------------------------------------------------------
-        # Deal with the inbound sequence number tracking
+        if log.debug_on:
+            log.debug("rx", "Full frame", addr=addr, r=hdr.r_bit, 
+                source=hdr.source_call, dest=hdr.dest_call, outseq=hdr.outseq, 
+                inseq=hdr.inseq, type=hdr.frame_type, subclass=hdr.subclass)
 
-        # When a NEW is received the inbound sequence counter is reset.
-        if is_NEW_frame(frame):
-            state_expected_inseq = 1
-            state_outseq = 0
+        # ---------------------------------------------------------------------
+        # Deal with the inbound sequence number tracking. The sequence 
+        # numbers for a new call are set up by on_NEW().
 
         # When an ACK is received we can validate its OSeqno, but we don't move 
         # the expectation forward since the sender isn't incrementing their sequence
         # for an ACK.
-        elif is_ACK_frame(frame):
-            if not get_full_r_bit(frame):
-                if  get_full_outseq(frame) != state_expected_inseq:
-                    print("WARNING: Inbound sequence error")
+        if call is None or hdr.key == NEW_KEY:
+            pass
+        elif hdr.key == ACK_KEY:
+            if not hdr.r_bit:
+                if hdr.outseq != call.expected_inseq:
+                    call.seq_errors += 1
+                    log.warning("seq", "Inbound sequence error", call=call.local_call,
+                        got=hdr.outseq, expected=call.expected_inseq)
 
         # For all other frames we validate the sequence number
         # and then move our expectation forward.
         else:
-            if not get_full_r_bit(frame):
-                if  get_full_outseq(frame) != state_expected_inseq:
-                    print("WARNING: Inbound sequence error")
+            if not hdr.r_bit:
+                if hdr.outseq != call.expected_inseq:
+                    call.seq_errors += 1
+                    log.warning("seq", "Inbound sequence error", call=call.local_call,
+                        got=hdr.outseq, expected=call.expected_inseq)
                 # Pay attention to wrap
-                state_expected_inseq = (get_full_outseq(frame) + 1) % 256
-
-    # ---------------------------------------------------------------------
-    # State-independent message processing
-
-    # When an ACK is processed there's nothing left to do with it
-    if is_ACK_frame(frame):
-        continue
-
-    # Deal with LAGRQ messages by sending a LAGRP
-    elif is_LAGRQ_frame(frame):
-        resp = make_LAGRP_frame(state_call_id, 
-            state_source_call_id,
-            get_full_timestamp(frame),
-            state_outseq, 
-            state_expected_inseq)                
-        print("Sending LAGRP", resp, state_outseq, state_expected_inseq)
-        state_outseq += 1
-        sock.sendto(resp, addr)
-        # Nothing left to do with this
-        continue
-
-    # Deal with PING messages by sending a PONG
-    elif is_PING_frame(frame):
-        resp = make_PONG_frame(state_call_id, 
-            state_source_call_id,
-            state_call_start_ms + (current_ms() - state_call_start_stamp),
-            state_outseq, 
-            state_expected_inseq)                
-        print("Sending PONG", resp, state_outseq, state_expected_inseq)
-        state_outseq += 1
-        sock.sendto(resp, addr)
-        # Nothing left to do with this
-        continue
+                call.expected_inseq = (hdr.outseq + 1) % 256
 
     # ---------------------------------------------------------------------
-    # State-dependent message processing
-  
-    if state == State.IDLE:
-        if is_NEW_frame(frame):
-            # Get call start information
-            state_source_call_id = get_full_source_call(frame)
-            state_call_start_stamp = current_ms()
-            state_call_start_ms = get_full_timestamp(frame)
-            state_voice_sent_count = 0
-            # Send a CALLTOKEN challenge
-            state_token = make_call_token()
-            # NOTE: For now the call ID is set to 1
-            resp = make_CALLTOKEN_frame(1, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq,                
-                state_token)
-            print("Sending CALLTOKEN", resp, state_outseq, state_expected_inseq)
-            state_outseq += 1
-            sock.sendto(resp, addr)
-            state = State.NEW1
+    # Hand the frame off to its handler
+    handler = frame_handlers.get(hdr.key)
+    if handler is None:
+        log.warning("ignored", "Ignoring unknown message", type=hdr.frame_type,
+            subclass=hdr.subclass, state=call.state if call else None)
+    elif call is None and hdr.key != NEW_KEY:
+        log.warning("ignored", "Ignoring message for unknown call", addr=addr,
+            source=hdr.source_call)
+    else:
+        try:
+            handler(call, hdr, frame, addr)
+        except FrameFormatError as ex:
+            log.warning("malformed", "Malformed frame", addr=addr, error=ex)
+
+# Used when running under asyncio. The transport hands over each 
+# datagram as it arrives.
+class HubProtocol(asyncio.DatagramProtocol):
+
+    def connection_made(self, transport):
+        global net
+        net = transport
+
+    def datagram_received(self, data, addr):
+        process_frame(data, addr)
+
+# A tick cycle happens every 20ms (see the TickScheduler below).
+def on_tick():
+
+    tick_start_ns = perf_counter_ns()
+    # If there is captured audio waiting then it is the radio's 
+    # contribution to the conference.
+    # TODO: CONFIGURABLE DEPTH BEFORE WE ALLOW SERVICING?
+    if audio_thread is not None:
+        audio_thread.trim_capture()
+        audio_in_pcm_48k = audio_thread.capture_ring.read_block()
+        if audio_in_pcm_48k is not None:
+            receive_capture_audio(audio_in_pcm_48k)
+            audio_thread.capture_ring.release()
+
+    # Each call's next frame (or concealment) out of its jitter buffer
+    now_ms = current_ms_frac()
+    for call in calls:
+        if call.jitter_buffer is not None:
+            start_ns = perf_counter_ns()
+            pcm = call.jitter_buffer.get(now_ms)
+            stage_decode.since(start_ns)
+            if pcm is not None:
+                mixer.write(call.mixer_slot, pcm)
+
+    if mixer.fresh_count() == 0:
+        stage_tick.since(tick_start_ns)
+        return
+    # Everyone's "everyone but me" mix in one go
+    radio_fresh = radio_slot is not None and mixer.is_fresh(radio_slot)
+    calls_heard = mixer.fresh_count() - (1 if radio_fresh else 0)
+    start_ns = perf_counter_ns()
+    mixes, mixes_ulaw = mixer.mix()
+    stage_mix.since(start_ns)
+
+    # The radio hears the calls
+    if radio_slot is not None and calls_heard > 0:
+        play_pcm(mixes[radio_slot])
+
+    # The calls hear the radio and each other
+    active_calls = calls.in_state(State.IN_CALL)
+    if active_calls:
+        send_mixed_audio(mixes_ulaw, active_calls)
+    stage_tick.since(tick_start_ns)
+
+def receive_capture_audio(audio_in_pcm_48k):
+
+    # The oldest captured block, straight out of the ring (no copy). The
+    # hardware is running at 48K so there are 160 * 6 samples.
+    # Downsample 48k->8k (and high-pass if enabled)
+    start_ns = perf_counter_ns()
+    audio_in_pcm_8k = downsample(audio_in_pcm_48k)
+    stage_downsample.since(start_ns)
+    assert(len(audio_in_pcm_8k) == 160)
+    # Convert from numbers into S16_LE format (saturating)
+    audio_in_s16le_8k = make_s16_le(audio_in_pcm_8k, audio_capture_buffer)
+    mixer.write(radio_slot, audio_in_s16le_8k)
+
+def send_mixed_audio(mixes_ulaw, active_calls):
+
+    # The voice is stamped with the tick's time, not the time it was 
+    # sent, so the timestamps step by exactly 20ms
+    now_ms = ticker.tick_ms
+    for call in active_calls:
+        if call.mixer_slot is None:
+            continue
+        # TODO: THIS LOGIC NEEDS TO BE IMPROVED. THE FULL VOICE
+        # FRAME SHOULD BE SENT WHENEVER THE 16-BIT TIMESTAMP ROLLS.
+        if call.voice_sent_count == 0:
+            # For the first audio frame, make a full voice frame. 
+            start_ns = perf_counter_ns()
+            tx.voice_payload[:] = mixes_ulaw[call.mixer_slot]
+            resp = tx.voice(call.local_call, call.remote_call, call.timestamp(now_ms), 
+                call.outseq, call.expected_inseq)
+            start_ns = stage_build.since(start_ns)
+            send_frame(call, resp)
+            stage_sendto.since(start_ns)
+            if log.debug_on:
+                log_sent("VOICE", call, resp)
+            call.outseq += 1
+        # After the first we can use mini-frames.
         else:
-            print("Ignoring unknown message (IDLE)")
-
-    # In this state we are waiting for a NEW with the right CALLTOKEN
-    elif state == State.NEW1:
-        if is_NEW_frame(frame):
-
-            # Decode the information elements
-            ies = decode_information_elements(frame[12:])
-
-            # Make sure we have the right token
-            if get_full_source_call(frame) == state_source_call_id and \
-                54 in ies and \
-                ies[54] == state_token:
-
-                # Generate the unique ID for this call
-                state_call_id = call_id_counter
-                call_id_counter += 1
-                # Generate the authentication challenge data
-                state_challenge = "{:09d}".format(random.randint(1,999999999))
-
-                print("Got expected token, starting call", state_call_id)
-
-                # Send ACK
-                resp = make_ACK_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq)
-                print("Sending ACK", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                # IMPORTANT: We don't move the outseq forward!
-
-                # Send AUTHREQ
-                resp = make_AUTHREQ_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq,
-                    state_challenge)
-                print("Sending AUTHREQ", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                state_outseq += 1                
-                state = State.NEW2
-
+            start_ns = perf_counter_ns()
+            tx.mini_payload[:] = mixes_ulaw[call.mixer_slot]
+            resp = tx.mini(call.local_call, call.timestamp(now_ms))
+            start_ns = stage_build.since(start_ns)
+            send_frame(call, resp)
+            stage_sendto.since(start_ns)
+        call.voice_sent_count += 1
+
+# Fires 2 seconds after RINGING is sent
+def on_ring_timeout(call: Call):
+
+    call.timer = None
+    if call.state != State.RINGING:
+        return
+
+    resp = tx.answer(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("ANSWER", call, resp)
+    send_frame(call, resp)
+    call.outseq += 1
+
+    resp = tx.stop_sounds(call.local_call, call.remote_call, call.timestamp(current_ms()), 
+        call.outseq, call.expected_inseq)
+    if log.debug_on:
+        log_sent("STOP_SOUNDS", call, resp)
+    send_frame(call, resp)
+    call.outseq += 1
+
+    call.state = State.IN_CALL
+
+# Fires if the peer never answers the AUTHREQ
+def on_auth_timeout(call: Call):
+
+    call.timer = None
+    if call.state == State.NEW2 or call.state == State.AUTHENTICATING:
+        log.warning("auth", "Authentication timeout", call=call.local_call)
+        calls.remove(call)
+
+# Registration runs in the background. This is called on the loop with 
+# the result of each attempt.
+def on_registration_result(ok: bool, text: str):
+    if ok:
+        log.info("reg", "Registration response", text=text)
+    else:
+        log.warning("reg", "Registration failed", error=text)
+
+# Reports the tick timing and how the audio thread's rings are doing
+def on_status():
+    loop.call_later(status_interval_ms, on_status)
+    log.info("status", "Tick lateness (ms)", histogram=ticker.lateness.format(), 
+        skipped=ticker.skipped)
+    if audio_thread is None:
+        return
+    log.info("status", "Audio", capture_high_water=audio_thread.capture_ring.high_water,
+        capture_drops=audio_thread.capture_drops, 
+        capture_compressions=audio_thread.capture_compressions,
+        capture_overruns=audio_thread.capture_overruns,
+        capture_errors=audio_thread.capture_errors,
+        play_errors=audio_thread.play_errors, 
+        device_errors=audio_thread.device_errors, reopens=audio_thread.reopens,
+        log_lost=log.lost)
+
+# The metrics endpoint's text. This runs on the loop.
+def render_metrics():
+    w = MetricWriter()
+    for stage in stages:
+        w.histogram(stage)
+    if audio_thread is not None:
+        w.histogram(audio_thread.capture_timing)
+        w.histogram(audio_thread.play_timing)
+        w.gauge("hub_capture_depth_high_water", "Deepest capture backlog (blocks)",
+            audio_thread.capture_ring.high_water)
+        w.counter("hub_capture_drops_total", "Captured blocks dropped to limit latency",
+            audio_thread.capture_drops)
+        w.counter("hub_capture_compressions_total", 
+            "Captured blocks crossfaded away to limit latency", audio_thread.capture_compressions)
+        w.counter("hub_capture_overruns_total", "Captured blocks lost to a full ring",
+            audio_thread.capture_overruns)
+        w.counter("hub_capture_errors_total", "Capture device read errors (e.g. overruns)",
+            audio_thread.capture_errors)
+        w.counter("hub_play_errors_total", "Playback device write errors", 
+            audio_thread.play_errors)
+        w.counter("hub_audio_device_errors_total", "Exceptions from the audio devices",
+            audio_thread.device_errors)
+        w.counter("hub_audio_reopens_total", "Times the audio devices were reopened",
+            audio_thread.reopens)
+    w.counter("hub_tick_skipped_total", "Ticks skipped because the loop fell behind",
+        ticker.skipped)
+    w.histogram(ticker.lateness)
+    w.counter("hub_log_lost_total", "Log records lost to a full ring", log.lost)
+    w.counter("hub_auth_errors_total", "Signature checks that failed to run", 
+        authenticator.errors)
+    w.gauge("hub_calls", "Calls in the call table", len(calls))
+    # Per-call counters, labelled with our call number and the peer
+    per_call = (
+        ("hub_call_rx_packets_total", "Frames received", lambda c: c.rx_packets),
+        ("hub_call_rx_bytes_total", "Bytes received", lambda c: c.rx_bytes),
+        ("hub_call_tx_packets_total", "Frames sent", lambda c: c.tx_packets),
+        ("hub_call_tx_bytes_total", "Bytes sent", lambda c: c.tx_bytes),
+        ("hub_call_seq_errors_total", "Inbound sequence errors", lambda c: c.seq_errors))
+    for name, help, value in per_call:
+        for call in calls:
+            w.counter(name, help, value(call), call=call.local_call, 
+                peer=f"{call.addr[0]}:{call.addr[1]}")
+    # And from the jitter buffers
+    per_buffer = (
+        ("hub_call_voice_frames_total", "Voice frames received", "counter", 
+            lambda jb: jb.received),
+        ("hub_call_voice_late_total", "Voice frames that arrived too late to play", 
+            "counter", lambda jb: jb.late),
+        ("hub_call_voice_concealed_total", "Missing voice frames that were concealed", 
+            "counter", lambda jb: jb.concealed),
+        ("hub_call_voice_dropped_total", "Voice frames dropped to cut the delay", 
+            "counter", lambda jb: jb.dropped),
+        ("hub_call_jitter_seconds", "Interarrival jitter", "gauge", 
+            lambda jb: f"{jb.jitter_ms / 1000:.6f}"),
+        ("hub_call_playout_delay_seconds", "Jitter buffer target delay", "gauge", 
+            lambda jb: f"{jb.target_delay_ms / 1000:.6f}"))
+    for name, help, kind, value in per_buffer:
+        for call in calls:
+            if call.jitter_buffer is None:
+                continue
+            if kind == "counter":
+                w.counter(name, help, value(call.jitter_buffer), call=call.local_call)
             else:
-                print("Invalid token")
-                state = State.IDLE
-        else:
-            print("Ignoring unknown message")
-
-    # In this state we are waiting for an AUTHREP
-    elif state == State.NEW2:
-        if is_full_frame(frame) and \
-            get_full_type(frame) == 6 and \
-            get_full_subclass_c_bit(frame) == False and \
-            get_full_subclass(frame) == 9:
-
-            # Decode the information elements
-            ies = decode_information_elements(frame[12:])
-
-            if get_full_source_call(frame) == state_source_call_id and \
-               get_full_dest_call(frame) == state_call_id and \
-                17 in ies:
-
-                rsa_challenge_result = base64.b64decode(ies[17])
-
-                # Here is where the actual validation happens:
-                try:
-                    public_key.verify(rsa_challenge_result,
-                        state_challenge.encode("utf-8"), 
-                        padding.PKCS1v15(), 
-                        hashes.SHA1())
-                except:
-                    print("Authentication failed")
-                    state = State.IDLE
-                    continue
-
-                print("Authenticated!")
-
-                # Send ACK
-                resp = make_ACK_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq)
-                print("Sending ACK", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                # IMPORTANT: We don't move the outseq forward!
-
-                # Send the ACCEPT
-                resp = make_ACCEPT_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq)
-                print("Sending ACCEPT", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                state_outseq += 1
-
-                # Send the RINGING
-                resp = make_RINGING_frame(state_call_id, 
-                    state_source_call_id,
-                    state_call_start_ms + (current_ms() - state_call_start_stamp),
-                    state_outseq, 
-                    state_expected_inseq)
-                print("Sending RINGING", resp, state_outseq, state_expected_inseq)
-                sock.sendto(resp, addr)
-                state_outseq += 1
-
-                state = State.RINGING
-                state_timeout = current_ms() + 2000
-
-            else:
-                print("AUTHREP error")
-        else:
-            print("Ignoring unknown message NEW2")
-
-    elif state == State.RINGING:
-
-        if is_VOICE_frame(frame):
-            # Send ACK
-            resp = make_ACK_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending ACK", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            # IMPORTANT: We don't move the outseq forward!
-
-            g711_audio = frame[12:]
-            pcm_audio_48k = upsample(decode_ulaw(g711_audio))
-            if audio_device_play.write(make_s16_le(pcm_audio_48k)) < 0:
-                print("Playback error")
-        
-        elif is_mini_voice_packet(frame):
-            g711_audio = frame[4:]
-            pcm_audio_48k = upsample(decode_ulaw(g711_audio))
-            if audio_device_play.write(make_s16_le(pcm_audio_48k)) < 0:
-                print("Playback error")
-        
-        else:
-            print("Ignoring unknown message RINGING")
-
-    elif state == State.IN_CALL:
-
-        if is_HANGUP_frame(frame):
-            resp = make_ACK_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending ACK", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            # IMPORTANT: We don't move the outseq forward!
-
-            print("Hangup")
-            state = State.IDLE
-
-        elif is_VOICE_frame(frame):
-            # Send ACK
-            resp = make_ACK_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending ACK", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            # IMPORTANT: We don't move the outseq forward!
-
-            g711_audio = frame[12:]
-            pcm_audio_48k = upsample(decode_ulaw(g711_audio))
-            if audio_device_play.write(make_s16_le(pcm_audio_48k)) < 0:
-                print("Playback error")
-
-        elif is_mini_voice_packet(frame):
-            g711_audio = frame[4:]
-            pcm_audio_48k = upsample(decode_ulaw(g711_audio))
-            if audio_device_play.write(make_s16_le(pcm_audio_48k)) < 0:
-                print("Playback error")
+                w.gauge(name, help, value(call.jitter_buffer), call=call.local_call)
+    return w.text()
 
-        else:
-            print("Ignoring unknown message IN_CALL")
+# ---- Main event loop -----------------------------------------------------
+#
+# Everything on the network side is driven from the event loop. It sleeps
+# until the socket is readable or the next timer is due, so there is no
+# spinning when the server is idle. The sound card is serviced by the 
+# audio thread.
+
+if use_asyncio:
+    loop = AsyncioEventLoop(current_ms_frac)
+    loop.loop.run_until_complete(loop.loop.create_datagram_endpoint(HubProtocol, sock=sock))
+else:
+    loop = EventLoop(current_ms_frac)
+    loop.add_reader(sock, on_network_readable)
+authenticator.loop = loop
+ticker = TickScheduler(loop, 20, on_tick, tick_late_policy, tick_max_burst)
+ticker.start()
+loop.call_later(status_interval_ms, on_status)
+if audio_thread is not None:
+    log.info("audio", "Opening the audio devices", backend=audio_backend)
+    audio_thread.start()
+# The metrics can be scraped while the server runs
+if metrics_address is not None:
+    if isinstance(metrics_address, str):
+        address = metrics_address + ("." + str(worker_index) if workers > 1 else "")
+    else:
+        address = (metrics_address[0], metrics_address[1] + worker_index)
+    metrics_server = MetricsServer(address, loop, render_metrics)
+    metrics_server.start()
+# Periodically register the node so that other peers known where to find us
+if worker_index == 0:
+    registrar = Registrar(reg_url, reg_msg, reg_interval_ms, loop, on_registration_result)
+    registrar.start()
+loop.run()
@@ -23,8 +23,6 @@
 # hub. The goal is to demonstrate AllStarLink functionaltion without
 # dependency on the Asterisk infrastructure.
 #
-import time
-import requests
 import socket
 import random
 from enum import Enum
@@ -34,8 +32,17 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization
 import scipy.io.wavfile as wavfile
 import numpy as np
-# TODO: THIS IS DEPRECATED AS OF PYTHON 3.13, NEED TO REPLACE
-import audioop
+from g711 import ulaw_encode
+from registration import Registrar
+from eventloop import EventLoop
+from mediaclock import monotonic_ms, monotonic_ms_int
+from iax2 import is_full_frame, get_full_source_call, get_full_r_bit, get_full_dest_call, \
+    get_full_timestamp, get_full_outseq, get_full_inseq, get_full_type, \
+    get_full_subclass_c_bit, get_full_subclass, decode_information_elements, \
+    is_NEW_frame, is_ACK_frame, is_HANGUP_frame
+from iax2 import make_CALLTOKEN_frame, make_ACK_frame, make_AUTHREQ_frame, \
+    make_ACCEPT_frame, make_RINGING_frame, make_ANSWER_frame, make_STOP_SOUNDS_frame, \
+    make_VOICE_frame, make_VOICE_miniframe
 
 # ===========================================================================
 # USER CONFIGURATION AREA - PLEASE CUSTOMIZE HERE
@@ -72,209 +79,20 @@ hUaYIFwQxTB3v1h+1QIDAQAB\n\
 reg_interval_ms = 5 * 60 * 1000
 # ===========================================================================
 
-def is_full_frame(frame):
-    return frame[0] & 0b10000000 == 0b10000000
-
-def get_full_source_call(frame):
-    return ((frame[0] & 0b01111111) << 8) | frame[1]
-
-def get_full_r_bit(frame):
-    return frame[2] & 0b10000000 == 0b10000000
-
-def get_full_dest_call(frame):
-    return ((frame[2] & 0b01111111) << 8) | frame[3]
-
-def get_full_timestamp(frame):
-    return (frame[4] << 24) | (frame[5] << 16) | (frame[6] << 8) | frame[7]
-
-def get_full_outseq(frame):
-    return frame[8]
-
-def get_full_inseq(frame):
-    return frame[9]
-
-def get_full_type(frame):
-    return frame[10]
-
-def get_full_subclass_c_bit(frame):
-    return frame[11] & 0b10000000 == 0b10000000
-
-def get_full_subclass(frame):
-    return frame[11] & 0b01111111
-
 def make_call_token():
     # TODO: RANDOMIZE
     return "1759883232?e4b9017e102c1f831e6db6ab1bc85ebce1ea240e".encode("utf-8")
 
-def make_information_element(id: int, content):
-    result = bytearray()
-    result += id.to_bytes(1, byteorder='big')
-    result += len(content).to_bytes(1, byteorder='big')
-    result += content
-    return result
-
-def encode_information_elements(ie_map: dict): 
-    result = bytearray()
-    for key in ie_map.keys():
-        if not isinstance(key, int):
-            raise Exception("Type error")
-        result += make_information_element(key, ie_map[key])
-    return result
-
-def decode_information_elements(data: bytes):
-    """
-    Takes a byte array containing zero or more information elements
-    and unpacks it into a dictionary. The key of the dictionary is 
-    the integer element ID and the value of the dictionary is a byte
-    array with the content of the element.
-    """
-    result = dict()
-    state = 0
-    working_id = 0
-    working_length = 0
-    working_data = None
-    # Cycle across all data
-    for b in data:
-        if state == 0:
-            working_id = b
-            state = 1
-        elif state == 1:
-            working_length = b 
-            working_data = bytearray()
-            if working_length == 0:
-                result[working_id] = working_data
-                state = 0
-            else:
-                state = 2
-        elif state == 2:
-            working_data.append(b)
-            if len(working_data) == working_length:
-                result[working_id] = working_data
-                state = 0
-        else:
-            raise Exception()
-    # Sanity check - we should end in the zero state
-    if state != 0:
-        raise Exception("Data format error")
-    return result
-
-def is_NEW_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 1
-
-def is_ACK_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 4
-
-def is_HANGUP_frame(frame):
-    return is_full_frame(frame) and \
-        get_full_type(frame) == 6 and \
-        get_full_subclass_c_bit(frame) == False and \
-        get_full_subclass(frame) == 5
-
-def make_frame_header(source_call: int, dest_call: int, timestamp: int, 
-    out_seq: int, in_seq: int, frame_type: int, frame_subclass: int):
-    result = bytearray()
-    result += source_call.to_bytes(2, byteorder='big')
-    result[0] = result[0] | 0b10000000
-    result += dest_call.to_bytes(2, byteorder='big')
-    result[2] = result[2] & 0b01111111
-    result += timestamp.to_bytes(4, byteorder='big')
-    result += out_seq.to_bytes(1, byteorder='big')
-    result += in_seq.to_bytes(1, byteorder='big')
-    # Type
-    result += int(frame_type).to_bytes(1, byteorder='big')
-    # Subclass
-    result += int(frame_subclass).to_bytes(1, byteorder='big')
-    return result
-
-def make_CALLTOKEN_frame(source_call: int, dest_call: int, timestamp: int, 
-    out_seq: int, in_seq: int, token):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 40)
-    result += encode_information_elements({ 54: token })
-    return result
-
-def make_ACK_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 4)
-    return result
-
-def make_AUTHREQ_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int, challenge: str):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 8)
-    # Information elements
-    result += encode_information_elements({ 
-        14: int(4).to_bytes(2, byteorder='big'),
-        15: challenge.encode("utf-8"), 
-        6: "allstar-sys".encode("utf-8") 
-    })
-    return result
-
-def make_ACCEPT_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        6, 7)
-    # Information elements
-    result += encode_information_elements({ 
-        9: int(4).to_bytes(4, byteorder='big'),
-        56: b'\x00\x00\x00\x00\x00\x00\x00\x00\x04'
-    })
-    return result
-
-def make_RINGING_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        4, 3)
-    return result
-
-def make_ANSWER_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        4, 4)
-    return result
-
-def make_STOP_SOUNDS_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        4, 255)
-    return result
-
-def make_VOICE_frame(source_call: int, dest_call: int, timestamp: int,
-    out_seq: int, in_seq: int, audio_block: bytes):
-    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
-        2, 4)
-    result += audio_block
-    return result
-
-def make_VOICE_miniframe(source_call: int, timestamp: int, audio_data: bytes):
-    result = bytearray()
-    result += source_call.to_bytes(2, byteorder='big')
-    # Make sure the top bit is zero (indicates mini-frame)
-    result[0] = result[0] & 0b01111111
-    # Per RFC 5456 section 8.1.2: the timestamp on a mini-frame is 
-    # just the lower 16 bits
-    full_32bit_stamp = timestamp.to_bytes(4, byteorder='big')
-    result.append(full_32bit_stamp[2])
-    result.append(full_32bit_stamp[3])
-    result += audio_data
-    return result
-
-def encode_ulaw(pcm_data: bytes):
-    # TODO: REMOVE DEPENDENCY ON THIS DEPRECATED LIBRARY
-    return audioop.lin2ulaw(pcm_data, 2)
+def encode_ulaw(pcm_data):
+    # Accepts a NumPy array of samples or a buffer of S16_LE samples
+    return ulaw_encode(pcm_data).tobytes()
 
+# The monotonic clock can't be disturbed by a change to the wall clock
 def current_ms():
-    return int(time.time() * 1000)
+    return monotonic_ms_int()
 
 def current_ms_frac():
-    return time.time() * 1000
+    return monotonic_ms()
 
 public_key = serialization.load_pem_public_key(public_key_pem.encode("utf-8"))
 
@@ -302,7 +120,9 @@ state_outseq = 0
 state_audio_frame = 0
 state_audio_ptr = 0
 state_audio_start_stamp = 0
-last_reg_ms = 0
+# The pending ring or audio timer (if any) so it can be cancelled when
+# the call ends
+state_timer = None
 
 reg_node_msg = {
     "node": node_id,
@@ -324,98 +144,38 @@ reg_msg["data"]["nodes"][node_id] = reg_node_msg
 # Create a UDP socket and bind 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind((UDP_IP, iax2_port))
-# This prevents the recvfrom() call below from blocking forever. 
+# The event loop tells us when there is something to read, but the
+# socket is drained until it would block.
 sock.setblocking(False)
 
 print(f"Listening on IAX2 port {UDP_IP}:{iax2_port}")
 
-# ---- Main event loop -----------------------------------------------------
-
-while True:
-
-    # Process any background activity
-
-    # Periodically register the node so that other peers known where to find us
-    if (current_ms() - last_reg_ms) > reg_interval_ms:
-        reg_response = requests.post(reg_url, json=reg_msg)
-        print("Registration response:", reg_response.text)
-        last_reg_ms = current_ms()
-
-    if state == State.RINGING:
-
-        # Look for timeout on the ringer
-        if current_ms() > state_timeout:
-
-            resp = make_ANSWER_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending ANSWER", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            state_outseq += 1
-
-            resp = make_STOP_SOUNDS_frame(state_call_id, 
-                state_source_call_id,
-                state_call_start_ms + (current_ms() - state_call_start_stamp),
-                state_outseq, 
-                state_expected_inseq)
-            print("Sending STOP_SOUNDS", resp, state_outseq, state_expected_inseq)
-            sock.sendto(resp, addr)
-            state_outseq += 1
-
-            state = State.IN_CALL
-            state_audio_ptr = 0
-            state_audio_frame = 0
-            # Set the start time forward a bit
-            state_audio_start_stamp = current_ms_frac() + 250
-
-    # In this state we are in an active call
-    elif state == State.IN_CALL:
-
-        # Make progress on streaming out audio
-        now_ms_frac = current_ms_frac()
-        # Only do this every 20ms
-        target_ms_frac = (state_audio_start_stamp + (state_audio_frame * 20.0))
-
-        if state_audio_ptr < audio_data.size:
-            if now_ms_frac > target_ms_frac:    
-                # Shorten the last block if necessary
-                audio_block_size = 160
-                audio_left = audio_data.size - state_audio_ptr
-                if audio_left < audio_block_size:
-                    audio_block_size = audio_left
-                audio_block = audio_data[state_audio_ptr:state_audio_ptr + audio_block_size]
-                audio_block_ulaw = encode_ulaw(audio_block)
-
-                # For the first audio frame, make a full voice frame. 
-                if state_audio_frame == 0:
-                    resp = make_VOICE_frame(state_call_id, 
-                        state_source_call_id,
-                        state_call_start_ms + (current_ms() - state_call_start_stamp),
-                        state_outseq, 
-                        state_expected_inseq,
-                        audio_block_ulaw)
-                    sock.sendto(resp, addr)
-                    state_outseq += 1
-                # After the first we can use mini-frames.
-                # TODO: There is some special handling that should be followed
-                # when the 16-bit timestamp wraps around zero.
-                else:
-                    resp = make_VOICE_miniframe(state_call_id, 
-                        state_call_start_ms + (current_ms() - state_call_start_stamp),
-                        audio_block_ulaw)
-                    sock.sendto(resp, addr)
-
-                state_audio_ptr += audio_block_size
-                state_audio_frame += 1
-
-
-    # Look for new messages from the peer
-    try:
-        frame, addr = sock.recvfrom(1024)
-    except BlockingIOError:
-        continue
+# ---- Event handlers ------------------------------------------------------
+
+# Called when the UDP socket is readable
+def on_network_readable():
+    global addr
+    # Drain everything that is waiting
+    while True:
+        try:
+            frame, addr = sock.recvfrom(1024)
+        except BlockingIOError:
+            return
+        process_frame(frame, addr)
+
+# Goes back to IDLE and cancels the call's timer so that nothing from
+# this call fires into the next one
+def end_call():
+    global state, state_timer
+    if state_timer is not None:
+        state_timer.cancel()
+        state_timer = None
+    state = State.IDLE
+
+def process_frame(frame, addr):
+    global state, state_source_call_id, state_call_id, state_call_start_ms, \
+        state_call_start_stamp, state_challenge, state_expected_inseq, \
+        state_outseq, state_token, call_id_counter, state_timer
 
     # Process the full frames
     if is_full_frame(frame):
@@ -475,7 +235,7 @@ while True:
         if is_NEW_frame(frame):
 
             # Decode the information elements
-            ies = decode_information_elements(frame[12:])
+            ies = decode_information_elements(frame, 12)
 
             # Make sure we have the right token
             if get_full_source_call(frame) == state_source_call_id and \
@@ -514,7 +274,7 @@ while True:
 
             else:
                 print("Invalid token")
-                state = State.IDLE
+                end_call()
         else:
             print("Ignoring unknown message")
 
@@ -526,7 +286,7 @@ while True:
             get_full_subclass(frame) == 9:
 
             # Decode the information elements
-            ies = decode_information_elements(frame[12:])
+            ies = decode_information_elements(frame, 12)
 
             if get_full_source_call(frame) == state_source_call_id and \
                get_full_dest_call(frame) == state_call_id and \
@@ -542,8 +302,8 @@ while True:
                         hashes.SHA1())
                 except:
                     print("Authentication failed")
-                    state = State.IDLE
-                    continue
+                    end_call()
+                    return
 
                 print("Authenticated!")
 
@@ -578,14 +338,15 @@ while True:
                 state_outseq += 1
 
                 state = State.RINGING
-                state_timeout = current_ms() + 2000
+                # Answer after 2 seconds of ringing
+                state_timer = loop.call_later(2000, on_ring_timeout)
 
             else:
                 print("AUTHREP error")
 
 
-    # In this state we are in an active call
-    elif state == State.IN_CALL:
+    # In these states the call is up and the peer can hang up
+    elif state == State.RINGING or state == State.IN_CALL:
 
         if is_HANGUP_frame(frame):
             resp = make_ACK_frame(state_call_id, 
@@ -596,4 +357,102 @@ while True:
             sock.sendto(resp, addr)
             # IMPORTANT: We don't move the outseq forward!
 
-            state = State.IDLE
+            end_call()
+
+# Fires 2 seconds after RINGING is sent
+def on_ring_timeout():
+    global state, state_outseq, state_audio_ptr, state_audio_frame, \
+        state_audio_start_stamp, state_timer
+
+    state_timer = None
+    if state != State.RINGING:
+        return
+
+    resp = make_ANSWER_frame(state_call_id, 
+        state_source_call_id,
+        state_call_start_ms + (current_ms() - state_call_start_stamp),
+        state_outseq, 
+        state_expected_inseq)
+    print("Sending ANSWER", resp, state_outseq, state_expected_inseq)
+    sock.sendto(resp, addr)
+    state_outseq += 1
+
+    resp = make_STOP_SOUNDS_frame(state_call_id, 
+        state_source_call_id,
+        state_call_start_ms + (current_ms() - state_call_start_stamp),
+        state_outseq, 
+        state_expected_inseq)
+    print("Sending STOP_SOUNDS", resp, state_outseq, state_expected_inseq)
+    sock.sendto(resp, addr)
+    state_outseq += 1
+
+    state = State.IN_CALL
+    state_audio_ptr = 0
+    state_audio_frame = 0
+    # Set the start time forward a bit
+    state_audio_start_stamp = current_ms_frac() + 250
+    state_timer = loop.call_at(state_audio_start_stamp, on_audio_frame)
+
+# Streams out one 20ms block of the announcement
+def on_audio_frame():
+    global state_outseq, state_audio_ptr, state_audio_frame, state_timer
+
+    state_timer = None
+    # In this state we are in an active call
+    if state != State.IN_CALL or state_audio_ptr >= audio_data.size:
+        return
+
+    # Shorten the last block if necessary
+    audio_block_size = 160
+    audio_left = audio_data.size - state_audio_ptr
+    if audio_left < audio_block_size:
+        audio_block_size = audio_left
+    audio_block = audio_data[state_audio_ptr:state_audio_ptr + audio_block_size]
+    audio_block_ulaw = encode_ulaw(audio_block)
+
+    # For the first audio frame, make a full voice frame. 
+    if state_audio_frame == 0:
+        resp = make_VOICE_frame(state_call_id, 
+            state_source_call_id,
+            state_call_start_ms + (current_ms() - state_call_start_stamp),
+            state_outseq, 
+            state_expected_inseq,
+            audio_block_ulaw)
+        sock.sendto(resp, addr)
+        state_outseq += 1
+    # After the first we can use mini-frames.
+    # TODO: There is some special handling that should be followed
+    # when the 16-bit timestamp wraps around zero.
+    else:
+        resp = make_VOICE_miniframe(state_call_id, 
+            state_call_start_ms + (current_ms() - state_call_start_stamp),
+            audio_block_ulaw)
+        sock.sendto(resp, addr)
+
+    state_audio_ptr += audio_block_size
+    state_audio_frame += 1
+
+    # Only do this every 20ms
+    state_timer = loop.call_at(state_audio_start_stamp + (state_audio_frame * 20.0), 
+        on_audio_frame)
+
+# Registration runs in the background. This is called on the loop with 
+# the result of each attempt.
+def on_registration_result(ok: bool, text: str):
+    if ok:
+        print("Registration response:", text)
+    else:
+        print("Registration failed:", text)
+
+# ---- Main event loop -----------------------------------------------------
+#
+# Everything is driven from the event loop. It sleeps until the socket is
+# readable or the next timer is due, so there is no spinning when the 
+# server is idle.
+
+loop = EventLoop(current_ms_frac)
+loop.add_reader(sock, on_network_readable)
+# Periodically register the node so that other peers known where to find us
+registrar = Registrar(reg_url, reg_msg, reg_interval_ms, loop, on_registration_result)
+registrar.start()
+loop.run()
@@ -0,0 +1,205 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Sound card I/O on its own thread. The protocol loop never touches the
+# audio device: it exchanges 20ms blocks of S16 audio with this thread 
+# through a pair of BlockRings, so a slow or blocked device can't hold
+# up ACKs, PONGs or anything else on the network side.
+#
+# If the capture clock runs a little faster than the 20ms tick, captured
+# audio builds up in the ring and the radio-to-network latency grows with
+# it. trim_capture() holds the backlog to a fixed depth by dropping the
+# oldest blocks, or by squeezing two blocks into one with a crossfade
+# (which is less audible than a hard cut).
+#
+import threading
+import time
+import numpy as np
+from ring import BlockRing
+from metrics import Histogram
+
+# Ways of getting rid of a capture backlog
+DROP_OLDEST = "drop-oldest"
+COMPRESS = "compress"
+
+class AudioThread(threading.Thread):
+    """
+    Runs blocking reads of the capture device and writes to the playback
+    device (alsaaudio.PCMs opened in blocking mode, or one of the devices
+    in audiodev.py). The capture device paces the thread: each pass reads
+    one block, queues it on capture_ring, and then writes out whatever is
+    waiting on play_ring.
+
+    The devices can be left as None and opened by start() instead, with
+    open_devices(), which returns a (playback, capture) pair. They are
+    closed when the thread stops.
+
+    The protocol loop is the producer for play_ring and the consumer for
+    capture_ring. This thread is the other end of both.
+
+    The protocol loop calls trim_capture() before it takes a captured 
+    block to keep capture_ring at most capture_max_depth blocks deep, 
+    using capture_policy (DROP_OLDEST or COMPRESS). capture_drops and 
+    capture_compressions count the blocks removed each way and 
+    capture_ring.high_water is the deepest backlog seen. 
+    capture_overruns counts the blocks lost because the ring was 
+    completely full.
+
+    capture_timing and play_timing are histograms of how long each 
+    device read and write took.
+
+    A failed read (a negative length, which is how ALSA reports an 
+    overrun) counts in capture_errors and a failed write in play_errors.
+    If a device raises, the thread doesn't die: the error counts in 
+    device_errors, and after a back-off (doubling from retry_min_s up to
+    retry_max_s) it carries on. With open_devices the devices are closed
+    and opened again first, and reopens counts that. All of these are 
+    logged to log (a Logger) if one is given, under the "audio" 
+    category.
+    """
+    def __init__(self, play_device, capture_device, block_size: int = 160 * 6, 
+        ring_blocks: int = 8, capture_max_depth: int = 4, 
+        capture_policy: str = DROP_OLDEST, open_devices = None, log = None,
+        retry_min_s: float = 0.1, retry_max_s: float = 5.0):
+        super().__init__(name="audio", daemon=True)
+        self.open_devices = open_devices
+        self.log = log
+        self.retry_min_s = retry_min_s
+        self.retry_max_s = retry_max_s
+        self.play_device = play_device
+        self.capture_device = capture_device
+        self.block_size = block_size
+        self.play_ring = BlockRing(ring_blocks, block_size, dtype='<i2')
+        self.capture_ring = BlockRing(ring_blocks, block_size, dtype='<i2')
+        if capture_max_depth < 1 or capture_max_depth >= ring_blocks:
+            raise Exception("Capture depth must be between 1 and " + str(ring_blocks - 1))
+        if capture_policy not in (DROP_OLDEST, COMPRESS):
+            raise Exception("Unknown capture policy " + capture_policy)
+        self.capture_max_depth = capture_max_depth
+        self.capture_policy = capture_policy
+        # Crossfade ramps for COMPRESS
+        self._fade_in = np.linspace(0.0, 1.0, block_size, dtype=np.float32)
+        self._fade_out = 1.0 - self._fade_in
+        self._fade_work = np.zeros(block_size, dtype=np.float32)
+        self._fade_work2 = np.zeros(block_size, dtype=np.float32)
+        self.capture_timing = Histogram("hub_stage_capture_read_seconds",
+            "Time spent in the capture device read (it blocks until a block is ready)")
+        self.play_timing = Histogram("hub_stage_play_write_seconds",
+            "Time spent in the playback device write")
+        self.capture_overruns = 0
+        self.capture_drops = 0
+        self.capture_compressions = 0
+        self.capture_errors = 0
+        self.play_errors = 0
+        self.device_errors = 0
+        self.reopens = 0
+        self._running = True
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.open_devices is not None and self.capture_device is None:
+            self.play_device, self.capture_device = self.open_devices()
+        super().start()
+
+    def stop(self):
+        self._running = False
+        self._stopped.set()
+
+    def trim_capture(self):
+        """
+        Consumer side. Cuts the capture backlog down to capture_max_depth
+        blocks.
+        """
+        ring = self.capture_ring
+        while len(ring) > self.capture_max_depth:
+            oldest = ring.read_block()
+            if self.capture_policy == COMPRESS:
+                # Fade from the oldest block into the next one, which 
+                # then stands for both. The next block belongs to the
+                # consumer already so it can be changed in place.
+                following = ring.peek(1)
+                np.multiply(oldest, self._fade_out, out=self._fade_work)
+                np.multiply(following, self._fade_in, out=self._fade_work2)
+                self._fade_work += self._fade_work2
+                np.copyto(following, self._fade_work, casting='unsafe')
+                ring.release()
+                self.capture_compressions += 1
+            else:
+                ring.release()
+                self.capture_drops += 1
+
+    def run(self):
+        retry_s = self.retry_min_s
+        while self._running:
+            try:
+                if self.capture_device is None:
+                    self.play_device, self.capture_device = self.open_devices()
+                    self.reopens += 1
+                    if self.log is not None:
+                        self.log.info("audio", "Reopened the audio devices")
+                self._transfer()
+                retry_s = self.retry_min_s
+            except Exception as ex:
+                self.device_errors += 1
+                if self.log is not None:
+                    self.log.error("audio", "Audio device error", error=repr(ex), 
+                        retry_s=retry_s)
+                if self.open_devices is not None:
+                    self._close_devices()
+                self._stopped.wait(retry_s)
+                retry_s = min(retry_s * 2, self.retry_max_s)
+        self._close_devices()
+
+    def _transfer(self):
+        block_bytes = self.block_size * 2
+        start_ns = time.perf_counter_ns()
+        audio_in_l, audio_in_data = self.capture_device.read()
+        self.capture_timing.since(start_ns)
+        if audio_in_l > 0 and len(audio_in_data) == block_bytes:
+            # Dropped if the protocol loop has fallen behind
+            if not self.capture_ring.put(np.frombuffer(audio_in_data, dtype='<i2')):
+                self.capture_overruns += 1
+        elif audio_in_l < 0:
+            self.capture_errors += 1
+            if self.log is not None:
+                self.log.warning("audio", "Capture read failed", result=audio_in_l)
+        while True:
+            block = self.play_ring.read_block()
+            if block is None:
+                break
+            start_ns = time.perf_counter_ns()
+            written = self.play_device.write(block)
+            self.play_timing.since(start_ns)
+            if written < 0:
+                self.play_errors += 1
+                if self.log is not None:
+                    self.log.warning("audio", "Playback write failed", result=written)
+            self.play_ring.release()
+
+    def _close_devices(self):
+        for device in (self.capture_device, self.play_device):
+            if device is not None:
+                try:
+                    device.close()
+                except Exception:
+                    pass
+        self.capture_device = None
+        self.play_device = None
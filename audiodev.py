@@ -0,0 +1,189 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# The audio devices that the audio thread (see audio.py) can run on. All
+# of them look like a blocking alsaaudio.PCM: the capture device has a
+# read() that waits for the next block and returns (frames, S16_LE bytes)
+# and the playback device has a write() that takes a block and returns
+# the number of frames written.
+#
+#   alsa  The sound card. alsaaudio is only imported when it's opened, so
+#         it doesn't have to be installed to use the others.
+#   null  Captures silence and throws away what is played. The capture
+#         is paced by the clock so the hub runs exactly as it would with
+#         a sound card, just with nothing connected (a network-only
+#         conference server, or a CI box).
+#   wav   Captures from a 16-bit mono WAV file (looped) and records the
+#         playback to another one. The capture can be paced like a sound
+#         card or run as fast as it's read, which makes a repeatable
+#         input for measuring the audio path.
+#
+import time
+import wave
+import struct
+
+ALSA = "alsa"
+NULL = "null"
+WAV = "wav"
+
+class _Pacer:
+    """
+    Waits for the next block period, on deadlines counted from the start
+    in integer ns so they don't drift. If the caller falls more than a
+    few blocks behind it starts again from now rather than rushing to
+    catch up.
+    """
+    def __init__(self, block_size: int, rate: int):
+        self.period_ns = block_size * 1000000000 // rate
+        self._start_ns = None
+        self._block = 0
+
+    def wait(self):
+        now_ns = time.monotonic_ns()
+        if self._start_ns is None:
+            self._start_ns = now_ns
+        self._block += 1
+        deadline_ns = self._start_ns + self._block * self.period_ns
+        if now_ns - deadline_ns > 4 * self.period_ns:
+            self._start_ns = now_ns
+            self._block = 0
+            return
+        if deadline_ns > now_ns:
+            time.sleep((deadline_ns - now_ns) / 1e9)
+
+class NullCapture:
+
+    def __init__(self, block_size: int, rate: int):
+        self.block_size = block_size
+        self._silence = bytes(block_size * 2)
+        self._pacer = _Pacer(block_size, rate)
+
+    def read(self):
+        self._pacer.wait()
+        return self.block_size, self._silence
+
+    def close(self):
+        pass
+
+class NullPlayback:
+
+    def write(self, data):
+        # data is any buffer (a NumPy block out of the play ring, say)
+        return memoryview(data).nbytes // 2
+
+    def close(self):
+        pass
+
+class WavCapture:
+    """
+    Reads 16-bit mono audio at the given rate from a WAV file, one block
+    per read(). With repeat the file is played in a loop, otherwise read()
+    returns (0, b"") once it has all been read. With paced each read()
+    takes one block period like a sound card does.
+    """
+    def __init__(self, path: str, block_size: int, rate: int, repeat: bool = True,
+        paced: bool = True):
+        self.block_size = block_size
+        self.repeat = repeat
+        self._file = wave.open(path, "rb")
+        if self._file.getnchannels() != 1 or self._file.getsampwidth() != 2 or \
+            self._file.getframerate() != rate:
+            raise Exception(f"{path} must be 16-bit mono at {rate}Hz")
+        if self._file.getnframes() == 0:
+            raise Exception(f"{path} has no audio")
+        self._pacer = _Pacer(block_size, rate) if paced else None
+
+    def read(self):
+        if self._pacer is not None:
+            self._pacer.wait()
+        data = self._file.readframes(self.block_size)
+        if self.repeat:
+            while len(data) < self.block_size * 2:
+                self._file.rewind()
+                data += self._file.readframes(self.block_size - len(data) // 2)
+        elif not data:
+            return 0, b""
+        # The last block of the file is padded out with silence
+        if len(data) < self.block_size * 2:
+            data += bytes(self.block_size * 2 - len(data))
+        return self.block_size, data
+
+    def close(self):
+        self._file.close()
+
+class WavPlayback:
+    """
+    Writes 16-bit mono audio to a WAV file. The header is brought up to
+    date every second or so as well as on close(), so the file is usable
+    even if the server is killed.
+    """
+    def __init__(self, path: str, rate: int):
+        self._file = open(path, "wb")
+        self._rate = rate
+        self._data_bytes = 0
+        self._unpatched = 0
+        self._write_header()
+
+    def _write_header(self):
+        self._file.write(struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + self._data_bytes,
+            b"WAVE", b"fmt ", 16, 1, 1, self._rate, self._rate * 2, 2, 16, b"data",
+            self._data_bytes))
+
+    def _patch_header(self):
+        self._file.seek(0)
+        self._write_header()
+        self._file.seek(0, 2)
+        self._file.flush()
+        self._unpatched = 0
+
+    def write(self, data):
+        self._file.write(data)
+        n = memoryview(data).nbytes
+        self._data_bytes += n
+        self._unpatched += n
+        if self._unpatched >= self._rate * 2:
+            self._patch_header()
+        return n // 2
+
+    def close(self):
+        self._patch_header()
+        self._file.close()
+
+def open_audio(backend: str, block_size: int, rate: int = 48000,
+    device_name: str = "default", capture_file: str = None, play_file: str = None):
+    """
+    Opens a (playback, capture) pair of devices for the audio thread.
+    """
+    if backend == ALSA:
+        import alsaaudio
+        play = alsaaudio.PCM(channels=1, rate=rate, format=alsaaudio.PCM_FORMAT_S16_LE,
+            periodsize=block_size, device=device_name)
+        capture = alsaaudio.PCM(alsaaudio.PCM_CAPTURE,
+            channels=1, rate=rate, format=alsaaudio.PCM_FORMAT_S16_LE,
+            periodsize=block_size, device=device_name)
+        return play, capture
+    if backend == NULL:
+        return NullPlayback(), NullCapture(block_size, rate)
+    if backend == WAV:
+        if capture_file is None or play_file is None:
+            raise Exception("The wav audio backend needs a capture file and a play file")
+        return WavPlayback(play_file, rate), WavCapture(capture_file, block_size, rate)
+    raise Exception("Unknown audio backend " + backend)
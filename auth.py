@@ -0,0 +1,150 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Verification of the RSA-signed challenge in an AUTHREP. This can run
+# inline or on a pool of worker threads or processes so that a burst of
+# incoming connects doesn't hold up the media path. The result is always
+# handed back on the event loop thread.
+#
+import base64
+import concurrent.futures
+import multiprocessing
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import serialization
+
+def verify_rsa_challenge(public_key, rsa_result: bytes, challenge: str):
+    """
+    Returns True if rsa_result (the base64 IE_RSA_RESULT content) is a
+    valid signature of the challenge.
+    """
+    try:
+        public_key.verify(base64.b64decode(rsa_result),
+            challenge.encode("utf-8"),
+            padding.PKCS1v15(),
+            hashes.SHA1())
+        return True
+    except Exception:
+        return False
+
+# In a worker process the key is loaded once when the process starts
+_worker_public_key = None
+
+def _init_worker(public_key_pem: bytes):
+    global _worker_public_key
+    _worker_public_key = serialization.load_pem_public_key(public_key_pem)
+
+def _verify_in_worker(rsa_result: bytes, challenge: str):
+    return verify_rsa_challenge(_worker_public_key, rsa_result, challenge)
+
+class Authenticator:
+    """
+    Verifies AUTHREP signatures for the event loop.
+
+    workers is the size of the pool. With 0 the verification is done
+    inline, which is the cheapest option if connects are rare. Threads
+    are used unless use_processes is set. The signature check doesn't 
+    give up the GIL for long, so under a burst a thread pool competes 
+    with the loop and makes the tick jitter worse, not better (see 
+    net-test/auth-bench-1.py). Processes avoid that. 
+
+    Process workers are forked right away, so create the Authenticator 
+    before opening any sockets or devices and before starting any 
+    threads. ("spawn" isn't an option since it would re-run the server 
+    script in every worker.) The loop that the results are handed back
+    to can be set afterwards, but it must be set before verify() is 
+    called.
+
+    If the pool breaks (a worker process is killed, say) it can't be 
+    restarted safely since other threads are running by then, so the
+    checks carry on inline from that point. Errors go to log (a Logger)
+    if one is given and are counted in errors.
+    """
+    def __init__(self, public_key_pem: bytes, loop = None, workers: int = 2,
+        use_processes: bool = False, log = None):
+        self.loop = loop
+        self.log = log
+        self.errors = 0
+        self.public_key = serialization.load_pem_public_key(public_key_pem)
+        if workers == 0:
+            self._pool = None
+        elif use_processes:
+            self._pool = concurrent.futures.ProcessPoolExecutor(workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker, initargs=(public_key_pem,))
+            # The first job starts all of the workers
+            self._pool.submit(int).result()
+        else:
+            self._pool = concurrent.futures.ThreadPoolExecutor(workers,
+                thread_name_prefix="auth")
+
+    def verify(self, rsa_result: bytes, challenge: str, callback):
+        """
+        Checks the signature and then calls callback(ok) on the loop
+        thread. With no pool the callback runs before this returns.
+        """
+        if self._pool is not None:
+            try:
+                if isinstance(self._pool, concurrent.futures.ProcessPoolExecutor):
+                    future = self._pool.submit(_verify_in_worker, rsa_result, challenge)
+                else:
+                    future = self._pool.submit(verify_rsa_challenge, self.public_key,
+                        rsa_result, challenge)
+            except concurrent.futures.BrokenExecutor as ex:
+                self._pool_failed(ex)
+        if self._pool is None:
+            callback(verify_rsa_challenge(self.public_key, rsa_result, challenge))
+            return
+        # The done callback runs on the worker (or a pool management)
+        # thread so the result is passed over to the loop
+        future.add_done_callback(lambda f:
+            self.loop.call_soon_threadsafe(lambda: 
+                callback(self._result(f, rsa_result, challenge))))
+
+    def _result(self, future, rsa_result: bytes, challenge: str):
+        # Runs on the loop thread
+        try:
+            return future.result()
+        except concurrent.futures.BrokenExecutor as ex:
+            self._pool_failed(ex)
+            # The signature itself wasn't the problem, so check it here
+            return verify_rsa_challenge(self.public_key, rsa_result, challenge)
+        except Exception as ex:
+            self.errors += 1
+            if self.log is not None:
+                self.log.error("auth", "Signature check failed", error=repr(ex))
+            return False
+
+    def _pool_failed(self, ex):
+        self.errors += 1
+        # Every job that was in the pool fails, so only the first one 
+        # switches over
+        if self._pool is None:
+            return
+        if self.log is not None:
+            self.log.error("auth", "Signature check pool failed, checking inline",
+                error=repr(ex))
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
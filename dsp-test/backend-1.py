@@ -0,0 +1,107 @@
+# Runs the capture and playback resampling path from a WAV file to a WAV
+# file through the audio backends (see audiodev.py), without a sound card.
+# The capture isn't paced, so it runs as fast as the DSP allows and gives
+# the same output every time. Also checks that the null capture device
+# keeps to real time.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import wave
+import numpy as np
+sys.path.append("..")
+from audiodev import WavCapture, WavPlayback, NullCapture, NullPlayback
+from audio import AudioThread
+from logger import Logger, INFO
+from dsp import Upsampler, Downsampler, make_s16_le, ASL_LPF_TAPS, ASL_LPF_SHIFT
+
+BLOCK = 960
+RATE = 48000
+
+def make_input(path, seconds):
+    t = np.arange(0, RATE * seconds)
+    tone = 8000 * np.sin(2 * np.pi * 430 * t / RATE) + 4000 * np.sin(2 * np.pi * 1870 * t / RATE)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(tone.astype('<i2').tobytes())
+
+def run(in_path, out_path):
+    capture = WavCapture(in_path, BLOCK, RATE, repeat=False, paced=False)
+    play = WavPlayback(out_path, RATE)
+    downsampler = Downsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT)
+    upsampler = Upsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT)
+    out = np.zeros(BLOCK, dtype='<i2')
+    blocks = 0
+    start = time.perf_counter()
+    while True:
+        n, data = capture.read()
+        if n == 0:
+            break
+        pcm_8k = downsampler.process(np.frombuffer(data, dtype='<i2'))
+        play.write(make_s16_le(upsampler.process(make_s16_le(pcm_8k)), out))
+        blocks += 1
+    elapsed = time.perf_counter() - start
+    capture.close()
+    play.close()
+    with open(out_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return blocks, elapsed, digest
+
+with tempfile.TemporaryDirectory() as d:
+    in_path = os.path.join(d, "in.wav")
+    make_input(in_path, 10)
+    blocks, elapsed, digest = run(in_path, os.path.join(d, "out1.wav"))
+    print(f"{blocks} blocks in {elapsed:.3f}s ({blocks / elapsed:.0f} blocks/s, "
+        f"{blocks * 0.02 / elapsed:.0f}x real time)")
+    _, _, digest2 = run(in_path, os.path.join(d, "out2.wav"))
+    assert digest == digest2
+    with wave.open(os.path.join(d, "out1.wav"), "rb") as f:
+        assert f.getnframes() == blocks * BLOCK
+    print("Output is the same on every run:", digest)
+
+null = NullCapture(BLOCK, RATE)
+start = time.perf_counter()
+for _ in range(0, 50):
+    null.read()
+elapsed = time.perf_counter() - start
+print(f"Null capture: 50 blocks in {elapsed:.3f}s")
+assert abs(elapsed - 1.0) < 0.1
+
+# A capture device that reports an overrun now and then and raises every
+# 20th read. The audio thread should count both, reopen the devices and
+# keep going.
+class FlakyCapture(NullCapture):
+    reads = 0
+    def read(self):
+        FlakyCapture.reads += 1
+        if FlakyCapture.reads % 20 == 0:
+            raise OSError("device unplugged")
+        if FlakyCapture.reads % 7 == 0:
+            return -32, b""
+        return super().read()
+
+log = Logger(INFO)
+log.start()
+thread = AudioThread(None, None, BLOCK, open_devices=lambda: (NullPlayback(),
+    FlakyCapture(BLOCK, RATE)), log=log, retry_min_s=0.01)
+thread.start()
+captured = 0
+start = time.perf_counter()
+while time.perf_counter() - start < 1.5:
+    if thread.capture_ring.read_block() is not None:
+        thread.capture_ring.release()
+        captured += 1
+    time.sleep(0.005)
+thread.stop()
+thread.join()
+log.stop()
+print(f"Flaky capture: {captured} blocks, {thread.capture_errors} read errors, "
+    f"{thread.device_errors} device errors, {thread.reopens} reopens")
+assert not thread.is_alive()
+assert thread.device_errors >= 2 and thread.reopens == thread.device_errors
+assert thread.capture_errors > 0 and captured > 40
@@ -0,0 +1,49 @@
+# Check of the capture backlog limit (see AudioThread.trim_capture()).
+# The "sound card" delivers a 430Hz tone 2% faster than the 20ms tick
+# takes it. The depth (and so the latency) has to stay bounded for both
+# policies, and compress should cut the tone without a click.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import sys
+import numpy as np
+sys.path.append("..")
+from audio import AudioThread, DROP_OLDEST, COMPRESS
+
+BLOCK = 960
+TICKS = 5000
+
+def run(policy):
+    a = AudioThread(None, None, BLOCK, ring_blocks=8, capture_max_depth=3,
+        capture_policy=policy)
+    t = 0
+    produced = 0.0
+    out = []
+    max_depth = 0
+    for tick in range(0, TICKS):
+        # 1.02 blocks per tick
+        produced += 1.02
+        while produced >= 1:
+            tone = (8000 * np.sin(2 * np.pi * 430 * (t + np.arange(0, BLOCK)) / 48000)).astype(np.int16)
+            if not a.capture_ring.put(tone):
+                a.capture_overruns += 1
+            t += BLOCK
+            produced -= 1
+        a.trim_capture()
+        max_depth = max(max_depth, len(a.capture_ring))
+        block = a.capture_ring.read_block()
+        if block is not None:
+            out.append(block.copy())
+            a.capture_ring.release()
+    audio = np.concatenate(out).astype(np.int32)
+    # The biggest sample to sample step. The tone alone steps by about
+    # 8000 * 2 * pi * 430 / 48000 = 450.
+    step = np.max(np.abs(np.diff(audio)))
+    print(f"{policy:12s} depth {max_depth} high-water {a.capture_ring.high_water} "
+        f"drops {a.capture_drops} compressions {a.capture_compressions} "
+        f"overruns {a.capture_overruns} max step {step}")
+    assert max_depth <= 3
+    assert a.capture_overruns == 0
+    return step
+
+run(DROP_OLDEST)
+assert run(COMPRESS) < 1000
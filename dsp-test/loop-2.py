@@ -9,10 +9,11 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization
 from scipy.signal import firwin, lfilter, lfilter_zi
 import numpy as np
-# TODO: THIS IS DEPRECATED AS OF PYTHON 3.13, NEED TO REPLACE
-import audioop
 import alsaaudio
-import struct
+import sys
+# The codec lives in the top-level directory
+sys.path.append("..")
+from g711 import ulaw_encode, ulaw_decode
 
 # ===========================================================================
 # USER CONFIGURATION AREA - PLEASE CUSTOMIZE HERE
@@ -22,24 +23,10 @@ audio_device_name = "default"
 # ===========================================================================
 
 def encode_ulaw(pcm_data):
-    # TODO: REMOVE DEPENDENCY ON THIS DEPRECATED LIBRARY
-    return audioop.lin2ulaw(pcm_data, 2)
+    return ulaw_encode(pcm_data).tobytes()
 
 def decode_ulaw(g711_data: bytes):
-    # TODO: REMOVE DEPENDENCY ON THIS DEPRECATED LIBRARY
-    # Testing has shown that this created little-endian integers
-    b = audioop.ulaw2lin(g711_data, 2)
-    return struct.unpack(f'<{160}h', b)
-
-"""
-# TEST
-a = bytearray()
-a.append(0b10000000)
-r = audioop.ulaw2lin(a, 2)
-# Show that the result is in little endian format
-print((r[1] << 8 | r[0]) >> 2)
-quit()
-"""
+    return ulaw_decode(g711_data)
 
 # Audio output setup
 audio_device_play = alsaaudio.PCM(channels=1, rate=48000, format=alsaaudio.PCM_FORMAT_S16_LE, 
@@ -0,0 +1,38 @@
+# Check and timing of the conference mixer. The per-tick cost should 
+# grow linearly with the number of parties.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import sys
+import time
+import numpy as np
+sys.path.append("..")
+from mixer import ConferenceMixer
+from g711 import ulaw_encode
+
+# Correctness against a brute force mix, including saturation
+m = ConferenceMixer(8)
+slots = [m.join() for _ in range(0, 5)]
+frames = np.random.randint(-20000, 20000, (5, 160)).astype(np.int16)
+for slot, frame in zip(slots, frames):
+    m.write(slot, frame)
+mixes, mixes_ulaw = m.mix()
+expected = np.array([np.clip(sum(frames[j].astype(np.int32) for j in range(0, 5) if j != i),
+    -32768, 32767) for i in range(0, 5)])
+print("Mix mismatches", np.count_nonzero(mixes != expected))
+print("u-law mismatches", np.count_nonzero(mixes_ulaw != ulaw_encode(expected.astype(np.int16))))
+print("Cleared after mix", m.fresh_count() == 0)
+
+# Cost per tick as the conference grows (u-law in, u-law out)
+print("parties   us/tick   us/party")
+for n in (2, 4, 8, 16, 32, 64, 128, 256):
+    m = ConferenceMixer(n)
+    slots = [m.join() for _ in range(0, n)]
+    g711 = ulaw_encode(np.random.randint(-8000, 8000, (n, 160)).astype(np.int16))
+    ticks = 2000
+    start = time.perf_counter()
+    for _ in range(0, ticks):
+        for slot in slots:
+            m.write_ulaw(slot, g711[slot])
+        m.mix()
+    us = (time.perf_counter() - start) / ticks * 1e6
+    print(f"{n:7d} {us:9.1f} {us / n:10.2f}")
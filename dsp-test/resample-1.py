@@ -0,0 +1,83 @@
+# Check of the polyphase resamplers against the original lfilter() approach
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import sys
+import timeit
+import numpy as np
+from scipy.signal import firwin, lfilter
+sys.path.append("..")
+from dsp import Upsampler, Downsampler, SosFilter
+from dsp import ASL_LPF_TAPS, ASL_LPF_SHIFT, ASL_HPF_B, ASL_HPF_A
+
+sample_rate = 48000
+nyq_rate = sample_rate / 2.0
+lpf_taps = firwin(31, 4300 / nyq_rate, window=('kaiser', 3.0))
+
+rng = np.random.default_rng(1)
+blocks = 50
+x_8k = rng.integers(-20000, 20000, 160 * blocks).astype(np.int16)
+x_48k = rng.integers(-20000, 20000, 960 * blocks).astype(np.int16)
+
+# The original upsample(): repeat each sample 6 times, then filter
+expected = lfilter(lpf_taps, [1.0], np.repeat(x_8k, 6))
+us = Upsampler(lpf_taps, 6)
+actual = np.concatenate([us.process(x_8k[i:i + 160]) for i in range(0, len(x_8k), 160)])
+print("Upsample max error", np.max(np.abs(actual - expected)))
+
+# The original downsample(): filter everything, then keep every 6th
+expected = lfilter(lpf_taps, [1.0], x_48k)[::6]
+ds = Downsampler(lpf_taps, 6)
+actual = np.concatenate([ds.process(x_48k[i:i + 960]) for i in range(0, len(x_48k), 960)])
+print("Downsample max error", np.max(np.abs(actual - expected)))
+
+# Decimator with the hpass6() high-pass fused on the back end
+expected = lfilter(ASL_HPF_B, ASL_HPF_A, lfilter(lpf_taps, [1.0], x_48k)[::6])
+ds_hpf = Downsampler(lpf_taps, 6, post_filter=SosFilter(ASL_HPF_B, ASL_HPF_A))
+actual = np.concatenate([ds_hpf.process(x_48k[i:i + 960]) for i in range(0, len(x_48k), 960)])
+print("Downsample + HPF max error", np.max(np.abs(actual - expected)))
+
+# Fixed-point mode vs. a sample-at-a-time model of lpass() in 
+# chan_simpleusb.c: a 31 sample history, int accumulator, >> 15.
+def lpass_model(pcm_data_48k):
+    history = [0] * len(ASL_LPF_TAPS)
+    result = []
+    for s in pcm_data_48k:
+        history = [int(s)] + history[:-1]
+        accum = 0
+        for h, c in zip(history, ASL_LPF_TAPS):
+            accum += h * int(c)
+        result.append(accum >> ASL_LPF_SHIFT)
+    return np.array(result)
+
+x_8k_short = x_8k[0:160 * 5]
+x_48k_short = x_48k[0:960 * 5]
+us_fixed = Upsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT)
+actual = np.concatenate([us_fixed.process(x_8k_short[i:i + 160]) for i in range(0, len(x_8k_short), 160)])
+expected = lpass_model(np.repeat(x_8k_short, 6))
+print("Fixed-point upsample mismatches", np.count_nonzero(actual != expected))
+ds_fixed = Downsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT)
+actual = np.concatenate([ds_fixed.process(x_48k_short[i:i + 960]) for i in range(0, len(x_48k_short), 960)])
+expected = lpass_model(x_48k_short)[::6]
+print("Fixed-point downsample mismatches", np.count_nonzero(actual != expected))
+# The filters accumulate in float64, so make sure that full-scale input
+# still comes out exact
+x_full = np.tile(np.array([32767, 32767, -32768, -32768], dtype=np.int16), 240)
+actual = Upsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT).process(x_full[0:160])
+expected = lpass_model(np.repeat(x_full[0:160], 6))
+print("Fixed-point full-scale upsample mismatches", np.count_nonzero(actual != expected))
+actual = Downsampler(ASL_LPF_TAPS, 6, ASL_LPF_SHIFT).process(x_full)
+expected = lpass_model(x_full)[::6]
+print("Fixed-point full-scale downsample mismatches", np.count_nonzero(actual != expected))
+
+# Cost per 20ms block
+n = 2000
+t = timeit.timeit(lambda: us.process(x_8k[0:160]), number=n)
+print("Upsample us/block", 1e6 * t / n)
+t = timeit.timeit(lambda: ds.process(x_48k[0:960]), number=n)
+print("Downsample us/block", 1e6 * t / n)
+t = timeit.timeit(lambda: ds_hpf.process(x_48k[0:960]), number=n)
+print("Downsample + HPF us/block", 1e6 * t / n)
+t = timeit.timeit(lambda: us_fixed.process(x_8k[0:160]), number=n)
+print("Fixed-point upsample us/block", 1e6 * t / n)
+t = timeit.timeit(lambda: ds_fixed.process(x_48k[0:960]), number=n)
+print("Fixed-point downsample us/block", 1e6 * t / n)
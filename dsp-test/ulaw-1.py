@@ -0,0 +1,27 @@
+# Check of the table-driven u-law codec against the old audioop library
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# NOTE: audioop was removed in Python 3.13 so this needs to be run
+# on Python 3.12 or earlier.
+#
+import audioop
+import sys
+import numpy as np
+sys.path.append("..")
+from g711 import ulaw_encode, ulaw_decode
+
+# Every possible 16-bit input
+pcm = np.arange(-32768, 32768, dtype=np.int16)
+expected = np.frombuffer(audioop.lin2ulaw(pcm.astype('<i2').tobytes(), 2), dtype=np.uint8)
+actual = ulaw_encode(pcm)
+print("Encode mismatches", np.count_nonzero(actual != expected), "of", len(pcm))
+
+# Every possible u-law byte
+g711 = bytes(range(0, 256))
+expected = np.frombuffer(audioop.ulaw2lin(g711, 2), dtype='<i2')
+actual = ulaw_decode(g711)
+print("Decode mismatches", np.count_nonzero(actual != expected), "of", len(g711))
+
+# Many frames in one call: 8 calls x 160 samples
+frames = pcm[0:160 * 8].reshape(8, 160)
+print("Batch shape", ulaw_encode(frames).shape, ulaw_decode(ulaw_encode(frames)).shape)
@@ -0,0 +1,268 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Streaming DSP building blocks used on the audio path between the
+# 8kHz network side and the 48kHz USB audio side.
+#
+# Please see https://mackinnon.info/2025/10/24/asl-usb-audio.html for
+# background on the resampling filters.
+#
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import tf2sos, sosfilt
+try:
+    # The compiled kernel behind sosfilt() works in place and skips the 
+    # argument checking, which costs more than the filtering itself on a 
+    # 160 sample block. It's private, so it's checked against the public
+    # function below and the public one is used if it has moved or 
+    # changed.
+    from scipy.signal._sosfilt import _sosfilt
+except ImportError:
+    _sosfilt = None
+
+# The 31-tap 48kHz LPF from chan_simpleusb.c. These are Q15 integers and
+# the ASL code shifts the accumulator right by 15 bits after each output.
+# See dsp-test/lpf-1.py for a comparison with the firwin() design.
+ASL_LPF_TAPS = np.array([ 103, 136, 148, 74, -113, -395, -694,
+    -881, -801, -331, 573, 1836, 3265, 4589, 5525, 5864, 5525,
+    4589, 3265, 1836, 573, -331, -801, -881, -694, -395, -113,
+    74, 148, 136, 103 ], dtype=np.int32)
+ASL_LPF_SHIFT = 15
+
+# hpass6() from chan_simpleusb.c: a 6th order Chebyshev high-pass at 300Hz
+# with 0.5dB of ripple, designed for 8kHz. This keeps CTCSS tones and hum
+# off the network. See dsp-test/hpf-1.py.
+ASL_HPF_GAIN = 1.745882764
+ASL_HPF_B = np.array([ 1, -6, 15, -20, 15, -6, 1 ]) / ASL_HPF_GAIN
+ASL_HPF_A = np.array([ 1, -4.8664511065, 9.9896695552, -11.0685981760, 
+    6.9905126572, -2.3932556573, 0.3491861578 ])
+
+def _float_taps(taps, shift):
+    # The filters always run in float64, which takes the BLAS path for
+    # the matrix products (NumPy's int32 products don't have one and are
+    # about twice as slow). For the integer mode the taps are scaled by
+    # 2**-shift up front. That's exact, and with 16-bit inputs every
+    # product and sum is a multiple of 2**-shift well inside the 53-bit
+    # mantissa, so the result is exactly the C code's accumulator over
+    # 2**shift. Flooring it is then the same as its arithmetic right 
+    # shift.
+    taps = np.asarray(taps, dtype=np.float64)
+    if shift is not None:
+        taps = taps * 2.0 ** -shift
+    return taps
+
+def _floor_int32(result):
+    return np.floor(result, out=result).astype(np.int32)
+
+class Upsampler:
+    """
+    Stateful polyphase 1:L interpolator.
+
+    The original implementation repeated every 8K sample L times and then
+    ran the LPF over the expanded block. Repeating a sample L times is the
+    same as zero-stuffing followed by an L-tap boxcar, so the boxcar is
+    folded into the LPF and the result is split into L short sub-filters
+    (one per output phase) that run at the low rate. Only the samples that
+    are actually needed get computed.
+
+    Create one of these per stream (i.e. per device or per call) since
+    it holds the filter history between blocks.
+
+    If shift is given the taps are treated as integers and the output
+    is the integer accumulator shifted right by that many bits. This is
+    only there to match chan_simpleusb.c sample for sample (with 
+    ASL_LPF_TAPS and ASL_LPF_SHIFT). It costs a little more than the
+    plain float filter and doesn't sound any better.
+    """
+    def __init__(self, taps, factor: int = 6, shift: int = None):
+        self.factor = factor
+        self.shift = shift
+        h = np.convolve(_float_taps(taps, shift), np.ones(factor))
+        # Pad the filter out to a whole number of phases
+        k = -(-len(h) // factor)
+        h = np.concatenate([h, np.zeros(k * factor - len(h))])
+        # Row k, column p holds h[k * L + p], the k'th tap of the p'th
+        # sub-filter. The rows are reversed so that they line up with
+        # an oldest-first window of input samples.
+        self._phases = np.ascontiguousarray(h.reshape(k, factor)[::-1])
+        self._k = k
+        # Input history (oldest first) followed by room for the next block
+        self._buf = np.zeros(k - 1)
+        self._windows = None
+
+    def reset(self):
+        self._buf[:] = 0
+
+    def process(self, pcm_data):
+        """
+        Takes a block of N low-rate samples and returns N * L high-rate
+        samples (float64, or int32 if there is a shift).
+        """
+        x = np.asarray(pcm_data)
+        n = len(x)
+        h = self._k - 1
+        if len(self._buf) != h + n:
+            buf = np.zeros(h + n)
+            buf[:h] = self._buf[:h]
+            self._buf = buf
+            # One row per input sample, each row is the K most recent
+            # inputs. This is a view so it only needs to be built once.
+            self._windows = sliding_window_view(self._buf, self._k)
+        self._buf[h:] = x
+        result = (self._windows @ self._phases).reshape(n * self.factor)
+        if self.shift is not None:
+            result = _floor_int32(result)
+        # Carry the tail forward for continuity with the next block
+        self._buf[:h] = self._buf[n:]
+        return result
+
+class Downsampler:
+    """
+    Stateful L:1 decimator. Only every L'th output of the anti-aliasing
+    LPF is kept, so only those outputs are computed: one dot product of
+    the taps against the most recent input samples per output sample.
+
+    Blocks must contain a multiple of L samples so that the decimation
+    phase is preserved from one block to the next.
+
+    The shift argument selects the chan_simpleusb.c compatible output,
+    see Upsampler.
+
+    An optional post_filter (anything with a process() method, normally
+    a SosFilter) is run on the low-rate output inside of process() so 
+    that the decimated block is filtered before it is ever handed back.
+    """
+    def __init__(self, taps, factor: int = 6, shift: int = None, post_filter = None):
+        self.factor = factor
+        self.shift = shift
+        self.post_filter = post_filter
+        # Reversed so that they line up with an oldest-first window
+        self._taps = np.ascontiguousarray(_float_taps(taps, shift)[::-1])
+        self._n_taps = len(self._taps)
+        self._buf = np.zeros(self._n_taps - 1)
+        self._windows = None
+
+    def reset(self):
+        self._buf[:] = 0
+        if self.post_filter is not None:
+            self.post_filter.reset()
+
+    def process(self, pcm_data):
+        """
+        Takes a block of N * L high-rate samples and returns N low-rate
+        samples (float64, or int32 if there is a shift and no 
+        post_filter).
+        """
+        x = np.asarray(pcm_data)
+        n = len(x)
+        if n % self.factor != 0:
+            raise ValueError(f"Block length {n} is not a multiple of {self.factor}")
+        h = self._n_taps - 1
+        if len(self._buf) != h + n:
+            buf = np.zeros(h + n)
+            buf[:h] = self._buf[:h]
+            self._buf = buf
+            # Output j lines up with input sample j * L
+            self._windows = sliding_window_view(self._buf, self._n_taps)[::self.factor]
+        self._buf[h:] = x
+        result = self._windows @ self._taps
+        if self.shift is not None:
+            result = _floor_int32(result)
+        self._buf[:h] = self._buf[n:]
+        if self.post_filter is not None:
+            if result.dtype == np.float64:
+                # The decimator output is a fresh block so it can be 
+                # filtered in place
+                result = self.post_filter.process_in_place(result)
+            else:
+                result = self.post_filter.process(result)
+        return result
+
+def _check_sosfilt():
+    # Two blocks through a 2-section filter, so the carried state is 
+    # checked as well as the output
+    global _sosfilt
+    if _sosfilt is None:
+        return
+    sos = tf2sos([0.2, 0.3, 0.1, 0.05, 0.02], [1.0, -0.5, 0.25, -0.1, 0.05])
+    x = np.linspace(-1.0, 1.0, 32)
+    zi = np.zeros((sos.shape[0], 2))
+    expected = []
+    for block in (x[:16], x[16:]):
+        y, zi = sosfilt(sos, block, zi=zi)
+        expected.append(y)
+    try:
+        zi = np.zeros((1, sos.shape[0], 2))
+        actual = []
+        for block in (x[:16], x[16:]):
+            y = block.copy()
+            _sosfilt(sos, y.reshape(1, -1), zi)
+            actual.append(y)
+        ok = np.allclose(actual, expected)
+    except Exception:
+        ok = False
+    if not ok:
+        _sosfilt = None
+
+_check_sosfilt()
+
+class SosFilter:
+    """
+    Streaming IIR filter in second-order-section form. The transfer 
+    function is converted to SOS once up front since a 6th order filter 
+    in direct form is numerically touchy. The section state is carried 
+    from one block to the next.
+    """
+    def __init__(self, b, a):
+        self._sos = tf2sos(b, a)
+        # One signal, N sections, 2 state variables per section
+        self._zi = np.zeros((1, self._sos.shape[0], 2))
+
+    def reset(self):
+        self._zi[:] = 0
+
+    def process(self, pcm_data):
+        return self.process_in_place(np.array(pcm_data, dtype=np.float64))
+
+    def process_in_place(self, pcm_data):
+        """
+        Filters a contiguous 1-D float64 block in place and returns it.
+        """
+        if _sosfilt is None:
+            pcm_data[:], self._zi[0] = sosfilt(self._sos, pcm_data, zi=self._zi[0])
+        else:
+            _sosfilt(self._sos, pcm_data.reshape(1, -1), self._zi)
+        return pcm_data
+
+def make_s16_le(data, out=None):
+    """
+    Converts a block of samples to little-endian signed 16-bit. Anything
+    out of range is saturated rather than being allowed to wrap around,
+    and fractions are truncated toward zero like int(). The result is a
+    NumPy int16 array which can be passed directly to anything that 
+    accepts a buffer (e.g. alsaaudio's PCM.write()). If out is provided
+    the result is written there instead of allocating.
+    """
+    data = np.asarray(data)
+    if out is None:
+        out = np.empty(data.shape, dtype='<i2')
+    np.copyto(out, np.clip(data, -32768, 32767), casting='unsafe')
+    return out
@@ -0,0 +1,203 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# A minimal single-threaded event loop built on the selectors module 
+# (epoll on Linux). It sleeps until a file descriptor is readable or the
+# next timer deadline arrives, so an idle server uses no CPU.
+#
+# AsyncioEventLoop offers the same interface on top of an asyncio loop
+# so the same callbacks can share a loop with other asyncio code.
+#
+import asyncio
+import collections
+import heapq
+import itertools
+import selectors
+import select
+import socket
+
+class Timer:
+    """
+    Handle returned by EventLoop.call_at(). Call cancel() to stop the 
+    callback from running.
+    """
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class EventLoop:
+    """
+    The clock is a function that returns the current time in (fractional)
+    milliseconds. All deadlines are expressed on that clock.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self._selector = selectors.DefaultSelector()
+        self._timers = []
+        # Tie-breaker so that timers with equal deadlines run in order
+        self._timer_seq = itertools.count()
+        self._running = False
+        # Callbacks handed over from other threads, and the socket pair 
+        # used to wake the loop up when one arrives
+        self._pending = collections.deque()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, self._run_pending)
+
+    def add_reader(self, fileobj, callback):
+        """
+        Calls callback() whenever fileobj (a socket or file descriptor)
+        is readable.
+        """
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def add_poll_descriptors(self, descriptors, callback):
+        """
+        Registers a list of (fd, poll event mask) pairs as returned by 
+        alsaaudio's PCM.polldescriptors(). Calls callback() when any of
+        them is ready.
+        """
+        for fd, mask in descriptors:
+            events = 0
+            if mask & (select.POLLIN | select.POLLPRI):
+                events |= selectors.EVENT_READ
+            if mask & select.POLLOUT:
+                events |= selectors.EVENT_WRITE
+            if events:
+                self._selector.register(fd, events, callback)
+
+    def remove(self, fileobj):
+        self._selector.unregister(fileobj)
+
+    def call_at(self, deadline, callback):
+        """
+        Calls callback() once the clock reaches deadline (ms).
+        """
+        timer = Timer(deadline, callback)
+        heapq.heappush(self._timers, (deadline, next(self._timer_seq), timer))
+        return timer
+
+    def call_later(self, delay_ms, callback):
+        return self.call_at(self.clock() + delay_ms, callback)
+
+    def call_soon_threadsafe(self, callback):
+        """
+        Runs callback() on the loop thread as soon as possible. This is
+        the only method that may be called from another thread.
+        """
+        self._pending.append(callback)
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            # The loop already has plenty of wake-ups waiting
+            pass
+
+    def _run_pending(self):
+        try:
+            while self._wake_r.recv(256):
+                pass
+        except BlockingIOError:
+            pass
+        pending = self._pending
+        while pending:
+            pending.popleft()()
+
+    def stop(self):
+        self._running = False
+
+    def _run_timers(self):
+        timers = self._timers
+        now = self.clock()
+        while timers and timers[0][0] <= now:
+            timer = heapq.heappop(timers)[2]
+            if not timer.cancelled:
+                timer.callback()
+
+    def run_once(self):
+        # Sleep until the next deadline, or forever if there are no timers
+        timeout = None
+        timers = self._timers
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+        if timers:
+            timeout = max(0.0, (timers[0][0] - self.clock()) / 1000.0)
+        for key, _ in self._selector.select(timeout):
+            key.data()
+        self._run_timers()
+
+    def run(self):
+        self._running = True
+        while self._running:
+            self.run_once()
+
+class AsyncioEventLoop:
+    """
+    The EventLoop interface on top of an asyncio event loop. Deadlines 
+    are still expressed in milliseconds on the given clock and are 
+    converted to asyncio's clock when the timer is scheduled. The 
+    handles returned by call_at() are asyncio.TimerHandles, which have
+    the same cancel() method as Timer.
+    """
+    def __init__(self, clock, loop = None):
+        self.clock = clock
+        self.loop = loop if loop is not None else asyncio.new_event_loop()
+
+    def add_reader(self, fileobj, callback):
+        self.loop.add_reader(fileobj, callback)
+
+    def add_poll_descriptors(self, descriptors, callback):
+        for fd, mask in descriptors:
+            if mask & (select.POLLIN | select.POLLPRI):
+                self.loop.add_reader(fd, callback)
+            if mask & select.POLLOUT:
+                self.loop.add_writer(fd, callback)
+
+    def remove(self, fileobj):
+        self.loop.remove_reader(fileobj)
+        self.loop.remove_writer(fileobj)
+
+    def call_at(self, deadline, callback):
+        return self.loop.call_at(self.loop.time() + (deadline - self.clock()) / 1000.0, 
+            callback)
+
+    def call_later(self, delay_ms, callback):
+        return self.loop.call_later(delay_ms / 1000.0, callback)
+
+    def call_soon_threadsafe(self, callback):
+        self.loop.call_soon_threadsafe(callback)
+
+    def stop(self):
+        self.loop.stop()
+
+    def run_once(self):
+        # Runs one pass of the asyncio loop
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def run(self):
+        self.loop.run_forever()
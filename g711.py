@@ -0,0 +1,109 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Table-driven G.711 u-law codec. This replaces the audioop library
+# (removed in Python 3.13) and produces exactly the same results as
+# audioop.lin2ulaw(data, 2) and audioop.ulaw2lin(data, 2).
+#
+# Both directions work on NumPy arrays of any shape, so a whole tick's
+# worth of calls can be converted in one operation by stacking the
+# frames into an (N, 160) array.
+#
+import numpy as np
+
+# u-law constants (see ITU-T G.711 and the classic Sun g711.c)
+_BIAS = 0x84
+_CLIP = 8159
+# Upper end of each segment, in the 14-bit domain
+_SEG_UEND = [ 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF ]
+
+def _ulaw_to_linear16(u: int):
+    u = ~u & 0xff
+    t = ((u & 0x0f) << 3) + _BIAS
+    t <<= (u & 0x70) >> 4
+    return (_BIAS - t) if (u & 0x80) else (t - _BIAS)
+
+def _linear14_to_ulaw(pcm_val: int):
+    if pcm_val < 0:
+        pcm_val = -pcm_val
+        mask = 0x7f
+    else:
+        mask = 0xff
+    if pcm_val > _CLIP:
+        pcm_val = _CLIP
+    pcm_val += (_BIAS >> 2)
+    seg = 0
+    while seg < 8 and pcm_val > _SEG_UEND[seg]:
+        seg += 1
+    if seg >= 8:
+        return 0x7f ^ mask
+    return ((seg << 4) | ((pcm_val >> (seg + 1)) & 0x0f)) ^ mask
+
+# 256-entry decode table: u-law byte -> 16-bit linear
+ULAW_DECODE_TABLE = np.array([_ulaw_to_linear16(u) for u in range(0, 256)],
+    dtype=np.int16)
+
+# 16K-entry encode table. The encoder only looks at the top 14 bits of
+# each 16-bit sample, so the table is indexed by the 14-bit two's
+# complement value, which is just the unsigned 16-bit sample shifted
+# right by two.
+ULAW_ENCODE_TABLE = np.array(
+    [_linear14_to_ulaw(i - 16384 if i >= 8192 else i) for i in range(0, 16384)],
+    dtype=np.uint8)
+
+def _as_s16(pcm_data):
+    # Raw buffers (bytes, bytearray, memoryview) are S16_LE samples,
+    # anything else is treated as an array of samples.
+    if isinstance(pcm_data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(pcm_data, dtype='<i2').astype(np.int16, copy=False)
+    return np.asarray(pcm_data, dtype=np.int16)
+
+def _as_u8(g711_data):
+    if isinstance(g711_data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(g711_data, dtype=np.uint8)
+    return np.asarray(g711_data, dtype=np.uint8)
+
+def ulaw_encode(pcm_data, out=None):
+    """
+    Converts 16-bit linear PCM to u-law. The input can be a NumPy array
+    (any shape) or a bytes-like object holding S16_LE samples. Returns
+    a uint8 array with the same shape as the input. If out is provided
+    (any writable uint8 array or buffer) the result is written there
+    instead of allocating.
+    """
+    s = _as_s16(pcm_data)
+    idx = s.view(np.uint16) >> 2
+    if out is None:
+        return ULAW_ENCODE_TABLE[idx]
+    if not isinstance(out, np.ndarray):
+        out = np.frombuffer(out, dtype=np.uint8)
+    return np.take(ULAW_ENCODE_TABLE, idx, out=out.reshape(idx.shape))
+
+def ulaw_decode(g711_data, out=None):
+    """
+    Converts u-law to 16-bit linear PCM. The input can be a NumPy uint8
+    array (any shape) or a bytes-like object. Returns an int16 array
+    with the same shape as the input.
+    """
+    u = _as_u8(g711_data)
+    if out is None:
+        return ULAW_DECODE_TABLE[u]
+    return np.take(ULAW_DECODE_TABLE, u, out=out.reshape(u.shape))
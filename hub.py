@@ -0,0 +1,151 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Per-call state for a hub that carries many IAX2 calls at once. Each
+# call lives in a Call object and the CallTable indexes them two ways:
+#
+# * By local call number. This is the number we hand out to the peer
+#   and it comes back as the destination call number of full frames.
+# * By (peer address, peer's source call number). Mini-frames only carry
+#   the sender's source call number, so this is the key that routes
+#   voice in O(1).
+#
+from enum import Enum
+
+class State(Enum):
+    IDLE = 1
+    NEW2 = 2
+    # The AUTHREP signature is being checked
+    AUTHENTICATING = 3
+    RINGING = 4
+    IN_CALL = 5
+
+# Call numbers are 15 bits and zero means "not assigned yet"
+MAX_CALL_NUMBER = 0x7fff
+
+class Call:
+    """
+    Everything the hub needs to remember about one call. This uses
+    __slots__ to keep idle calls small (see net-test/calltable-1.py).
+    """
+    __slots__ = ("local_call", "remote_call", "addr", "state", "start_ms",
+        "start_stamp", "challenge", "expected_inseq", "outseq",
+        "voice_sent_count", "timer", "mixer_slot", "jitter_buffer", "rx_packets",
+        "rx_bytes", "tx_packets", "tx_bytes", "seq_errors")
+
+    def __init__(self, local_call: int, remote_call: int, addr,
+        start_ms: int, start_stamp: int):
+        self.local_call = local_call
+        self.remote_call = remote_call
+        self.addr = addr
+        self.state = State.IDLE
+        # The peer's timestamp on the NEW and our clock when it arrived.
+        # Our outbound timestamps are carried forward from there.
+        self.start_ms = start_ms
+        self.start_stamp = start_stamp
+        self.challenge = ""
+        self.expected_inseq = 0
+        self.outseq = 0
+        self.voice_sent_count = 0
+        # The pending timer (if any) so it can be cancelled on hangup
+        self.timer = None
+        # The call's row in the conference mixer once it has one
+        self.mixer_slot = None
+        # The call's inbound voice on its way to the mixer
+        self.jitter_buffer = None
+        # Traffic counters for the metrics
+        self.rx_packets = 0
+        self.rx_bytes = 0
+        self.tx_packets = 0
+        self.tx_bytes = 0
+        self.seq_errors = 0
+
+    def timestamp(self, now_ms: int):
+        return self.start_ms + (now_ms - self.start_stamp)
+
+class CallTable:
+    """
+    All of the active calls, indexed by local call number and by
+    (peer address, peer call number).
+
+    Local call numbers are handed out from first_call to last_call 
+    (inclusive). Multi-process hubs give each worker its own range, see
+    workers.py.
+    """
+    def __init__(self, max_calls: int = MAX_CALL_NUMBER, first_call: int = 1,
+        last_call: int = MAX_CALL_NUMBER):
+        self.max_calls = max_calls
+        self.first_call = first_call
+        self.last_call = last_call
+        self.by_local = {}
+        self.by_peer = {}
+        self._next_call = first_call
+
+    def __len__(self):
+        return len(self.by_local)
+
+    def __iter__(self):
+        return iter(self.by_local.values())
+
+    def _allocate_call_number(self):
+        # Hand the numbers out round-robin so that a number isn't reused
+        # right away by a new call while frames from the old one may
+        # still be in flight.
+        for _ in range(self.first_call, self.last_call + 1):
+            n = self._next_call
+            self._next_call = self.first_call if n == self.last_call else n + 1
+            if n not in self.by_local:
+                return n
+        return None
+
+    def create(self, remote_call: int, addr, start_ms: int, start_stamp: int):
+        """
+        Creates a call with a fresh local call number and indexes it.
+        Returns None if the table is full.
+        """
+        if len(self.by_local) >= self.max_calls:
+            return None
+        local_call = self._allocate_call_number()
+        if local_call is None:
+            return None
+        call = Call(local_call, remote_call, addr, start_ms, start_stamp)
+        self.by_local[local_call] = call
+        self.by_peer[(addr, remote_call)] = call
+        return call
+
+    def remove(self, call: Call):
+        # Anything still holding on to the call (e.g. a pending 
+        # authentication) can see that it is gone
+        call.state = State.IDLE
+        if call.timer is not None:
+            call.timer.cancel()
+            call.timer = None
+        self.by_local.pop(call.local_call, None)
+        self.by_peer.pop((call.addr, call.remote_call), None)
+
+    def find_local(self, local_call: int):
+        return self.by_local.get(local_call)
+
+    def find_peer(self, addr, remote_call: int):
+        return self.by_peer.get((addr, remote_call))
+
+    def in_state(self, state: State):
+        return [call for call in self.by_local.values() if call.state == state]
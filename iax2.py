@@ -0,0 +1,511 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# IAX2 (RFC 5456) framing helpers shared by the servers: frame header
+# parsing, information element encoding/decoding and frame builders.
+#
+import struct
+
+# Frame types (RFC 5456 section 8.2)
+FRAME_TYPE_VOICE = 2
+FRAME_TYPE_CONTROL = 4
+FRAME_TYPE_IAX = 6
+
+# IAX frame subclasses (RFC 5456 section 8.4)
+IAX_NEW = 1
+IAX_PING = 2
+IAX_PONG = 3
+IAX_ACK = 4
+IAX_HANGUP = 5
+IAX_ACCEPT = 7
+IAX_AUTHREQ = 8
+IAX_AUTHREP = 9
+IAX_LAGRQ = 11
+IAX_LAGRP = 12
+IAX_CALLTOKEN = 40
+
+# Control frame subclasses (RFC 5456 section 8.3)
+CONTROL_RINGING = 3
+CONTROL_ANSWER = 4
+CONTROL_STOP_SOUNDS = 255
+
+# Voice frame subclass for G.711 u-law
+VOICE_ULAW = 4
+
+# Information elements (RFC 5456 section 8.6)
+IE_USERNAME = 6
+IE_FORMAT = 9
+IE_AUTHMETHODS = 14
+IE_CHALLENGE = 15
+IE_RSA_RESULT = 17
+IE_CALLTOKEN = 54
+IE_FORMAT2 = 56
+
+# Dispatch key used for mini-frames. Frame type 0 is never used on a
+# full frame so this can't collide with a (frame type, subclass) key.
+MINI_FRAME = (0, 0)
+
+# Precompiled header layouts (network byte order)
+#   Full frame: source call (with F bit), dest call (with R bit), 
+#               timestamp, oseqno, iseqno, type, subclass (with C bit)
+#   Mini frame: source call, 16-bit timestamp
+FULL_HEADER = struct.Struct(">HHIBBBB")
+MINI_HEADER = struct.Struct(">HH")
+FULL_HEADER_SIZE = FULL_HEADER.size
+MINI_HEADER_SIZE = MINI_HEADER.size
+
+class FrameFormatError(Exception):
+    pass
+
+class FrameHeader:
+    """
+    The decoded header of a full frame or a mini-frame. The key
+    attribute is (frame type, raw subclass byte) for full frames and
+    MINI_FRAME for mini-frames, which makes it usable for looking up a
+    handler in a dispatch table. Since the raw subclass byte is used, 
+    subclasses with the C bit set will not match an ordinary entry.
+    """
+    __slots__ = ("full", "source_call", "dest_call", "r_bit", "timestamp",
+        "outseq", "inseq", "frame_type", "subclass", "c_bit", "key")
+
+    def __init__(self):
+        self.full = False
+        self.source_call = 0
+        self.dest_call = 0
+        self.r_bit = False
+        self.timestamp = 0
+        self.outseq = 0
+        self.inseq = 0
+        self.frame_type = 0
+        self.subclass = 0
+        self.c_bit = False
+        self.key = MINI_FRAME
+
+def parse_frame(frame, hdr: FrameHeader = None):
+    """
+    Decodes the header of a received frame with a single unpack. If
+    hdr is provided it is filled in and returned (no allocation), 
+    otherwise a new FrameHeader is created.
+    """
+    if hdr is None:
+        hdr = FrameHeader()
+    n = len(frame)
+    if n < MINI_HEADER_SIZE:
+        raise FrameFormatError(f"Frame too short ({n} bytes)")
+    if frame[0] & 0b10000000:
+        if n < FULL_HEADER_SIZE:
+            raise FrameFormatError(f"Full frame too short ({n} bytes)")
+        src, dst, ts, oseq, iseq, ftype, sub = FULL_HEADER.unpack_from(frame)
+        hdr.full = True
+        hdr.source_call = src & 0x7fff
+        hdr.dest_call = dst & 0x7fff
+        hdr.r_bit = dst > 0x7fff
+        hdr.timestamp = ts
+        hdr.outseq = oseq
+        hdr.inseq = iseq
+        hdr.frame_type = ftype
+        hdr.subclass = sub & 0x7f
+        hdr.c_bit = sub > 0x7f
+        hdr.key = (ftype, sub)
+    else:
+        src, ts = MINI_HEADER.unpack_from(frame)
+        hdr.full = False
+        hdr.source_call = src
+        hdr.dest_call = 0
+        hdr.r_bit = False
+        hdr.timestamp = ts
+        hdr.outseq = 0
+        hdr.inseq = 0
+        hdr.frame_type = FRAME_TYPE_VOICE
+        hdr.subclass = 0
+        hdr.c_bit = False
+        hdr.key = MINI_FRAME
+    return hdr
+
+def is_full_frame(frame):
+    return frame[0] & 0b10000000 == 0b10000000
+
+def is_mini_voice_packet(frame):
+    return frame[0] & 0b10000000 == 0b00000000
+
+def get_full_source_call(frame):
+    return ((frame[0] & 0b01111111) << 8) | frame[1]
+
+def get_full_r_bit(frame):
+    return frame[2] & 0b10000000 == 0b10000000
+
+def get_full_dest_call(frame):
+    return ((frame[2] & 0b01111111) << 8) | frame[3]
+
+def get_full_timestamp(frame):
+    return (frame[4] << 24) | (frame[5] << 16) | (frame[6] << 8) | frame[7]
+
+def get_full_outseq(frame):
+    return frame[8]
+
+def get_full_inseq(frame):
+    return frame[9]
+
+def get_full_type(frame):
+    return frame[10]
+
+def get_full_subclass_c_bit(frame):
+    return frame[11] & 0b10000000 == 0b10000000
+
+def get_full_subclass(frame):
+    return frame[11] & 0b01111111
+
+def make_information_element(id: int, content):
+    result = bytearray()
+    result += id.to_bytes(1, byteorder='big')
+    result += len(content).to_bytes(1, byteorder='big')
+    result += content
+    return result
+
+def encode_information_elements(ie_map: dict): 
+    result = bytearray()
+    for key in ie_map.keys():
+        if not isinstance(key, int):
+            raise Exception("Type error")
+        result += make_information_element(key, ie_map[key])
+    return result
+
+def decode_information_elements(data, offset: int = 0):
+    """
+    Takes a buffer containing zero or more information elements
+    (starting at offset) and unpacks it into a dictionary. The key of 
+    the dictionary is the integer element ID and the value is a 
+    memoryview slice of the original buffer with the content of the 
+    element, so nothing is copied. Use bytes() on a value if it needs to
+    outlive the buffer.
+
+    Raises FrameFormatError if the last element is truncated.
+    """
+    result = dict()
+    view = memoryview(data)
+    end = len(view)
+    i = offset
+    # Jump from one (id, length) header to the next
+    while i < end:
+        if i + 2 > end:
+            raise FrameFormatError(f"Truncated information element header at offset {i}")
+        ie_end = i + 2 + view[i + 1]
+        if ie_end > end:
+            raise FrameFormatError(f"Information element {view[i]} at offset {i} "
+                f"needs {view[i + 1]} bytes but only {end - i - 2} remain")
+        result[view[i]] = view[i + 2:ie_end]
+        i = ie_end
+    return result
+
+def find_information_element(data, ie_id: int, offset: int = 0):
+    """
+    Looks for a single information element without decoding the rest.
+    Returns a memoryview slice of the content, or None if the element 
+    isn't present. The elements are only validated up to the one that
+    is found.
+
+    Raises FrameFormatError if a truncated element is encountered.
+    """
+    view = memoryview(data)
+    end = len(view)
+    i = offset
+    while i < end:
+        if i + 2 > end:
+            raise FrameFormatError(f"Truncated information element header at offset {i}")
+        ie_end = i + 2 + view[i + 1]
+        if ie_end > end:
+            raise FrameFormatError(f"Information element {view[i]} at offset {i} "
+                f"needs {view[i + 1]} bytes but only {end - i - 2} remain")
+        if view[i] == ie_id:
+            return view[i + 2:ie_end]
+        i = ie_end
+    return None
+
+def is_NEW_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 6 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 1
+
+def is_ACK_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 6 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 4
+
+def is_HANGUP_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 6 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 5
+
+def is_LAGRQ_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 6 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 11
+
+def is_PING_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 6 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 2
+
+def is_VOICE_frame(frame):
+    return is_full_frame(frame) and \
+        get_full_type(frame) == 2 and \
+        get_full_subclass_c_bit(frame) == False and \
+        get_full_subclass(frame) == 4
+
+def make_frame_header(source_call: int, dest_call: int, timestamp: int, 
+    out_seq: int, in_seq: int, frame_type: int, frame_subclass: int):
+    # Set the F bit, clear the R bit. The sequence numbers and timestamp
+    # wrap naturally.
+    return bytearray(FULL_HEADER.pack(
+        (source_call & 0x7fff) | 0x8000, 
+        dest_call & 0x7fff, 
+        timestamp & 0xffffffff, 
+        out_seq & 0xff, 
+        in_seq & 0xff, 
+        frame_type, 
+        frame_subclass))
+
+# Information elements that never change, built once at startup
+AUTHREQ_METHODS_IE = bytes(make_information_element(IE_AUTHMETHODS, 
+    int(4).to_bytes(2, byteorder='big')))
+AUTHREQ_USERNAME_IE = bytes(make_information_element(IE_USERNAME, 
+    "allstar-sys".encode("utf-8")))
+ACCEPT_IES = bytes(encode_information_elements({ 
+    IE_FORMAT: int(4).to_bytes(4, byteorder='big'),
+    IE_FORMAT2: b'\x00\x00\x00\x00\x00\x00\x00\x00\x04'
+}))
+
+def make_CALLTOKEN_frame(source_call: int, dest_call: int, timestamp: int, 
+    out_seq: int, in_seq: int, token):
+    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
+        FRAME_TYPE_IAX, IAX_CALLTOKEN)
+    result += make_information_element(IE_CALLTOKEN, token)
+    return result
+
+def make_ACK_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
+        FRAME_TYPE_IAX, IAX_ACK)
+
+def make_AUTHREQ_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int, challenge: str):
+    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
+        FRAME_TYPE_IAX, IAX_AUTHREQ)
+    # Information elements
+    result += AUTHREQ_METHODS_IE
+    result += make_information_element(IE_CHALLENGE, challenge.encode("utf-8"))
+    result += AUTHREQ_USERNAME_IE
+    return result
+
+def make_ACCEPT_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
+        FRAME_TYPE_IAX, IAX_ACCEPT)
+    result += ACCEPT_IES
+    return result
+
+def make_RINGING_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 
+        FRAME_TYPE_CONTROL, CONTROL_RINGING)
+
+def make_ANSWER_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 
+        FRAME_TYPE_CONTROL, CONTROL_ANSWER)
+
+def make_STOP_SOUNDS_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 
+        FRAME_TYPE_CONTROL, CONTROL_STOP_SOUNDS)
+
+def make_LAGRP_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 
+        FRAME_TYPE_IAX, IAX_LAGRP)
+
+def make_PONG_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int):
+    return make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq, 
+        FRAME_TYPE_IAX, IAX_PONG)
+
+def make_VOICE_frame(source_call: int, dest_call: int, timestamp: int,
+    out_seq: int, in_seq: int, audio_block: bytes):
+    result = make_frame_header(source_call, dest_call, timestamp, out_seq, in_seq,
+        FRAME_TYPE_VOICE, VOICE_ULAW)
+    result += audio_block
+    return result
+
+def make_VOICE_miniframe(source_call: int, timestamp: int, audio_data: bytes):
+    # Per RFC 5456 section 8.1.2: the timestamp on a mini-frame is 
+    # just the lower 16 bits. The top bit of the call number is zero 
+    # to indicate a mini-frame.
+    result = bytearray(MINI_HEADER.pack(source_call & 0x7fff, timestamp & 0xffff))
+    result += audio_data
+    return result
+
+# Pieces of the full header that get packed separately by FrameBuilder
+_CALL_NUMBERS = struct.Struct(">HH")
+_CALL_NUMBER = struct.Struct(">H")
+_FULL_HEADER_TAIL = struct.Struct(">IBBBB")
+_MINI_TIMESTAMP = struct.Struct(">H")
+
+class FrameBuilder:
+    """
+    Builds outbound frames in place, in buffers that are allocated once 
+    and reused. One of these serves every call on a loop: each build
+    method takes the call numbers like the make_*_frame() functions do,
+    but they are only packed again when they change from the last 
+    frame, so a burst of frames for one call only packs the timestamp, 
+    sequence numbers, type and subclass.
+
+    Each build method returns a memoryview of the finished frame which 
+    is only valid until the next build, so send it right away. 
+
+    Voice goes out payload-in-place: the u-law encoder writes directly
+    into voice_payload or mini_payload and then voice() or mini() fills
+    in the header around it. Nothing is allocated on that path.
+    """
+    __slots__ = ("_full_calls", "_mini_call", "_full", "_full_view", "_mini", 
+        "_mini_view", "voice_payload", "mini_payload")
+
+    def __init__(self, payload_size: int = 160, buffer_size: int = 1024):
+        self._full = bytearray(buffer_size)
+        self._full_view = memoryview(self._full)
+        self._mini = bytearray(MINI_HEADER_SIZE + payload_size)
+        self._mini_view = memoryview(self._mini)
+        self.voice_payload = self._full_view[FULL_HEADER_SIZE:FULL_HEADER_SIZE + payload_size]
+        self.mini_payload = self._mini_view[MINI_HEADER_SIZE:]
+        # The call numbers currently packed into each buffer
+        self._full_calls = None
+        self._mini_call = None
+
+    def _header(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int, frame_type: int, frame_subclass: int):
+        calls = (source_call, dest_call)
+        if calls != self._full_calls:
+            # F bit set, R bit clear
+            _CALL_NUMBERS.pack_into(self._full, 0, (source_call & 0x7fff) | 0x8000, 
+                dest_call & 0x7fff)
+            self._full_calls = calls
+        _FULL_HEADER_TAIL.pack_into(self._full, 4, timestamp & 0xffffffff, 
+            out_seq & 0xff, in_seq & 0xff, frame_type, frame_subclass)
+
+    def _put(self, pos: int, data):
+        end = pos + len(data)
+        self._full[pos:end] = data
+        return end
+
+    def _put_ie(self, pos: int, ie_id: int, content):
+        self._full[pos] = ie_id
+        self._full[pos + 1] = len(content)
+        return self._put(pos + 2, content)
+
+    def frame(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int, frame_type: int, frame_subclass: int, payload = None):
+        """
+        A general full frame with an optional payload (i.e. encoded 
+        information elements).
+        """
+        self._header(source_call, dest_call, timestamp, out_seq, in_seq, frame_type, 
+            frame_subclass)
+        end = FULL_HEADER_SIZE
+        if payload is not None:
+            end = self._put(end, payload)
+        return self._full_view[0:end]
+
+    def ack(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_IAX, IAX_ACK)
+
+    def pong(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_IAX, IAX_PONG)
+
+    def lagrp(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_IAX, IAX_LAGRP)
+
+    def ringing(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_CONTROL, CONTROL_RINGING)
+
+    def answer(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_CONTROL, CONTROL_ANSWER)
+
+    def stop_sounds(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_CONTROL, CONTROL_STOP_SOUNDS)
+
+    def accept(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int):
+        return self.frame(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_IAX, IAX_ACCEPT, ACCEPT_IES)
+
+    def calltoken(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int, token):
+        self._header(source_call, dest_call, timestamp, out_seq, in_seq, FRAME_TYPE_IAX, 
+            IAX_CALLTOKEN)
+        end = self._put_ie(FULL_HEADER_SIZE, IE_CALLTOKEN, token)
+        return self._full_view[0:end]
+
+    def authreq(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int, challenge: str):
+        self._header(source_call, dest_call, timestamp, out_seq, in_seq, FRAME_TYPE_IAX, 
+            IAX_AUTHREQ)
+        end = self._put(FULL_HEADER_SIZE, AUTHREQ_METHODS_IE)
+        end = self._put_ie(end, IE_CHALLENGE, challenge.encode("utf-8"))
+        end = self._put(end, AUTHREQ_USERNAME_IE)
+        return self._full_view[0:end]
+
+    def voice(self, source_call: int, dest_call: int, timestamp: int, out_seq: int, 
+        in_seq: int, payload_size: int = 160):
+        """
+        A full voice frame around audio already written to voice_payload.
+        """
+        self._header(source_call, dest_call, timestamp, out_seq, in_seq, 
+            FRAME_TYPE_VOICE, VOICE_ULAW)
+        return self._full_view[0:FULL_HEADER_SIZE + payload_size]
+
+    def mini(self, source_call: int, timestamp: int):
+        """
+        A voice mini-frame around audio already written to mini_payload.
+        Per RFC 5456 section 8.1.2 only the low 16 bits of the timestamp 
+        are sent.
+        """
+        if source_call != self._mini_call:
+            # The top bit is zero to indicate a mini-frame
+            _CALL_NUMBER.pack_into(self._mini, 0, source_call & 0x7fff)
+            self._mini_call = source_call
+        _MINI_TIMESTAMP.pack_into(self._mini, 2, timestamp & 0xffff)
+        return self._mini_view
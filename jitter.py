@@ -0,0 +1,237 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Adaptive jitter buffer for inbound voice. Frames are stored by the
+# sender's timestamp (so they come out in order no matter how they
+# arrived) and released one per 20ms tick after a delay that follows the
+# measured network jitter. A missing frame is concealed by repeating the
+# last one at decreasing volume.
+#
+import numpy as np
+from g711 import ulaw_decode
+
+# Mini-frames only carry the low 16 bits of the timestamp
+def extend_timestamp(ts16: int, reference: int):
+    """
+    Rebuilds a full 32-bit timestamp from its low 16 bits, picking the
+    value closest to the reference (the newest full timestamp seen).
+    """
+    ts = (reference & ~0xffff) | ts16
+    if ts < reference - 0x8000:
+        ts += 0x10000
+    elif ts > reference + 0x8000:
+        ts -= 0x10000
+    return ts & 0xffffffff
+
+class JitterBuffer:
+    """
+    Holds the inbound voice of one call. All of the storage (capacity
+    frames of u-law plus the decoded output) is allocated up front.
+
+    put() stores a frame as it arrives. get() is called once per tick
+    and returns the next frame as 16-bit PCM, a concealment frame if
+    that one is missing, or None if there is nothing to play.
+
+    The playout delay tracks the interarrival jitter (estimated as in
+    RFC 3550 section 6.4.1): the target is about three times the jitter
+    plus a frame, kept between min_delay_ms and max_delay_ms. The delay
+    grows when the buffer runs dry and shrinks (by dropping a frame)
+    when the buffer is deeper than it needs to be.
+    """
+    def __init__(self, capacity: int = 32, block_size: int = 160, frame_ms: int = 20,
+        min_delay_ms: int = 40, max_delay_ms: int = 300, max_conceal: int = 5):
+        self.capacity = capacity
+        self.block_size = block_size
+        self.frame_ms = frame_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.max_conceal = max_conceal
+        self._payloads = np.zeros((capacity, block_size), dtype=np.uint8)
+        # Frame number held in each slot, -1 if empty. Frames are numbered
+        # from the first one of the talk spurt (see put()).
+        self._frame_nums = np.full(capacity, -1, dtype=np.int64)
+        self._pcm = np.zeros(block_size, dtype=np.int16)
+        # Newest full timestamp, used to extend mini-frame timestamps
+        self.last_timestamp = None
+        self.jitter_ms = 0.0
+        self.target_delay_ms = min_delay_ms
+        self._prev_arrival_ms = None
+        self._prev_timestamp = None
+        self._last_unwrapped = None
+        # Playout state
+        self._base_ts = None
+        self._base_count = 0
+        self._first_arrival_ms = None
+        self._play_frame = None
+        self._newest_frame = None
+        self._concealed_run = 0
+        # Stats
+        self.received = 0
+        self.late = 0
+        self.duplicates = 0
+        self.overflows = 0
+        self.concealed = 0
+        self.dropped = 0
+
+    def reset(self):
+        self._frame_nums[:] = -1
+        self.last_timestamp = None
+        self._last_unwrapped = None
+        self._prev_arrival_ms = None
+        self._prev_timestamp = None
+        self._base_ts = None
+        self._first_arrival_ms = None
+        self._play_frame = None
+        self._newest_frame = None
+        self._concealed_run = 0
+
+    def extend(self, ts16: int):
+        """
+        The full timestamp for a mini-frame's 16-bit timestamp, or None
+        if no full voice frame has arrived yet to place it against.
+        """
+        if self.last_timestamp is None:
+            return None
+        return extend_timestamp(ts16, self.last_timestamp)
+
+    def _unwrap(self, timestamp: int):
+        # Follows the 32-bit timestamp through wrap-around so that the
+        # frame numbers keep counting up
+        if self.last_timestamp is None:
+            self.last_timestamp = timestamp
+            self._last_unwrapped = timestamp
+            return timestamp
+        delta = (timestamp - self.last_timestamp) & 0xffffffff
+        if delta >= 0x80000000:
+            delta -= 0x100000000
+        ts = self._last_unwrapped + delta
+        if delta > 0:
+            self.last_timestamp = timestamp
+            self._last_unwrapped = ts
+        return ts
+
+    def put(self, timestamp: int, g711_data, arrival_ms: float):
+        """
+        Stores one frame of u-law. timestamp is the full 32-bit sender
+        timestamp (use extend() for mini-frames).
+        """
+        self.received += 1
+        ts = self._unwrap(timestamp)
+
+        # Interarrival jitter (RFC 3550)
+        if self._prev_arrival_ms is not None:
+            d = (arrival_ms - self._prev_arrival_ms) - (ts - self._prev_timestamp)
+            self.jitter_ms += (abs(d) - self.jitter_ms) / 16.0
+            self.target_delay_ms = min(self.max_delay_ms, max(self.min_delay_ms,
+                3.0 * self.jitter_ms + self.frame_ms))
+        self._prev_arrival_ms = arrival_ms
+        self._prev_timestamp = ts
+
+        # The frame number counts frame_ms steps from a base timestamp,
+        # rounded to the nearest. The base starts at the first frame's 
+        # timestamp and then follows the average phase of the sender's 
+        # stamps. The stamps don't have to be multiples of frame_ms, and
+        # they can wobble by a quarter of a frame or so either way without
+        # one frame landing in its neighbour's slot.
+        if self._play_frame is None:
+            self._base_ts = float(ts)
+            self._base_count = 1
+            self._frame_nums[:] = -1
+            self._first_arrival_ms = arrival_ms
+            self._play_frame = 0
+        offset = ts - self._base_ts
+        frame = int((offset + self.frame_ms / 2) // self.frame_ms)
+        # A running average of the first 16 frames, so the first frame's
+        # own error doesn't linger, then a slow moving average
+        if self._base_count < 16:
+            self._base_count += 1
+        self._base_ts += (offset - frame * self.frame_ms) / self._base_count
+        if frame < self._play_frame:
+            self.late += 1
+            return
+        elif frame >= self._play_frame + self.capacity:
+            self.overflows += 1
+            return
+
+        slot = frame % self.capacity
+        if self._frame_nums[slot] == frame:
+            self.duplicates += 1
+            return
+        self._payloads[slot] = np.frombuffer(g711_data, dtype=np.uint8)
+        self._frame_nums[slot] = frame
+        if self._newest_frame is None or frame > self._newest_frame:
+            self._newest_frame = frame
+
+    def depth_ms(self):
+        """
+        How much audio is buffered ahead of the playout point.
+        """
+        if self._play_frame is None:
+            return 0
+        return (self._newest_frame + 1 - self._play_frame) * self.frame_ms
+
+    def get(self, now_ms: float):
+        """
+        The next 20ms of audio as int16 PCM (valid until the next call),
+        or None.
+        """
+        if self._play_frame is None:
+            return None
+        # Build up the initial delay before anything comes out
+        if self._first_arrival_ms is not None:
+            if now_ms - self._first_arrival_ms < self.target_delay_ms:
+                return None
+            self._first_arrival_ms = None
+
+        slot = self._play_frame % self.capacity
+        if self._frame_nums[slot] == self._play_frame:
+            ulaw_decode(self._payloads[slot], out=self._pcm)
+            self._frame_nums[slot] = -1
+            self._play_frame += 1
+            self._concealed_run = 0
+            # Too much delay built up, skip a frame to catch up
+            if self.depth_ms() > self.target_delay_ms + 2 * self.frame_ms:
+                skip = self._play_frame % self.capacity
+                self._frame_nums[skip] = -1
+                self._play_frame += 1
+                self.dropped += 1
+            return self._pcm
+
+        # The frame is missing
+        if self.depth_ms() > 0:
+            # Later frames are here so this one is lost (or very late).
+            # Move past it.
+            self._play_frame += 1
+        elif self._concealed_run >= self.max_conceal:
+            # The sender has stopped so start over with the next frame
+            # that arrives
+            self._play_frame = None
+            self._newest_frame = None
+            return None
+        # Otherwise the buffer has run dry. The playout point is held so
+        # that the delay grows by a frame.
+        self._concealed_run += 1
+        if self._concealed_run > self.max_conceal:
+            return None
+        self.concealed += 1
+        # Repeat the last frame at half the volume each time
+        np.right_shift(self._pcm, 1, out=self._pcm)
+        return self._pcm
@@ -0,0 +1,181 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Leveled, structured logging that stays cheap on the packet path. A
+# record is just a tuple appended to an in-memory ring; a background
+# thread turns the records into text and writes them out. A disabled
+# level costs one attribute check when the caller guards with the
+# *_on flags:
+#
+#   if log.debug_on:
+#       log.debug("tx", "Sending ACK", frame=bytes(resp), outseq=call.outseq)
+#
+# Anything that can change after the call (like a reused frame buffer)
+# must be copied into the record, since it is formatted later.
+#
+# Records look like this (the fields are key=value, logfmt style):
+#
+#   2025-10-18 12:00:00.123 WARNING rx "Inbound sequence error" call=3 suppressed=12
+#
+# A category can be rate limited (a token bucket) so that a flood of the
+# same warning doesn't swamp the output. The number of records dropped
+# is reported on the next one that gets through.
+#
+import collections
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = { DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR" }
+
+def parse_level(name: str):
+    for level, level_name in LEVEL_NAMES.items():
+        if level_name == name.upper():
+            return level
+    raise Exception("Unknown log level " + name)
+
+class _Limit:
+
+    __slots__ = ("rate", "burst", "tokens", "last", "suppressed")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.suppressed = 0
+
+class Logger(threading.Thread):
+    """
+    Holds up to capacity records that haven't been written out yet. If
+    the writer can't keep up the oldest records are lost (and counted in
+    lost).
+    """
+    def __init__(self, level: int = INFO, capacity: int = 4096, stream = None,
+        flush_interval_s: float = 0.1):
+        super().__init__(name="logger", daemon=True)
+        self.stream = stream if stream is not None else sys.stdout
+        self.capacity = capacity
+        self.flush_interval_s = flush_interval_s
+        # deque.append() and popleft() are atomic so the ring needs no lock
+        self._ring = collections.deque(maxlen=capacity)
+        self._limits = {}
+        self._wake = threading.Event()
+        self._running = True
+        self.lost = 0
+        self.set_level(level)
+
+    def set_level(self, level: int):
+        self.level = level
+        self.debug_on = level <= DEBUG
+        self.info_on = level <= INFO
+        self.warning_on = level <= WARNING
+
+    def limit(self, category: str, per_second: float, burst: int = 5):
+        """
+        Lets at most burst records of the category through at once, and
+        per_second after that.
+        """
+        self._limits[category] = _Limit(per_second, burst)
+
+    def log(self, level: int, category: str, msg: str, **fields):
+        if level < self.level:
+            return
+        limit = self._limits.get(category)
+        if limit is not None:
+            now = time.monotonic()
+            limit.tokens = min(limit.burst, limit.tokens + (now - limit.last) * limit.rate)
+            limit.last = now
+            if limit.tokens < 1.0:
+                limit.suppressed += 1
+                return
+            limit.tokens -= 1.0
+            if limit.suppressed:
+                fields["suppressed"] = limit.suppressed
+                limit.suppressed = 0
+        if len(self._ring) == self.capacity:
+            self.lost += 1
+        self._ring.append((time.time(), level, category, msg, fields))
+
+    def debug(self, category: str, msg: str, **fields):
+        self.log(DEBUG, category, msg, **fields)
+
+    def info(self, category: str, msg: str, **fields):
+        self.log(INFO, category, msg, **fields)
+
+    def warning(self, category: str, msg: str, **fields):
+        self.log(WARNING, category, msg, **fields)
+
+    def error(self, category: str, msg: str, **fields):
+        self.log(ERROR, category, msg, **fields)
+
+    def stop(self):
+        """
+        Writes out whatever is left and stops the thread.
+        """
+        self._running = False
+        self._wake.set()
+        self.join()
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                record = self._ring.popleft()
+            except IndexError:
+                break
+            lines.append(format_record(record))
+        if lines:
+            lines.append("")
+            self.stream.write("\n".join(lines))
+            self.stream.flush()
+
+    def run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval_s)
+            self.flush()
+        self.flush()
+
+def _format_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, tuple):
+        # Addresses come out as ip:port
+        return ":".join(str(v) for v in value)
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    text = str(value)
+    if text == "" or " " in text or "\"" in text or "=" in text:
+        return "\"" + text.replace("\"", "\\\"") + "\""
+    return text
+
+def format_record(record):
+    t, level, category, msg, fields = record
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int(t * 1000) % 1000:03d}"
+    line = f"{stamp} {LEVEL_NAMES.get(level, level)} {category} {_format_value(msg)}"
+    for key, value in fields.items():
+        line += f" {key}={_format_value(value)}"
+    return line
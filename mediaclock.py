@@ -0,0 +1,146 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# The media clock and the 20ms tick. The clock is time.monotonic_ns(),
+# which never jumps when NTP or the operator sets the wall clock, so the
+# tick can't burst or stall because of a clock change. Everything that
+# measures intervals (timers, IAX2 timestamps, jitter) should use it.
+#
+# The tick deadlines are computed from the start time and the tick
+# number in integer nanoseconds, so they don't drift however long the
+# server runs.
+#
+import time
+from metrics import Histogram
+
+def monotonic_ms():
+    """
+    Milliseconds (fractional) on the monotonic clock. Only differences
+    are meaningful.
+    """
+    return time.monotonic_ns() / 1000000.0
+
+def monotonic_ms_int():
+    return time.monotonic_ns() // 1000000
+
+# Bucket bounds (in ns) for the tick lateness: 100us to 50ms
+TICK_BOUNDS_NS = (100000, 250000, 500000, 1000000, 2000000, 5000000, 10000000,
+    20000000, 50000000)
+
+# What to do about ticks that were missed because the loop fell behind
+SKIP = "skip"
+BURST = "burst"
+
+class TickScheduler:
+    """
+    Calls callback() every period_ms on the event loop. The loop's clock
+    must be monotonic_ms().
+
+    When the loop falls more than a period behind, some tick deadlines
+    have already passed by the time a tick runs. With SKIP those ticks
+    are dropped and the schedule picks up at the next deadline in the
+    future. With BURST up to max_burst of them are run back to back to
+    catch up (anything beyond that is skipped). The catch-up ticks are
+    counted until the loop gets back on schedule, so the limit holds 
+    even when the ticks themselves run long and the next timer is 
+    already due when it is set.
+
+    tick_ms is the deadline of the tick that is running, in whole ms on
+    the media clock. It goes up by exactly period_ms per tick (more when
+    ticks are skipped), which makes it the right time to stamp outbound
+    voice with. lateness is the histogram (a metrics.Histogram, so it
+    can go straight into /metrics) of how late the loop got to each tick
+    deadline and skipped counts the dropped ticks.
+    """
+    def __init__(self, loop, period_ms: int, callback, policy: str = SKIP,
+        max_burst: int = 2):
+        if policy not in (SKIP, BURST):
+            raise Exception("Unknown tick policy " + policy)
+        self.loop = loop
+        self.period_ns = period_ms * 1000000
+        self.callback = callback
+        self.policy = policy
+        self.max_burst = max_burst
+        self.lateness = Histogram("hub_tick_lateness_seconds",
+            "How late the loop got to each tick deadline", TICK_BOUNDS_NS)
+        self.skipped = 0
+        self.tick_ms = 0
+        self._start_ns = 0
+        self._tick = 0
+        self._timer = None
+        # Catch-up ticks run since the schedule was last on time, and
+        # whether the pending timer was set for a deadline that had
+        # already passed
+        self._burst = 0
+        self._armed_late = False
+
+    def _deadline_ns(self, tick: int):
+        return self._start_ns + tick * self.period_ns
+
+    def start(self, start_ms: float = None):
+        if start_ms is None:
+            self._start_ns = time.monotonic_ns()
+        else:
+            self._start_ns = int(start_ms * 1000000)
+        self._tick = 0
+        self._burst = 0
+        self._arm()
+
+    def _arm(self):
+        deadline_ns = self._deadline_ns(self._tick)
+        self._armed_late = deadline_ns <= time.monotonic_ns()
+        self._timer = self.loop.call_at(deadline_ns / 1000000.0, self._on_timer)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self):
+        now_ns = time.monotonic_ns()
+        # How late the loop got to the deadline this timer was set for
+        # (an asyncio timer can fire a little early)
+        self.lateness.observe(max(now_ns - self._deadline_ns(self._tick), 0))
+        # How many deadlines have passed, counting that one
+        due = max((now_ns - self._start_ns) // self.period_ns - self._tick + 1, 1)
+        if self.policy == BURST:
+            if self._armed_late:
+                # This follows straight on from the last timer's ticks
+                # so every tick it runs is a catch-up tick
+                on_time = 0
+            else:
+                on_time = 1
+                self._burst = 0
+            catch_up = min(due - on_time, max(self.max_burst - self._burst, 0))
+            self._burst += catch_up
+            run = on_time + catch_up
+        else:
+            run = 1
+        # The oldest deadlines are the ones given up. If the burst has
+        # used up its catch-up ticks nothing runs and the timer is set
+        # for the next deadline in the future.
+        self.skipped += due - run
+        self._tick += due - run
+        for _ in range(0, run):
+            self.tick_ms = self._deadline_ns(self._tick) // 1000000
+            self._tick += 1
+            self.callback()
+        self._arm()
@@ -0,0 +1,225 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Timing histograms for the stages of the audio path, and a small HTTP
+# endpoint that serves them (and anything else the server wants to
+# report) in the Prometheus text format:
+#
+#   curl http://127.0.0.1:9169/metrics
+#   curl --unix-socket /tmp/hub.sock http://localhost/metrics
+#
+# A stage is timed with two time.perf_counter_ns() calls and observe(),
+# which is a bisect into a short list of bucket bounds and two integer
+# additions. Each histogram is only ever updated by one thread.
+#
+# The endpoint runs on its own thread, but the text is produced on the
+# event loop thread (the request waits for it), so it never sees the
+# call table or the counters half-way through a change.
+#
+import bisect
+import http.server
+import os
+import socketserver
+import threading
+import time
+
+# Bucket bounds (in ns) for the stage timings: 1us to 20ms
+STAGE_BOUNDS_NS = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000,
+    500000, 1000000, 2500000, 5000000, 10000000, 20000000)
+
+class Histogram:
+    """
+    Fixed-bucket histogram of durations in ns. Reported in seconds.
+    """
+    __slots__ = ("name", "help", "bounds", "counts", "count", "total")
+
+    def __init__(self, name: str, help: str, bounds = STAGE_BOUNDS_NS):
+        self.name = name
+        self.help = help
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, duration_ns: int):
+        self.counts[bisect.bisect_left(self.bounds, duration_ns)] += 1
+        self.count += 1
+        self.total += duration_ns
+
+    def since(self, start_ns: int):
+        """
+        Records the time from start_ns (a perf_counter_ns() reading) to
+        now, and returns now so that the next stage can start from it.
+        """
+        now = time.perf_counter_ns()
+        self.observe(now - start_ns)
+        return now
+
+    def percentile(self, p: float):
+        """
+        The upper bound (in ns) of the bucket that holds the p'th
+        percentile, or None if it is in the last (unbounded) bucket.
+        """
+        target = self.count * p / 100.0
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return None
+
+    def format(self):
+        """
+        A one-line summary in ms for the log.
+        """
+        mean = self.total / self.count / 1e6 if self.count else 0.0
+        p99 = self.percentile(99)
+        p99 = f"{p99 / 1e6:g}" if p99 is not None else f">{self.bounds[-1] / 1e6:g}"
+        buckets = " ".join(f"<={b / 1e6:g}:{c}" for b, c in zip(self.bounds, self.counts))
+        return (f"n {self.count} mean {mean:.3f} p99 {p99} | {buckets} "
+            f">{self.bounds[-1] / 1e6:g}:{self.counts[-1]}")
+
+    def render(self):
+        """
+        The histogram in Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound / 1e9:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.total / 1e9:.9f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines)
+
+class MetricWriter:
+    """
+    Accumulates counters and gauges in Prometheus text format. Samples
+    of the same metric must be written together.
+    """
+    def __init__(self):
+        self.lines = []
+        self._described = set()
+
+    def _describe(self, name: str, help: str, kind: str):
+        if name not in self._described:
+            self._described.add(name)
+            self.lines.append(f"# HELP {name} {help}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def _sample(self, name: str, value, labels: dict):
+        if labels:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            self.lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            self.lines.append(f"{name} {value}")
+
+    def counter(self, name: str, help: str, value, **labels):
+        self._describe(name, help, "counter")
+        self._sample(name, value, labels)
+
+    def gauge(self, name: str, help: str, value, **labels):
+        self._describe(name, help, "gauge")
+        self._sample(name, value, labels)
+
+    def histogram(self, histogram: Histogram):
+        self.lines.append(histogram.render())
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+class _HttpServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class _UnixHttpServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # http.server expects an (address, port) client address
+        return request, ("unix", 0)
+
+class MetricsServer(threading.Thread):
+    """
+    Serves GET /metrics. address is a (host, port) to listen for HTTP
+    on, or a path to listen on a Unix socket. Keep it on localhost; there
+    is no authentication.
+
+    render() is called on the event loop thread to produce the text.
+    """
+    def __init__(self, address, loop, render, timeout_s: float = 2.0):
+        super().__init__(name="metrics", daemon=True)
+        self.loop = loop
+        self.render = render
+        self.timeout_s = timeout_s
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                text = metrics.collect()
+                if text is None:
+                    self.send_error(503, "Event loop busy")
+                    return
+                body = text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        if isinstance(address, str):
+            # A socket file left behind by an earlier run
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixHttpServer(address, Handler)
+        else:
+            self.server = _HttpServer(address, Handler)
+
+    def collect(self):
+        """
+        Called on a request thread. Has the loop produce the text and
+        waits for it. Returns None if the loop didn't get to it in time.
+        """
+        done = threading.Event()
+        result = [None]
+
+        def on_loop():
+            result[0] = self.render()
+            done.set()
+
+        self.loop.call_soon_threadsafe(on_loop)
+        if not done.wait(self.timeout_s):
+            return None
+        return result[0]
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,118 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# N-party conference mixer. Every party (each call, plus the local radio)
+# owns one row of a preallocated (max_parties, 160) array. Once per 20ms
+# tick each party gets the sum of everyone except itself, which is
+# computed for all of the parties at once as the total of all the rows
+# minus each row. That makes the work per tick linear in the number of
+# parties instead of quadratic. The mixes are saturated to 16 bits and
+# u-law encoded in one batch.
+#
+import numpy as np
+from g711 import ulaw_encode, ulaw_decode
+
+class ConferenceMixer:
+    """
+    The parties write their audio for the current tick into their rows
+    with write() or write_ulaw(), then mix() produces everyone's mix and
+    clears the rows for the next tick. A party that hasn't written
+    anything in a tick contributes silence.
+    """
+    def __init__(self, max_parties: int = 64, block_size: int = 160):
+        self.max_parties = max_parties
+        self.block_size = block_size
+        self._frames = np.zeros((max_parties, block_size), dtype=np.int16)
+        self._fresh = np.zeros(max_parties, dtype=bool)
+        self._in_use = np.zeros(max_parties, dtype=bool)
+        # Parties occupy rows 0 to _rows - 1. The lowest free row is always
+        # handed out first so this stays as small as possible.
+        self._rows = 0
+        self._total = np.zeros(block_size, dtype=np.int32)
+        self._work = np.zeros((max_parties, block_size), dtype=np.int32)
+        self._mixes = np.zeros((max_parties, block_size), dtype=np.int16)
+        self._mixes_ulaw = np.zeros((max_parties, block_size), dtype=np.uint8)
+
+    def join(self):
+        """
+        Returns the row (slot) for a new party, or None if the conference
+        is full.
+        """
+        free = np.flatnonzero(~self._in_use)
+        if len(free) == 0:
+            return None
+        slot = int(free[0])
+        self._in_use[slot] = True
+        self._frames[slot] = 0
+        self._fresh[slot] = False
+        self._rows = max(self._rows, slot + 1)
+        return slot
+
+    def leave(self, slot: int):
+        self._in_use[slot] = False
+        self._frames[slot] = 0
+        self._fresh[slot] = False
+        used = np.flatnonzero(self._in_use)
+        self._rows = int(used[-1]) + 1 if len(used) else 0
+
+    def write(self, slot: int, pcm_data):
+        """
+        Sets a party's audio for this tick (one block of 16-bit PCM).
+        """
+        self._frames[slot] = pcm_data
+        self._fresh[slot] = True
+
+    def write_ulaw(self, slot: int, g711_data):
+        """
+        Decodes one block of u-law straight into the party's row.
+        """
+        ulaw_decode(g711_data, out=self._frames[slot])
+        self._fresh[slot] = True
+
+    def is_fresh(self, slot: int):
+        """
+        True if the party has written audio since the last mix().
+        """
+        return bool(self._fresh[slot])
+
+    def fresh_count(self):
+        return int(np.count_nonzero(self._fresh[0:self._rows]))
+
+    def mix(self):
+        """
+        Returns (mixes, mixes_ulaw). Row i of each is the "everyone but i"
+        mix for the party in slot i, as int16 PCM and as u-law. Both are
+        only valid until the next mix(). The rows are cleared for the
+        next tick.
+        """
+        n = self._rows
+        frames = self._frames[0:n]
+        work = self._work[0:n]
+        mixes = self._mixes[0:n]
+        # Everyone, then everyone but me (int32 so nothing wraps)
+        np.sum(frames, axis=0, dtype=np.int32, out=self._total)
+        np.subtract(self._total, frames, out=work)
+        np.clip(work, -32768, 32767, out=work)
+        np.copyto(mixes, work, casting='unsafe')
+        mixes_ulaw = ulaw_encode(mixes, out=self._mixes_ulaw[0:n])
+        frames[:] = 0
+        self._fresh[0:n] = False
+        return mixes, mixes_ulaw
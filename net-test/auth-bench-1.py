@@ -0,0 +1,102 @@
+# Handshake throughput and voice tick jitter with the AUTHREP signature
+# checks done inline vs. on a worker pool (see auth.py).
+#
+# The event loop runs a 20ms voice tick that does the per-tick audio work
+# of a few calls, and every 100ms a burst of AUTHREPs "arrives" and is
+# handed to the Authenticator. Reported for each mode: handshakes
+# verified per second and how late the ticks ran.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import base64
+import random
+import sys
+import time
+import numpy as np
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+sys.path.append("..")
+from eventloop import EventLoop
+from auth import Authenticator
+from g711 import ulaw_encode
+from dsp import Downsampler, ASL_LPF_TAPS
+
+DURATION_MS = 3000
+BURST = 100
+BURST_INTERVAL_MS = 100
+CALLS = 10
+
+def current_ms_frac():
+    return time.time() * 1000
+
+def run(label, workers, use_processes, private_key, public_key_pem):
+
+    # A handful of pre-signed challenges
+    challenges = ["{:09d}".format(random.randint(1,999999999)) for _ in range(0, 16)]
+    signed = [base64.b64encode(private_key.sign(c.encode("utf-8"), padding.PKCS1v15(),
+        hashes.SHA1())) for c in challenges]
+
+    loop = EventLoop(current_ms_frac)
+    authenticator = Authenticator(public_key_pem, loop, workers, use_processes)
+    # Let the pool start up before the clock starts
+    done = [0]
+    authenticator.verify(signed[0], challenges[0], lambda ok: done.__setitem__(0, 1))
+    while not done[0]:
+        loop.run_once()
+
+    downsamplers = [Downsampler(ASL_LPF_TAPS, 6) for _ in range(0, CALLS)]
+    capture = np.random.randint(-8000, 8000, 960).astype(np.int16)
+    lateness = []
+    verified = 0
+    failed = 0
+    start_ms = current_ms_frac() + 20
+    end_ms = start_ms + DURATION_MS
+    tick = [0]
+
+    def on_tick():
+        deadline = start_ms + tick[0] * 20
+        lateness.append(current_ms_frac() - deadline)
+        tick[0] += 1
+        if deadline < end_ms:
+            loop.call_at(start_ms + tick[0] * 20, on_tick)
+        for d in downsamplers:
+            ulaw_encode(np.clip(d.process(capture), -32768, 32767).astype(np.int16))
+
+    def on_result(ok):
+        nonlocal verified, failed
+        if ok:
+            verified += 1
+        else:
+            failed += 1
+
+    burst_counter = [0]
+
+    def on_burst():
+        burst_counter[0] += 1
+        if current_ms_frac() < end_ms:
+            loop.call_at(start_ms + burst_counter[0] * BURST_INTERVAL_MS, on_burst)
+        for i in range(0, BURST):
+            k = i % len(challenges)
+            authenticator.verify(signed[k], challenges[k], on_result)
+
+    loop.call_at(start_ms, on_tick)
+    loop.call_at(start_ms, on_burst)
+    submitted = BURST * (DURATION_MS // BURST_INTERVAL_MS + 1)
+    while current_ms_frac() < end_ms or verified + failed < submitted:
+        loop.run_once()
+    elapsed_s = (current_ms_frac() - start_ms) / 1000
+    authenticator.shutdown()
+
+    lateness = np.array(lateness[1:])
+    print(f"{label:16s} {verified / elapsed_s:10.0f} {failed:6d} {np.mean(lateness):8.3f} "
+        f"{np.percentile(lateness, 99):8.3f} {np.max(lateness):8.3f}")
+
+if __name__ == "__main__":
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    public_key_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo)
+    print(f"{BURST} AUTHREPs every {BURST_INTERVAL_MS}ms, {CALLS} calls of voice work per tick")
+    print("mode             handshakes/s failed tick mean  p99      max (ms late)")
+    run("inline", 0, False, private_key, public_key_pem)
+    run("2 threads", 2, False, private_key, public_key_pem)
+    run("2 processes", 2, True, private_key, public_key_pem)
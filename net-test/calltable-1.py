@@ -0,0 +1,37 @@
+# Memory and lookup cost of idle calls in the hub's call table
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import random
+import sys
+import time
+import tracemalloc
+sys.path.append("..")
+from hub import State, Call, CallTable
+
+N = 1000
+
+print("Call object", sys.getsizeof(Call(1, 1, ("127.0.0.1", 4569), 0, 0)), "bytes")
+
+# Fill a table with calls that are set up but idle (one per peer address,
+# the way real nodes would connect).
+tracemalloc.start()
+before = tracemalloc.take_snapshot()
+calls = CallTable()
+for i in range(0, N):
+    addr = ("10.0.{}.{}".format(i // 256, i % 256), 4569)
+    call = calls.create(random.randint(1, 32767), addr, 1000, 2000)
+    call.challenge = "{:09d}".format(random.randint(1,999999999))
+    call.state = State.IN_CALL
+after = tracemalloc.take_snapshot()
+tracemalloc.stop()
+total = sum(s.size_diff for s in after.compare_to(before, "filename"))
+print("Calls", len(calls), "total", total, "bytes,", total // N, "bytes per idle call")
+
+# Mini-frame routing is a single dict lookup no matter how many calls
+keys = list(calls.by_peer.keys())
+start = time.perf_counter()
+for _ in range(0, 100):
+    for addr, source_call in keys:
+        calls.find_peer(addr, source_call)
+elapsed = time.perf_counter() - start
+print("find_peer", round(elapsed / (100 * N) * 1e9), "ns per lookup")
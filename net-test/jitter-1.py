@@ -0,0 +1,97 @@
+# Simulation of the jitter buffer (see jitter.py) against a stream of
+# 20ms voice frames with network jitter, reordering and loss. Each frame
+# carries its own sequence number in the audio so that the order it comes
+# out in can be checked. Reported for each case: the final playout delay,
+# the frames played in order, concealed and dropped.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import sys
+import random
+import numpy as np
+sys.path.append("..")
+from jitter import JitterBuffer, extend_timestamp
+from g711 import ulaw_decode
+
+FRAMES = 3000
+
+CYCLE = 120
+
+def make_frame(n):
+    # A constant u-law code that identifies the frame (the codes below
+    # 0x7f all decode to different levels)
+    return bytes([n % CYCLE]) * 160
+
+# The level that each frame decodes to
+levels = {int(ulaw_decode(np.frombuffer(make_frame(n), dtype=np.uint8))[0]): n
+    for n in range(0, CYCLE)}
+assert len(levels) == CYCLE
+
+def run(label, jitter_ms, loss, start_ts=1000, wobble_ms=0):
+    random.seed(1)
+    # How far off the 20ms grid the sender sends and stamps each frame
+    # (from its own generator so the network delays are the same as in 
+    # the other cases)
+    wobble = random.Random(2)
+    offsets = [wobble.randint(-wobble_ms, wobble_ms) for _ in range(0, FRAMES)]
+    jb = JitterBuffer()
+    # Arrival time of each frame: sent every 20ms plus a random delay
+    arrivals = []
+    for n in range(0, FRAMES):
+        if random.random() < loss:
+            continue
+        sent = n * 20 + offsets[n]
+        arrivals.append((sent + 30 + random.expovariate(1 / jitter_ms) if jitter_ms else sent + 30, n))
+    arrivals.sort()
+
+    played = []
+    a = 0
+    for tick in range(0, FRAMES + 50):
+        now = tick * 20
+        while a < len(arrivals) and arrivals[a][0] <= now:
+            t, n = arrivals[a]
+            # Alternate full and mini-frame timestamps, wrapping 32 bits
+            ts = (start_ts + n * 20 + offsets[n]) & 0xffffffff
+            if n % 10 != 0:
+                ts = jb.extend(ts & 0xffff)
+            if ts is not None:
+                jb.put(ts, make_frame(n), t)
+            a += 1
+        pcm = jb.get(now)
+        if pcm is not None:
+            played.append(int(pcm[0]))
+
+    # Count the frames that came out in order. A concealment frame is
+    # at a fraction of the level and doesn't match any frame.
+    in_order = 0
+    last = -1
+    for level in played:
+        if level not in levels:
+            continue
+        n = levels[level]
+        if n == (last + 1) % CYCLE:
+            in_order += 1
+        last = n
+    print(f"{label:28s} {jb.target_delay_ms:6.0f} {jb.jitter_ms:6.1f} {in_order:6d} "
+        f"{jb.concealed:6d} {jb.dropped:6d} {jb.late:5d}")
+    return jb, in_order
+
+# The timestamp extension across a 16-bit roll
+assert extend_timestamp(0x0005, 0x1fff0) == 0x20005
+assert extend_timestamp(0xfff0, 0x20005) == 0x1fff0
+assert extend_timestamp(0x1234, 0x1200) == 0x1234
+
+print(f"{FRAMES} frames")
+print("case                         target jitter in-ord concl  drop   late")
+run("no jitter", 0, 0)
+run("5ms jitter", 5, 0)
+on_grid, on_grid_in_order = run("20ms jitter", 20, 0)
+run("50ms jitter", 50, 0)
+run("20ms jitter, 2% loss", 20, 0.02)
+run("20ms jitter, 32-bit wrap", 20, 0, 0xffffffff - 20 * 1000)
+# Stamps that aren't on a multiple of 20ms, and stamps that wobble by a
+# few ms, have to play out the same as stamps on the grid
+for label, start_ts, wobble_ms in (("20ms jitter, stamps +10ms", 1010, 0),
+    ("20ms jitter, +10ms +/-6ms", 1010, 6), ("20ms jitter, +/-5ms", 1000, 5)):
+    jb, in_order = run(label, 20, 0, start_ts, wobble_ms)
+    assert jb.duplicates == 0
+    assert in_order >= on_grid_in_order - 10
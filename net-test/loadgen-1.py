@@ -0,0 +1,440 @@
+# Load generator that plays the part of N AllStarLink Telephone Portal
+# callers against a hub running on this machine. Each caller has its own
+# UDP socket and goes through the whole call: NEW, the CALLTOKEN echo,
+# an AUTHREQ challenge signed with a local RSA key, ACCEPT, RINGING, and
+# ANSWER. It then streams 20ms u-law frames (one full voice frame, then
+# mini-frames) at 50 per second until the end of the run, and hangs up.
+#
+# The hub has to trust the local key, which is created on the first run:
+#
+#   python3 loadgen-1.py --calls 20 --seconds 10
+#
+# and in asl-hub-server-2.py (TEST MODE ONLY):
+#
+#   test_public_key_file = "net-test/loadgen-key.pem.pub"
+#
+# Caller 0 is the talker. It stamps each frame with its frame number
+# (two u-law codes from the loudest segment, which survive the hub's
+# decode/mix/encode unchanged). The other callers send silence, so what
+# they hear is the talker's audio and the frame number tells which frame
+# it was. Reported at the end:
+#
+#   - Setup: the rate the calls were set up at, and the time from NEW to
+#     ACCEPT (mostly the signature check) and to ANSWER (adds the ring).
+#   - One-way latency from the talker to each listener through the hub
+#     (its jitter buffer and the wait for the next tick included).
+#   - Loss (frames the listeners never heard, or heard as concealment)
+#     and reordering (a frame heard after a later one).
+#   - How late the generator's own ticks ran. If the generator can't keep
+#     up the other numbers are suspect.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import argparse
+import base64
+import os
+import socket
+import sys
+import numpy as np
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+sys.path.append("..")
+from eventloop import EventLoop
+from mediaclock import monotonic_ms, TickScheduler, TICK_BOUNDS_NS
+from metrics import Histogram
+from iax2 import parse_frame, find_information_element, encode_information_elements, \
+    FrameBuilder, FrameHeader, FrameFormatError, FULL_HEADER_SIZE, MINI_FRAME, \
+    FRAME_TYPE_IAX, FRAME_TYPE_CONTROL, FRAME_TYPE_VOICE, IAX_NEW, IAX_ACK, \
+    IAX_HANGUP, IAX_ACCEPT, IAX_AUTHREQ, IAX_AUTHREP, IAX_CALLTOKEN, IAX_PING, \
+    IAX_PONG, IAX_LAGRQ, IAX_LAGRP, CONTROL_RINGING, CONTROL_ANSWER, VOICE_ULAW, \
+    IE_USERNAME, IE_FORMAT, IE_CHALLENGE, IE_RSA_RESULT, IE_CALLTOKEN
+
+# Elements not defined in iax2.py (RFC 5456 section 8.6)
+IE_CALLED_NUMBER = 1
+IE_CALLING_NUMBER = 2
+IE_CAPABILITY = 8
+IE_VERSION = 11
+
+# The frame number is carried in the first two samples as two base-32
+# digits. These are the 32 loudest u-law codes. Concealment (a fraction
+# of the last frame) and silence never decode to one of them.
+ID_CODES = list(range(0x00, 0x10)) + list(range(0x80, 0x90))
+ID_DIGITS = { code: digit for digit, code in enumerate(ID_CODES) }
+ID_CYCLE = len(ID_CODES) * len(ID_CODES)
+SILENCE = 0xff
+
+# Call states
+STARTING = "starting"
+TOKEN = "token"
+AUTH = "auth"
+RINGING = "ringing"
+IN_CALL = "in call"
+FAILED = "failed"
+DONE = "done"
+
+def load_key(path: str):
+    """
+    Loads the private key, creating it (and path + ".pub" with the public
+    key for the hub) if it doesn't exist yet.
+    """
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return serialization.load_pem_private_key(f.read(), None)
+    key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    with open(path + ".pub", "wb") as f:
+        f.write(key.public_key().public_bytes(serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo))
+    print("Created", path, "- point the hub's test_public_key_file at", path + ".pub")
+    return key
+
+class Caller:
+
+    def __init__(self, gen, index: int):
+        self.gen = gen
+        self.index = index
+        self.talker = index == 0
+        # Call numbers are 15 bits and 0 isn't used
+        self.source_call = 1 + index % 0x7ffe
+        self.remote_call = 0
+        self.tx = FrameBuilder()
+        self.hdr = FrameHeader()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(("0.0.0.0", 0))
+        gen.loop.add_reader(self.sock, self.on_readable)
+        self.state = STARTING
+        self.start_ms = 0.0
+        self.accept_ms = None
+        self.answer_ms = None
+        self.outseq = 0
+        self.inseq = 0
+        self.timer = None
+        self.ticker = None
+        self.frames_sent = 0
+        # Listener statistics
+        self.heard = set()
+        self.last_heard = None
+        self.reordered = 0
+        self.unknown = 0
+        self.voice_received = 0
+
+    def ms(self):
+        return int(monotonic_ms() - self.start_ms)
+
+    def send(self, frame):
+        try:
+            self.sock.sendto(frame, self.gen.address)
+        except (BlockingIOError, OSError):
+            self.gen.send_errors += 1
+
+    def send_new(self, token = None):
+        ies = { IE_VERSION: (2).to_bytes(2, "big"),
+            IE_CALLED_NUMBER: self.gen.node.encode("utf-8"),
+            IE_CALLING_NUMBER: b"0",
+            IE_USERNAME: b"allstar-public",
+            IE_FORMAT: VOICE_ULAW.to_bytes(4, "big"),
+            IE_CAPABILITY: VOICE_ULAW.to_bytes(4, "big") }
+        if token is not None:
+            ies[IE_CALLTOKEN] = token
+        self.send(self.tx.frame(self.source_call, 0, self.ms(), 0, 0, FRAME_TYPE_IAX,
+            IAX_NEW, encode_information_elements(ies)))
+
+    def start(self):
+        self.start_ms = monotonic_ms()
+        self.state = TOKEN
+        self.send_new()
+        self.timer = self.gen.loop.call_later(self.gen.setup_timeout_ms, self.on_timeout)
+
+    def on_timeout(self):
+        self.state = FAILED
+        self.gen.failed += 1
+        self.gen.check_all_answered()
+
+    def ack(self):
+        self.send(self.tx.ack(self.source_call, self.remote_call, self.ms(), self.outseq,
+            self.inseq))
+
+    def on_readable(self):
+        while True:
+            try:
+                frame = self.sock.recv(2048)
+            except BlockingIOError:
+                return
+            except OSError:
+                # ICMP port unreachable etc. when the hub isn't there
+                continue
+            now_ms = monotonic_ms()
+            try:
+                hdr = parse_frame(frame, self.hdr)
+            except FrameFormatError:
+                continue
+            if hdr.key == MINI_FRAME:
+                self.on_voice(frame[4:], now_ms)
+                continue
+            # Every full frame but an ACK moves the inbound sequence on
+            if hdr.key != (FRAME_TYPE_IAX, IAX_ACK):
+                self.inseq = (hdr.outseq + 1) % 256
+            self.on_full_frame(hdr, frame, now_ms)
+
+    def on_full_frame(self, hdr: FrameHeader, frame, now_ms: float):
+        key = hdr.key
+        if key == (FRAME_TYPE_IAX, IAX_CALLTOKEN) and self.state == TOKEN:
+            token = find_information_element(frame, IE_CALLTOKEN, FULL_HEADER_SIZE)
+            if token is not None:
+                self.send_new(bytes(token))
+                # The NEW that the hub accepts is our frame 0
+                self.outseq = 1
+                self.state = AUTH
+        elif key == (FRAME_TYPE_IAX, IAX_AUTHREQ) and self.state == AUTH:
+            self.remote_call = hdr.source_call
+            challenge = find_information_element(frame, IE_CHALLENGE, FULL_HEADER_SIZE)
+            signature = self.gen.key.sign(bytes(challenge), padding.PKCS1v15(), hashes.SHA1())
+            self.send(self.tx.frame(self.source_call, self.remote_call, self.ms(), self.outseq,
+                self.inseq, FRAME_TYPE_IAX, IAX_AUTHREP, encode_information_elements(
+                    { IE_RSA_RESULT: base64.b64encode(signature) })))
+            self.outseq += 1
+        elif key == (FRAME_TYPE_IAX, IAX_ACCEPT):
+            self.ack()
+            self.accept_ms = now_ms - self.start_ms
+            self.gen.on_accept(now_ms)
+        elif key == (FRAME_TYPE_CONTROL, CONTROL_RINGING):
+            self.ack()
+            if self.state == AUTH:
+                self.state = RINGING
+        elif key == (FRAME_TYPE_CONTROL, CONTROL_ANSWER):
+            self.ack()
+            if self.state == RINGING:
+                self.timer.cancel()
+                self.answer_ms = now_ms - self.start_ms
+                self.state = IN_CALL
+                self.start_voice()
+                self.gen.check_all_answered()
+        elif key == (FRAME_TYPE_IAX, IAX_PING):
+            self.send(self.tx.frame(self.source_call, self.remote_call, hdr.timestamp,
+                self.outseq, self.inseq, FRAME_TYPE_IAX, IAX_PONG))
+            self.outseq += 1
+        elif key == (FRAME_TYPE_IAX, IAX_LAGRQ):
+            self.send(self.tx.frame(self.source_call, self.remote_call, hdr.timestamp,
+                self.outseq, self.inseq, FRAME_TYPE_IAX, IAX_LAGRP))
+            self.outseq += 1
+        elif key == (FRAME_TYPE_VOICE, VOICE_ULAW):
+            self.ack()
+            self.on_voice(frame[FULL_HEADER_SIZE:], now_ms)
+        elif key == (FRAME_TYPE_IAX, IAX_ACK):
+            pass
+        elif hdr.frame_type == FRAME_TYPE_IAX or hdr.frame_type == FRAME_TYPE_CONTROL:
+            # STOP_SOUNDS and anything else that needs acknowledging
+            self.ack()
+
+    def start_voice(self):
+        # Real callers aren't lined up on the same 20ms boundary, so the
+        # callers are spread evenly over the period
+        phase_ms = 20.0 * self.index / self.gen.calls
+        self.ticker = TickScheduler(self.gen.loop, 20, self.on_tick)
+        self.ticker.start(monotonic_ms() + phase_ms)
+
+    def on_tick(self):
+        n = self.frames_sent
+        if self.talker:
+            payload = self.gen.frame_payload(n)
+            self.gen.sent_ms.append(monotonic_ms())
+        else:
+            payload = self.gen.silence
+        # The timestamp goes up by exactly 20ms per frame
+        timestamp = int(self.answer_ms) + n * 20
+        if n == 0:
+            self.tx.voice_payload[:] = payload
+            self.send(self.tx.voice(self.source_call, self.remote_call, timestamp,
+                self.outseq, self.inseq))
+            self.outseq += 1
+        else:
+            self.tx.mini_payload[:] = payload
+            self.send(self.tx.mini(self.source_call, timestamp))
+        self.frames_sent += 1
+
+    def on_voice(self, payload, now_ms: float):
+        if self.talker or self.state != IN_CALL or len(payload) < 2:
+            return
+        self.voice_received += 1
+        n = self.gen.frame_number(payload[0], payload[1])
+        if n is None:
+            if payload[0] != SILENCE:
+                self.unknown += 1
+            return
+        if n in self.heard:
+            return
+        self.heard.add(n)
+        self.gen.latency_ms.append(now_ms - self.gen.sent_ms[n])
+        if self.last_heard is not None and n < self.last_heard:
+            self.reordered += 1
+        self.last_heard = n if self.last_heard is None else max(n, self.last_heard)
+
+    def hangup(self):
+        if self.ticker is not None:
+            self.ticker.stop()
+        if self.state == IN_CALL or self.state == RINGING:
+            self.send(self.tx.frame(self.source_call, self.remote_call, self.ms(),
+                self.outseq, self.inseq, FRAME_TYPE_IAX, IAX_HANGUP))
+            self.outseq += 1
+        if self.state != FAILED:
+            self.state = DONE
+
+class LoadGenerator:
+
+    def __init__(self, args):
+        self.address = (args.host, args.port)
+        self.node = args.node
+        self.calls = args.calls
+        self.rate = args.rate
+        self.seconds = args.seconds
+        self.setup_timeout_ms = args.setup_timeout * 1000
+        self.key = load_key(args.key)
+        self.loop = EventLoop(monotonic_ms)
+        self.callers = []
+        self.failed = 0
+        self.send_errors = 0
+        self.first_accept_ms = None
+        self.last_accept_ms = None
+        self.first_start_ms = None
+        self.voice_end_ms = None
+        self.running = True
+        # Send time of each of the talker's frames
+        self.sent_ms = []
+        self.latency_ms = []
+        self.silence = bytes([SILENCE]) * 160
+        self._payload = bytearray(self.silence)
+
+    def frame_payload(self, n: int):
+        m = n % ID_CYCLE
+        self._payload[0] = ID_CODES[m % len(ID_CODES)]
+        self._payload[1] = ID_CODES[m // len(ID_CODES)]
+        # The rest of the frame at the same level so that it sounds (and
+        # mixes) like a tone burst
+        self._payload[2:] = bytes([self._payload[0]]) * 158
+        return self._payload
+
+    def frame_number(self, code0: int, code1: int):
+        """
+        The most recent frame the talker sent that carries this number, or
+        None if the codes aren't a frame number.
+        """
+        d0 = ID_DIGITS.get(code0)
+        d1 = ID_DIGITS.get(code1)
+        if d0 is None or d1 is None or not self.sent_ms:
+            return None
+        m = d0 + d1 * len(ID_CODES)
+        last = len(self.sent_ms) - 1
+        n = last - (last - m) % ID_CYCLE
+        return n if n >= 0 else None
+
+    def on_accept(self, now_ms: float):
+        if self.first_accept_ms is None:
+            self.first_accept_ms = now_ms
+        self.last_accept_ms = now_ms
+
+    def start_next(self):
+        if len(self.callers) == self.calls:
+            return
+        if self.first_start_ms is None:
+            self.first_start_ms = monotonic_ms()
+        caller = Caller(self, len(self.callers))
+        self.callers.append(caller)
+        caller.start()
+        self.loop.call_later(1000.0 / self.rate, self.start_next)
+
+    def check_all_answered(self):
+        if self.voice_end_ms is not None or len(self.callers) < self.calls:
+            return
+        if all(c.state == IN_CALL or c.state == FAILED for c in self.callers):
+            self.voice_end_ms = monotonic_ms() + self.seconds * 1000
+            self.loop.call_at(self.voice_end_ms, self.finish)
+
+    def finish(self):
+        for caller in self.callers:
+            caller.hangup()
+        # Give the hub a moment to ACK the hangups
+        self.loop.call_later(250, self.stop)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        self.start_next()
+        while self.running:
+            self.loop.run_once()
+        self.report()
+
+    def report(self):
+        setup = [c for c in self.callers if c.accept_ms is not None]
+        answered = [c for c in self.callers if c.answer_ms is not None]
+        print(f"Calls: {len(self.callers)} started, {len(setup)} accepted, "
+            f"{len(answered)} answered, {self.failed} failed")
+        if setup:
+            accept = np.array([c.accept_ms for c in setup])
+            answer = np.array([c.answer_ms for c in answered]) if answered else np.zeros(1)
+            span_s = (self.last_accept_ms - self.first_start_ms) / 1000.0
+            print(f"Setup: {len(setup) / span_s:.1f} calls/s (offered {self.rate:g}/s)")
+            print(f"  NEW to ACCEPT ms: p50 {np.percentile(accept, 50):.1f} "
+                f"p99 {np.percentile(accept, 99):.1f} max {accept.max():.1f}")
+            print(f"  NEW to ANSWER ms: p50 {np.percentile(answer, 50):.1f} "
+                f"p99 {np.percentile(answer, 99):.1f} max {answer.max():.1f}")
+
+        listeners = [c for c in answered if not c.talker]
+        if not self.sent_ms or not listeners:
+            print("No voice measured (it takes a talker and at least one listener)")
+        else:
+            expected = heard = reordered = unknown = received = 0
+            for c in listeners:
+                received += c.voice_received
+                unknown += c.unknown
+                if not c.heard:
+                    continue
+                # The frames the talker sent while this caller was listening
+                first = min(c.heard)
+                expected += c.last_heard - first + 1
+                heard += len(c.heard)
+                reordered += c.reordered
+            loss = 100.0 * (expected - heard) / expected if expected else 0.0
+            print(f"Voice: talker sent {len(self.sent_ms)} frames, "
+                f"{len(listeners)} listeners received {received} frames")
+            print(f"  heard {heard} of {expected} talker frames (loss {loss:.2f}%), "
+                f"reordered {reordered}, concealed/unrecognized {unknown}")
+            if self.latency_ms:
+                latency = np.array(self.latency_ms)
+                print(f"  one-way latency ms: p50 {np.percentile(latency, 50):.1f} "
+                    f"p95 {np.percentile(latency, 95):.1f} p99 {np.percentile(latency, 99):.1f} "
+                    f"max {latency.max():.1f}")
+
+        lateness = Histogram("lateness", "Generator tick lateness", TICK_BOUNDS_NS)
+        for c in answered:
+            if c.ticker is not None:
+                t = c.ticker.lateness
+                lateness.counts = [a + b for a, b in zip(lateness.counts, t.counts)]
+                lateness.count += t.count
+                lateness.total += t.total
+        print("Generator tick lateness ms:", lateness.format())
+        if self.send_errors:
+            print("Send errors:", self.send_errors)
+
+def main():
+    parser = argparse.ArgumentParser(description="IAX2 load generator (Telephone Portal callers)")
+    parser.add_argument("--host", default="127.0.0.1", help="hub address")
+    parser.add_argument("--port", type=int, default=4569, help="hub IAX2 port")
+    parser.add_argument("--node", default="61057", help="node number to call")
+    parser.add_argument("--calls", type=int, default=10, help="number of callers")
+    parser.add_argument("--rate", type=float, default=20.0, help="new calls per second")
+    parser.add_argument("--seconds", type=float, default=10.0,
+        help="seconds of voice once every call is answered")
+    parser.add_argument("--setup-timeout", type=float, default=15.0,
+        help="seconds a call has to get answered")
+    parser.add_argument("--key", default="loadgen-key.pem", help="RSA private key file")
+    args = parser.parse_args()
+    if args.calls < 1 or args.rate <= 0:
+        raise Exception("Need at least one call and a positive rate")
+    LoadGenerator(args).run()
+
+if __name__ == "__main__":
+    main()
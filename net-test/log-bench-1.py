@@ -0,0 +1,54 @@
+# Cost on the calling thread of a per-frame diagnostic: print() of the
+# frame (to a file, so the terminal isn't part of it) vs. the Logger
+# (see logger.py) with the level disabled and enabled. With the level
+# enabled the formatting and the writing happen on the logger thread.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import os
+import sys
+import time
+sys.path.append("..")
+from logger import Logger, DEBUG, INFO
+from iax2 import FrameBuilder
+
+N = 20000
+
+def per_call_us(f):
+    start = time.perf_counter()
+    for i in range(0, N):
+        f(i)
+    return (time.perf_counter() - start) / N * 1e6
+
+tx = FrameBuilder()
+resp = tx.ack(1, 2, 1234, 5, 6)
+out = open(os.devnull, "w")
+
+def with_print(i):
+    print("Sending ACK", bytes(resp), 5, 6, file=out)
+
+print(f"print()                      {per_call_us(with_print):8.2f} us")
+
+log = Logger(INFO, capacity=N, stream=out)
+log.start()
+
+def guarded_debug(i):
+    if log.debug_on:
+        log.debug("tx", "Sending ACK", call=1, frame=bytes(resp), outseq=5, inseq=6)
+
+def unguarded_debug(i):
+    log.debug("tx", "Sending ACK", call=1, frame=bytes(resp), outseq=5, inseq=6)
+
+print(f"debug off, guarded           {per_call_us(guarded_debug):8.2f} us")
+print(f"debug off, unguarded         {per_call_us(unguarded_debug):8.2f} us")
+log.set_level(DEBUG)
+print(f"debug on (queued)            {per_call_us(guarded_debug):8.2f} us")
+log.set_level(INFO)
+
+log.limit("seq", 2, burst=5)
+
+def limited_warning(i):
+    log.warning("seq", "Inbound sequence error", call=1, got=i, expected=i - 1)
+
+print(f"rate limited warning         {per_call_us(limited_warning):8.2f} us")
+log.stop()
+print(f"records lost (ring full)     {log.lost:8d}")
@@ -0,0 +1,153 @@
+# Compares the ways of running the hub's main loop under the same
+# synthetic IAX2 load:
+#
+#   spin    - the original non-blocking recvfrom() polling loop
+#   select  - eventloop.EventLoop (selectors/epoll plus timer heap)
+#   asyncio - asyncio.DatagramProtocol plus loop.call_at() timers
+#
+# A sender process fires PING frames at the server, which parses each one
+# and answers with a PONG, the same work the hub does per frame. A 20ms
+# tick runs alongside and its lateness is recorded. Reported for each
+# loop: frames handled per second and tick jitter.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import asyncio
+import multiprocessing
+import socket
+import sys
+import time
+import numpy as np
+sys.path.append("..")
+from iax2 import FrameHeader, FrameBuilder, parse_frame, make_frame_header
+from iax2 import FRAME_TYPE_IAX, IAX_PING
+from eventloop import EventLoop, AsyncioEventLoop
+
+PORT = 14569
+DURATION_S = 3.0
+TICK_MS = 20
+
+def current_ms_frac():
+    return time.time() * 1000
+
+def serve(mode, results):
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", PORT))
+    sock.setblocking(False)
+
+    rx_hdr = FrameHeader()
+    tx = FrameBuilder()
+    count = 0
+    lateness = []
+    net = sock
+
+    def handle(frame, addr):
+        nonlocal count
+        hdr = parse_frame(frame, rx_hdr)
+        net.sendto(tx.pong(1, hdr.source_call, hdr.timestamp, hdr.inseq, hdr.outseq + 1), addr)
+        count += 1
+
+    start_ms = current_ms_frac() + 100
+    end_ms = start_ms + DURATION_S * 1000
+    tick_counter = 0
+
+    def on_tick():
+        nonlocal tick_counter
+        deadline = start_ms + tick_counter * TICK_MS
+        lateness.append(current_ms_frac() - deadline)
+        tick_counter += 1
+        if deadline < end_ms:
+            loop.call_at(start_ms + tick_counter * TICK_MS, on_tick)
+        else:
+            loop.stop()
+
+    if mode == "spin":
+        # The pre-event loop structure: poll everything, forever
+        while True:
+            now_ms = current_ms_frac()
+            deadline = start_ms + tick_counter * TICK_MS
+            if now_ms >= deadline:
+                lateness.append(now_ms - deadline)
+                tick_counter += 1
+                if deadline >= end_ms:
+                    break
+            try:
+                frame, addr = sock.recvfrom(1024)
+            except BlockingIOError:
+                continue
+            handle(frame, addr)
+
+    elif mode == "select":
+        def on_readable():
+            while True:
+                try:
+                    frame, addr = sock.recvfrom(1024)
+                except BlockingIOError:
+                    return
+                handle(frame, addr)
+        loop = EventLoop(current_ms_frac)
+        loop.add_reader(sock, on_readable)
+        loop.call_at(start_ms, on_tick)
+        loop.run()
+
+    elif mode == "asyncio":
+        class Protocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                nonlocal net
+                net = transport
+            def datagram_received(self, data, addr):
+                handle(data, addr)
+        loop = AsyncioEventLoop(current_ms_frac)
+        loop.loop.run_until_complete(loop.loop.create_datagram_endpoint(Protocol, sock=sock))
+        loop.call_at(start_ms, on_tick)
+        loop.run()
+
+    sock.close()
+    # The first tick includes start-up so it is skipped
+    results.put((count, lateness[1:]))
+
+def send(rate_pps):
+    # rate_pps of None means as fast as possible
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    frame = make_frame_header(5, 1, 100, 0, 0, FRAME_TYPE_IAX, IAX_PING)
+    end = time.time() + DURATION_S + 0.2
+    n = 0
+    start = time.time()
+    while time.time() < end:
+        if rate_pps is not None and n > (time.time() - start) * rate_pps:
+            time.sleep(0.0005)
+        else:
+            try:
+                sock.sendto(frame, ("127.0.0.1", PORT))
+                n += 1
+            except BlockingIOError:
+                pass
+        # Throw away the PONGs
+        try:
+            while True:
+                sock.recvfrom(1024)
+        except BlockingIOError:
+            pass
+
+def run(mode, rate_pps):
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(mode, results))
+    server.start()
+    time.sleep(0.05)
+    sender = multiprocessing.Process(target=send, args=(rate_pps,))
+    sender.start()
+    count, lateness = results.get()
+    server.join()
+    sender.join()
+    lateness = np.array(lateness)
+    print(f"{mode:8s} {count / DURATION_S:10.0f} {np.mean(lateness):8.3f} "
+        f"{np.percentile(lateness, 99):8.3f} {np.max(lateness):8.3f}")
+
+for rate_pps, label in ((2500, "2500 pps (about 50 calls)"), (None, "flood")):
+    print()
+    print("Load:", label)
+    print("mode       frames/s  tick mean  p99      max (ms late)")
+    for mode in ("spin", "select", "asyncio"):
+        run(mode, rate_pps)
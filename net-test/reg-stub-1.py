@@ -0,0 +1,48 @@
+# A stand-in for the AllStarLink registration server, for testing the
+# hub's background registration without touching the real one.
+#
+#   python reg-stub-1.py [port] [delay seconds] [failure rate 0-1]
+#
+# Point reg_url in the server at http://127.0.0.1:<port>. Every request
+# is held for the delay and then answered with either a 200 and a
+# canned response, or a 500 (at the given rate). Each request is logged.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import json
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+delay_s = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+class Handler(BaseHTTPRequestHandler):
+
+    # Keep-alive so that the client's session can reuse the connection
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        msg = json.loads(body)
+        time.sleep(delay_s)
+        if random.random() < failure_rate:
+            response = b"Server error"
+            self.send_response(500)
+        else:
+            nodes = list(msg["data"]["nodes"].keys())
+            response = json.dumps({ "ipaddr": self.client_address[0], 
+                "port": msg["port"], "refresh": 179, "data": nodes }).encode("utf-8")
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        print(time.strftime("%H:%M:%S"), self.client_address[1], format % args)
+
+print(f"Registration stub on port {port}, delay {delay_s}s, failure rate {failure_rate}")
+ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
@@ -0,0 +1,466 @@
+# Replays recorded IAX2 traffic against a hub running on this machine, to
+# reproduce problems seen in the field and to load the hub's frame parsing
+# and call state machine with realistic traffic.
+#
+#   python3 replay-1.py field.pcap                Real time
+#   python3 replay-1.py field.pcap --speed 10     10x faster
+#   python3 replay-1.py field.pcap --speed 0      As fast as possible
+#   python3 replay-1.py field.pcap --copies 50    50 concurrent copies
+#   python3 replay-1.py field.pcap --dump field.log
+#
+# The input is a classic libpcap file (tcpdump -w, Ethernet, Linux cooked
+# or raw IP, IPv4 or IPv6) or a datagram log. pcapng isn't supported;
+# convert it with "editcap -F pcap". The log is a text file with one
+# datagram sent to the hub per line, which is easy to write by hand or
+# from another tool:
+#
+#   # seconds   peer address       datagram (hex)
+#   0.000000    10.0.0.5:4569      8001000000000064000006 ...
+#
+# --dump writes the datagrams picked out of a pcap in this format.
+#
+# Only the datagrams sent to the hub (to --server-port) are replayed.
+# Each peer address in the capture is replayed from its own local UDP
+# socket, and each of the --copies has its own set of sockets with its
+# source call numbers moved up by --call-stride so that the copies are
+# distinct calls.
+#
+# Some of what a peer sends depends on what the hub said to it, so that
+# is rewritten from the hub's replies on the same socket: the destination
+# call number (the hub's call number), the token echoed in the second NEW
+# and, when --key is given, the AUTHREP signature of the new challenge
+# (see loadgen-1.py and test_public_key_file). A frame that needs one of
+# these waits for the reply (up to --gate-timeout) and the rest of its
+# peer's frames wait behind it. Nothing else waits, so when the replay
+# is faster than the capture a peer can get ahead of the hub (voice while
+# the call is still being authenticated, say). The hub's warnings about
+# that are expected.
+#
+# The hub's own view of the load (the stage timings of the audio path and
+# the frame counters) is on its /metrics endpoint.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import argparse
+import base64
+import collections
+import heapq
+import ipaddress
+import socket
+import struct
+import sys
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+sys.path.append("..")
+from eventloop import EventLoop
+from mediaclock import monotonic_ms, TICK_BOUNDS_NS
+from metrics import Histogram
+from iax2 import parse_frame, find_information_element, decode_information_elements, \
+    encode_information_elements, FrameFormatError, FrameHeader, FULL_HEADER_SIZE, \
+    FRAME_TYPE_IAX, IAX_NEW, IAX_AUTHREQ, IAX_AUTHREP, IAX_CALLTOKEN, IE_CHALLENGE, \
+    IE_RSA_RESULT, IE_CALLTOKEN
+
+NEW_KEY = (FRAME_TYPE_IAX, IAX_NEW)
+AUTHREP_KEY = (FRAME_TYPE_IAX, IAX_AUTHREP)
+AUTHREQ_KEY = (FRAME_TYPE_IAX, IAX_AUTHREQ)
+CALLTOKEN_KEY = (FRAME_TYPE_IAX, IAX_CALLTOKEN)
+
+# ---- Reading captures ------------------------------------------------------
+
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+def _ip_payload(linktype: int, data: bytes):
+    """
+    The IP packet inside a link layer frame, or None.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = struct.unpack_from(">H", data, offset)[0]
+        # 802.1Q VLAN tags
+        while ethertype in (0x8100, 0x88a8):
+            offset += 4
+            ethertype = struct.unpack_from(">H", data, offset)[0]
+        if ethertype not in (0x0800, 0x86dd):
+            return None
+        return data[offset + 2:]
+    if linktype == LINKTYPE_LINUX_SLL:
+        return data[16:]
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return data[20:]
+    if linktype == LINKTYPE_NULL:
+        return data[4:]
+    if linktype == LINKTYPE_RAW:
+        return data
+    raise Exception(f"Unsupported pcap link type {linktype}")
+
+def _udp_datagram(packet: bytes):
+    """
+    Returns (source address, destination address, payload) of a UDP
+    datagram in an IPv4 or IPv6 packet, or None. Fragments are skipped.
+    """
+    if len(packet) < 20:
+        return None
+    version = packet[0] >> 4
+    if version == 4:
+        header_len = (packet[0] & 0x0f) * 4
+        total_len, flags_fragment = struct.unpack_from(">H2xH", packet, 2)
+        if packet[9] != 17 or flags_fragment & 0x3fff:
+            return None
+        src = str(ipaddress.IPv4Address(packet[12:16]))
+        dst = str(ipaddress.IPv4Address(packet[16:20]))
+        udp = packet[header_len:total_len]
+    elif version == 6:
+        if len(packet) < 48 or packet[6] != 17:
+            return None
+        src = str(ipaddress.IPv6Address(packet[8:24]))
+        dst = str(ipaddress.IPv6Address(packet[24:40]))
+        udp = packet[40:]
+    else:
+        return None
+    if len(udp) < 8:
+        return None
+    src_port, dst_port, udp_len = struct.unpack_from(">HHH", udp)
+    return (src, src_port), (dst, dst_port), udp[8:udp_len]
+
+def read_pcap(path: str, server_port: int):
+    """
+    Returns a list of (seconds, peer address, datagram) for the datagrams
+    sent to server_port, with the time relative to the first packet.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < 24:
+        raise Exception("Not a pcap file")
+    for endian in ("<", ">"):
+        magic = struct.unpack_from(endian + "I", data)[0]
+        if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            break
+    else:
+        raise Exception("Not a classic pcap file (convert pcapng with editcap -F pcap)")
+    scale = 1e-6 if magic == PCAP_MAGIC_US else 1e-9
+    linktype = struct.unpack_from(endian + "I", data, 20)[0] & 0x0fffffff
+    record = struct.Struct(endian + "IIII")
+    datagrams = []
+    first = None
+    pos = 24
+    while pos + record.size <= len(data):
+        sec, frac, caplen, _ = record.unpack_from(data, pos)
+        pos += record.size
+        frame = data[pos:pos + caplen]
+        pos += caplen
+        t = sec + frac * scale
+        if first is None:
+            first = t
+        try:
+            packet = _ip_payload(linktype, frame)
+            udp = _udp_datagram(packet) if packet is not None else None
+        except struct.error:
+            # Truncated by the capture's snap length
+            continue
+        if udp is not None and udp[1][1] == server_port:
+            datagrams.append((t - first, udp[0], udp[2]))
+    return datagrams
+
+def read_log(path: str):
+    datagrams = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                t, peer, hex_data = line.split()
+                host, port = peer.rsplit(":", 1)
+                datagrams.append((float(t), (host, int(port)), bytes.fromhex(hex_data)))
+            except ValueError:
+                raise Exception(f"{path} line {line_no}: expected seconds, address and hex")
+    return datagrams
+
+def write_log(path: str, datagrams):
+    with open(path, "w") as f:
+        f.write("# seconds peer datagram\n")
+        for t, peer, data in datagrams:
+            f.write(f"{t:.6f} {peer[0]}:{peer[1]} {data.hex()}\n")
+
+# ---- Replay ----------------------------------------------------------------
+
+class Flow:
+    """
+    The datagrams of one peer address in one copy, sent from their own
+    socket.
+    """
+    def __init__(self, replay, copy: int, peer, family: int):
+        self.replay = replay
+        self.copy = copy
+        self.peer = peer
+        self.frames = collections.deque()
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        replay.loop.add_reader(self.sock, self.on_readable)
+        self.hdr = FrameHeader()
+        # What has been learned from the hub's replies: its call number
+        # for each of our (rewritten) source calls, the last token and the
+        # last challenge
+        self.server_calls = {}
+        self.token = None
+        self.challenge = None
+        # When the frame at the head started waiting for a reply, and the
+        # sequence number of the flow's entry in the replay's heap (any
+        # other entry for the flow is stale)
+        self.blocked_since = None
+        self.entry = -1
+
+    def on_readable(self):
+        replay = self.replay
+        while True:
+            try:
+                frame = self.sock.recv(2048)
+            except BlockingIOError:
+                return
+            except OSError:
+                # ICMP port unreachable when the hub isn't there
+                replay.send_errors += 1
+                continue
+            replay.received += 1
+            try:
+                hdr = parse_frame(frame, self.hdr)
+            except FrameFormatError:
+                continue
+            if not hdr.full:
+                continue
+            if hdr.key == CALLTOKEN_KEY:
+                self.token = find_information_element(frame, IE_CALLTOKEN, FULL_HEADER_SIZE)
+                if self.token is not None:
+                    self.token = bytes(self.token)
+            else:
+                self.server_calls[hdr.dest_call] = hdr.source_call
+                if hdr.key == AUTHREQ_KEY:
+                    challenge = find_information_element(frame, IE_CHALLENGE, FULL_HEADER_SIZE)
+                    if challenge is not None:
+                        self.challenge = bytes(challenge)
+            if self.blocked_since is not None:
+                # Have another go at the frame that was waiting
+                replay.schedule(self, monotonic_ms())
+
+    def rewrite(self, frame: bytes):
+        """
+        The frame as it should be sent now, or None if it depends on a
+        reply from the hub that hasn't come yet.
+        """
+        replay = self.replay
+        frame = bytearray(frame)
+        source_call = struct.unpack_from(">H", frame)[0] & 0x7fff
+        source_call = replay.rewrite_call(source_call, self.copy)
+        if not frame[0] & 0x80:
+            # Mini-frame
+            struct.pack_into(">H", frame, 0, source_call)
+            return frame
+        if len(frame) < FULL_HEADER_SIZE:
+            return frame
+        dest = struct.unpack_from(">H", frame, 2)[0]
+        key = (frame[10], frame[11])
+        if key == NEW_KEY:
+            token = find_information_element(frame, IE_CALLTOKEN, FULL_HEADER_SIZE)
+            if token is None or len(token) == 0:
+                # A fresh start: the earlier token and challenge are stale
+                self.token = None
+                self.challenge = None
+            else:
+                if self.token is None:
+                    return None
+                frame = self._replace_ie(frame, IE_CALLTOKEN, self.token)
+            struct.pack_into(">HH", frame, 0, source_call | 0x8000, dest)
+            return frame
+        if dest & 0x7fff:
+            server_call = self.server_calls.get(source_call)
+            if server_call is None:
+                return None
+            dest = (dest & 0x8000) | server_call
+        if key == AUTHREP_KEY and replay.key is not None:
+            if self.challenge is None:
+                return None
+            signature = replay.key.sign(self.challenge, padding.PKCS1v15(), hashes.SHA1())
+            frame = self._replace_ie(frame, IE_RSA_RESULT, base64.b64encode(signature))
+        struct.pack_into(">HH", frame, 0, source_call | 0x8000, dest)
+        return frame
+
+    def _replace_ie(self, frame, ie_id: int, content: bytes):
+        ies = { k: bytes(v) for k, v in decode_information_elements(frame,
+            FULL_HEADER_SIZE).items() }
+        ies[ie_id] = content
+        return frame[:FULL_HEADER_SIZE] + encode_information_elements(ies)
+
+class Replay:
+
+    def __init__(self, args, datagrams):
+        self.address = (args.host, args.port)
+        self.speed = args.speed
+        self.stagger_ms = args.stagger
+        self.call_stride = args.call_stride
+        self.gate_timeout_ms = args.gate_timeout * 1000
+        self.key = None
+        if args.key is not None:
+            with open(args.key, "rb") as f:
+                self.key = serialization.load_pem_private_key(f.read(), None)
+        self.loop = EventLoop(monotonic_ms)
+        family = socket.getaddrinfo(args.host, args.port, type=socket.SOCK_DGRAM)[0][0]
+        self.flows = []
+        for copy in range(args.copies):
+            flows = {}
+            for t, peer, data in datagrams:
+                flow = flows.get(peer)
+                if flow is None:
+                    flow = flows[peer] = Flow(self, copy, peer, family)
+                    self.flows.append(flow)
+                flow.frames.append((t, data))
+        self.total = len(datagrams) * args.copies
+        # (due ms, sequence, flow) for the flows that have a frame ready
+        self._heap = []
+        self._seq = 0
+        self._timer = None
+        self.start_ms = 0.0
+        self.sent = 0
+        self.received = 0
+        self.gave_up = 0
+        self.send_errors = 0
+        self.lateness = Histogram("lateness", "Send lateness", TICK_BOUNDS_NS)
+
+    def rewrite_call(self, call: int, copy: int):
+        # Call numbers are 15 bits and 0 isn't used
+        return (call - 1 + copy * self.call_stride) % 0x7fff + 1
+
+    def due_ms(self, flow: Flow):
+        if self.speed == 0:
+            return 0.0
+        t = flow.frames[0][0]
+        return self.start_ms + t * 1000.0 / self.speed + flow.copy * self.stagger_ms
+
+    def schedule(self, flow: Flow, not_before_ms: float = 0.0):
+        if not flow.frames:
+            return
+        self._push(flow, max(self.due_ms(flow), not_before_ms))
+
+    def _push(self, flow: Flow, due: float):
+        flow.entry = self._seq
+        heapq.heappush(self._heap, (due, self._seq, flow))
+        self._seq += 1
+        self._wake(due)
+
+    def _wake(self, due: float):
+        # One timer, for the earliest frame
+        if self._timer is not None:
+            if self._timer.deadline <= due:
+                return
+            self._timer.cancel()
+        self._timer = self.loop.call_at(due, self.on_timer)
+
+    def on_timer(self):
+        self._timer = None
+        heap = self._heap
+        now = monotonic_ms()
+        # As fast as possible still gives the replies a look in now and
+        # then, so that gated flows can move on
+        budget = 256
+        while heap and heap[0][0] <= now and budget > 0:
+            due, seq, flow = heapq.heappop(heap)
+            if seq != flow.entry:
+                continue
+            budget -= 1
+            frame = flow.rewrite(flow.frames[0][1])
+            if frame is None:
+                if flow.blocked_since is None:
+                    flow.blocked_since = now
+                if now - flow.blocked_since < self.gate_timeout_ms:
+                    # on_readable() puts it back when a reply comes. This
+                    # is the fallback if the one it needs never does.
+                    self._push(flow, flow.blocked_since + self.gate_timeout_ms)
+                    continue
+                # Give up on the reply and skip the frame
+                flow.blocked_since = None
+                flow.frames.popleft()
+                self.gave_up += 1
+                self.schedule(flow, now)
+                continue
+            flow.blocked_since = None
+            if self.speed != 0:
+                self.lateness.observe(max(int((now - due) * 1000000), 0))
+            try:
+                flow.sock.sendto(frame, self.address)
+                self.sent += 1
+            except OSError:
+                # The socket buffer is full (as fast as possible)
+                self.send_errors += 1
+            flow.frames.popleft()
+            self.schedule(flow, now)
+        if heap:
+            self._wake(heap[0][0] if budget > 0 else now)
+
+    def run(self):
+        self.start_ms = monotonic_ms()
+        for flow in self.flows:
+            self.schedule(flow)
+        while self._heap:
+            self.loop.run_once()
+        elapsed_ms = monotonic_ms() - self.start_ms
+        # Collect the last replies
+        end_ms = monotonic_ms() + 250
+        self.loop.call_at(end_ms, lambda: None)
+        while monotonic_ms() < end_ms:
+            self.loop.run_once()
+        self.report(elapsed_ms)
+
+    def report(self, elapsed_ms: float):
+        rate = self.sent * 1000.0 / elapsed_ms if elapsed_ms > 0 else 0.0
+        print(f"Sent {self.sent} of {self.total} datagrams from {len(self.flows)} sockets "
+            f"in {elapsed_ms / 1000.0:.2f} s ({rate:.0f}/s), received {self.received}")
+        if self.gave_up or self.send_errors:
+            print(f"Skipped {self.gave_up} waiting for the hub, {self.send_errors} send errors")
+        if self.speed != 0:
+            print("Send lateness ms:", self.lateness.format())
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays IAX2 traffic against a hub")
+    parser.add_argument("capture", help="pcap file or datagram log")
+    parser.add_argument("--host", default="127.0.0.1", help="hub address")
+    parser.add_argument("--port", type=int, default=4569, help="hub IAX2 port")
+    parser.add_argument("--server-port", type=int, default=4569,
+        help="the hub's port in the capture")
+    parser.add_argument("--speed", type=float, default=1.0,
+        help="1 is real time, N is N times faster, 0 is as fast as possible")
+    parser.add_argument("--copies", type=int, default=1, help="concurrent copies of the capture")
+    parser.add_argument("--stagger", type=float, default=20.0,
+        help="ms between the starts of the copies")
+    parser.add_argument("--call-stride", type=int, default=1000,
+        help="how far each copy's call numbers are moved up")
+    parser.add_argument("--gate-timeout", type=float, default=2.0,
+        help="seconds to wait for a reply that a frame depends on")
+    parser.add_argument("--key", help="RSA private key to sign AUTHREP challenges with")
+    parser.add_argument("--dump", help="write the datagrams to a log file and exit")
+    args = parser.parse_args()
+    if args.speed < 0 or args.copies < 1:
+        raise Exception("The speed can't be negative and there must be at least one copy")
+
+    with open(args.capture, "rb") as f:
+        head = f.read(4)
+    if len(head) == 4 and (struct.unpack("<I", head)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or
+        struct.unpack(">I", head)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS)):
+        datagrams = read_pcap(args.capture, args.server_port)
+    else:
+        datagrams = read_log(args.capture)
+    if args.dump:
+        write_log(args.dump, datagrams)
+        print(f"Wrote {len(datagrams)} datagrams to {args.dump}")
+        return
+    if not datagrams:
+        raise Exception("No datagrams to the hub in " + args.capture)
+    Replay(args, datagrams).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Load generator for checking how the hub scales with worker processes.
+#
+# Each client socket (a distinct source port, so a distinct 4-tuple for
+# the kernel's SO_REUSEPORT hash) sets up a call as far as the AUTHREQ
+# and then keeps one PING outstanding at a time. Every PONG triggers the
+# next PING, so the total PONG rate is the rate at which the hub is
+# turning frames around.
+#
+# To see the scaling:
+#
+# 1. Set workers = 1 in asl-hub-server-2.py and start it with the
+#    diagnostics thrown away:
+#
+#        python asl-hub-server-2.py > /dev/null
+#
+# 2. Run this script from the net-test directory and note the PONG rate:
+#
+#        python reuseport-1.py [processes] [sockets per process] [seconds]
+#
+# 3. Repeat with workers = 2, 4, ... (and workers_load_test = True) up
+#    to the number of cores. Leave enough cores for this script (one 
+#    process per core it uses).
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import multiprocessing
+import selectors
+import socket
+import sys
+import time
+sys.path.append("..")
+from iax2 import parse_frame, make_frame_header, find_information_element, \
+    encode_information_elements
+from iax2 import FRAME_TYPE_IAX, IAX_NEW, IAX_PING, IAX_PONG, IAX_AUTHREQ, \
+    IAX_CALLTOKEN, IE_CALLTOKEN, FULL_HEADER_SIZE
+
+SERVER = ("127.0.0.1", 4569)
+
+def client(index, sockets_per_process, duration_s, results):
+    sel = selectors.DefaultSelector()
+    calls = []
+    for i in range(0, sockets_per_process):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.settimeout(2)
+        source_call = (index * sockets_per_process + i) % 32767 + 1
+        # NEW -> CALLTOKEN -> NEW with token -> ACK + AUTHREQ
+        s.sendto(make_frame_header(source_call, 0, 0, 0, 0, FRAME_TYPE_IAX, IAX_NEW), SERVER)
+        frame = s.recv(1024)
+        hdr = parse_frame(frame)
+        assert hdr.key == (FRAME_TYPE_IAX, IAX_CALLTOKEN)
+        token = bytes(find_information_element(frame, IE_CALLTOKEN, FULL_HEADER_SIZE))
+        s.sendto(make_frame_header(source_call, 0, 0, 0, 0, FRAME_TYPE_IAX, IAX_NEW) +
+            encode_information_elements({ IE_CALLTOKEN: token }), SERVER)
+        while True:
+            hdr = parse_frame(s.recv(1024))
+            if hdr.key == (FRAME_TYPE_IAX, IAX_AUTHREQ):
+                break
+        s.setblocking(False)
+        # [socket, source call, dest call, outseq, inseq]
+        call = [s, source_call, hdr.source_call, 1, (hdr.outseq + 1) % 256]
+        calls.append(call)
+        sel.register(s, selectors.EVENT_READ, call)
+
+    def ping(call):
+        s, source_call, dest_call, outseq, inseq = call
+        s.sendto(make_frame_header(source_call, dest_call, 0, outseq, inseq,
+            FRAME_TYPE_IAX, IAX_PING), SERVER)
+        call[3] = (outseq + 1) % 256
+
+    pongs = 0
+    start = time.time()
+    end = start + duration_s
+    for call in calls:
+        ping(call)
+    while time.time() < end:
+        events = sel.select(0.5)
+        if not events:
+            # Something got lost, prime everything again
+            for call in calls:
+                ping(call)
+        for key, _ in events:
+            call = key.data
+            try:
+                frame = call[0].recv(1024)
+            except BlockingIOError:
+                continue
+            hdr = parse_frame(frame)
+            call[4] = (hdr.outseq + 1) % 256
+            if hdr.key == (FRAME_TYPE_IAX, IAX_PONG):
+                pongs += 1
+                ping(call)
+    results.put(pongs / (time.time() - start))
+
+if __name__ == "__main__":
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    sockets_per_process = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    duration_s = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client,
+        args=(i, sockets_per_process, duration_s, results)) for i in range(0, processes)]
+    for p in procs:
+        p.start()
+    total = sum(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    print("Calls", processes * sockets_per_process, "PONGs/s", round(total))
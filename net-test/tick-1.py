@@ -0,0 +1,64 @@
+# Timing of the 20ms tick (see mediaclock.py). The tick does a few ms of
+# work and every second the loop is stalled for 70ms (a long GC pause, a
+# slow callback, etc.). Reported for each late-tick policy: the lateness
+# histogram, the skipped ticks, the longest run of back to back ticks,
+# and the drift of the tick count from the clock over the run. BURST is
+# also run with 12ms ticks, where a burst takes longer than a period and
+# the timer is already due again when it is set. The burst must still
+# stop at max_burst catch-up ticks.
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import sys
+import time
+sys.path.append("..")
+from eventloop import EventLoop
+from mediaclock import monotonic_ms, TickScheduler, SKIP, BURST
+
+DURATION_MS = 5000
+
+def busy(ms):
+    end = time.monotonic_ns() + ms * 1000000
+    while time.monotonic_ns() < end:
+        pass
+
+def run(policy, work_ms=2):
+    loop = EventLoop(monotonic_ms)
+    ticks = []
+
+    def on_tick():
+        ticks.append((monotonic_ms(), ticker.tick_ms))
+        busy(work_ms)
+
+    def on_stall():
+        busy(70)
+        loop.call_later(1000, on_stall)
+
+    max_burst = 2
+    ticker = TickScheduler(loop, 20, on_tick, policy, max_burst=max_burst)
+    start_ms = monotonic_ms()
+    ticker.start(start_ms)
+    loop.call_later(500, on_stall)
+    while monotonic_ms() - start_ms < DURATION_MS:
+        loop.run_once()
+    ticker.stop()
+
+    # The longest run of ticks that each started a whole period or more
+    # after their deadline, i.e. were run back to back to catch up
+    longest = run_length = 0
+    for start_ms, tick_ms in ticks:
+        run_length = run_length + 1 if start_ms - tick_ms >= 20 else 0
+        longest = max(longest, run_length)
+    # The tick times must stay on the 20ms grid from the start
+    assert all((t - ticks[0][1]) % 20 == 0 for _, t in ticks)
+    if policy == BURST:
+        # The late tick itself plus the catch-up ticks
+        assert longest <= 1 + max_burst
+    expected = DURATION_MS // 20
+    print(f"{policy} ({work_ms}ms ticks): ticks {len(ticks)} skipped {ticker.skipped} "
+        f"(ran + skipped - expected {len(ticks) + ticker.skipped - expected}) "
+        f"longest burst {longest}")
+    print("  lateness", ticker.lateness.format())
+
+run(SKIP)
+run(BURST)
+run(BURST, 12)
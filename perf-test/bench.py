@@ -0,0 +1,334 @@
+# Microbenchmarks for the codec, DSP and framing primitives on the audio
+# path, run on synthetic data. For each one it reports the time per call
+# (the best of several rounds, in ns, less the cost of the call), how
+# many calls (frames) per second that is, and the time relative to a 
+# reference workload timed alongside it.
+#
+# Where there is one, the code the original server ran for the same job
+# is timed alongside as <name>_original.
+#
+# Usage:
+#
+#   python3 bench.py                 Compare against the saved baseline
+#   python3 bench.py --save          Save the results as the new baseline
+#   python3 bench.py ulaw frame      Only the benchmarks whose names
+#                                    contain one of the words
+#
+# The baseline is kept in baselines/<host name>.json since the numbers
+# only mean something on the machine they came from. A benchmark whose
+# relative time is more than --tolerance (default 25%) over its baseline
+# is a regression and the script exits with status 1, so it can gate a
+# change. Save a new baseline after a change that is meant to be faster.
+#
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import struct
+import numpy as np
+from scipy.signal import firwin, lfilter, lfilter_zi
+try:
+    # What the original server used for u-law. It's gone from Python 3.13.
+    import audioop
+except ImportError:
+    audioop = None
+sys.path.append("..")
+from g711 import ulaw_encode, ulaw_decode
+from dsp import Upsampler, Downsampler, make_s16_le, ASL_LPF_TAPS, ASL_LPF_SHIFT
+from iax2 import make_frame_header, make_VOICE_miniframe, make_VOICE_frame, \
+    decode_information_elements, find_information_element, parse_frame, \
+    is_full_frame, is_mini_voice_packet, is_NEW_frame, is_ACK_frame, \
+    is_HANGUP_frame, is_LAGRQ_frame, is_PING_frame, is_VOICE_frame, \
+    FrameBuilder, FrameHeader, FULL_HEADER_SIZE, IE_USERNAME
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# ---- Synthetic data --------------------------------------------------------
+
+rng = np.random.default_rng(1)
+pcm_8k = rng.integers(-12000, 12000, 160).astype(np.int16)
+pcm_48k = rng.integers(-12000, 12000, 960).astype(np.int16)
+pcm_48k_wide = pcm_48k.astype(np.int32) * 3
+ulaw_8k = ulaw_encode(pcm_8k)
+ulaw_bytes = ulaw_8k.tobytes()
+s16_out = np.zeros(960, dtype='<i2')
+pcm_out = np.zeros(160, dtype=np.int16)
+ulaw_out = np.zeros(160, dtype=np.uint8)
+# The float filters are built the way asl-hub-server-2.py builds them
+sample_rate = 48000
+nyq_rate = sample_rate / 2.0
+lpf_cutoff_hz = 4300
+lpf_N = 31
+lpf_beta = 3.0
+lpf_taps = firwin(lpf_N, lpf_cutoff_hz / nyq_rate, window=('kaiser', lpf_beta))
+upsampler = Upsampler(lpf_taps, 6)
+downsampler = Downsampler(lpf_taps, 6)
+upsampler_fixed = Upsampler(ASL_LPF_TAPS, 6, shift=ASL_LPF_SHIFT)
+downsampler_fixed = Downsampler(ASL_LPF_TAPS, 6, shift=ASL_LPF_SHIFT)
+tx = FrameBuilder()
+authreq = bytes(tx.authreq(1, 2, 1000, 0, 1, "123456789"))
+voice_frame = bytes(make_VOICE_frame(1, 2, 1000, 3, 4, ulaw_bytes))
+mini_frame = bytes(make_VOICE_miniframe(1, 1000, ulaw_bytes))
+hdr = FrameHeader()
+
+# ---- The original implementations -----------------------------------------
+#
+# As they were in asl-hub-server-2.py before the audio path was reworked
+
+def classify(frame):
+    # The chain the original server ran on every frame
+    return is_NEW_frame(frame) or is_ACK_frame(frame) or is_HANGUP_frame(frame) or \
+        is_LAGRQ_frame(frame) or is_PING_frame(frame) or is_VOICE_frame(frame)
+
+us_lpf_zi = lfilter_zi(lpf_taps, [1])
+
+def upsample_original(pcm_data_8k):
+    global us_lpf_zi
+    pcm_data_48k = []
+    for s in pcm_data_8k:
+        for i in range(0,6):
+            pcm_data_48k.append(s)
+    pcm_data_48k, us_lpf_zi = lfilter(lpf_taps, [1.0], pcm_data_48k, zi=us_lpf_zi)
+    return pcm_data_48k
+
+ds_lpf_zi = lfilter_zi(lpf_taps, [1])
+
+def downsample_original(pcm_data_48k):
+    global ds_lpf_zi
+    pcm_data_48k, ds_lpf_zi = lfilter(lpf_taps, [1.0], pcm_data_48k, zi=ds_lpf_zi)
+    pcm_data_8k = []
+    i = 0
+    for j in range(0, 160):
+        pcm_data_8k.append(pcm_data_48k[i])
+        i += 6
+    return pcm_data_8k
+
+def make_s16_le_original(data):
+    result = bytearray()
+    for d in data:
+        i = int(d) 
+        low = i & 0xff
+        high = (i >> 8) & 0xff
+        result.append(low)
+        result.append(high)
+    return result
+
+def encode_ulaw_original(pcm_data):
+    return audioop.lin2ulaw(pcm_data, 2)
+
+def decode_ulaw_original(g711_data: bytes):
+    b = audioop.ulaw2lin(g711_data, 2)
+    return struct.unpack(f'<{160}h', b)
+
+def make_frame_header_original(source_call: int, dest_call: int, timestamp: int, 
+    out_seq: int, in_seq: int, frame_type: int, frame_subclass: int):
+    result = bytearray()
+    result += source_call.to_bytes(2, byteorder='big')
+    result[0] = result[0] | 0b10000000
+    result += dest_call.to_bytes(2, byteorder='big')
+    result[2] = result[2] & 0b01111111
+    result += timestamp.to_bytes(4, byteorder='big')
+    result += out_seq.to_bytes(1, byteorder='big')
+    result += in_seq.to_bytes(1, byteorder='big')
+    result += int(frame_type).to_bytes(1, byteorder='big')
+    result += int(frame_subclass).to_bytes(1, byteorder='big')
+    return result
+
+def make_VOICE_miniframe_original(source_call: int, timestamp: int, audio_data: bytes):
+    result = bytearray()
+    result += source_call.to_bytes(2, byteorder='big')
+    result[0] = result[0] & 0b01111111
+    full_32bit_stamp = timestamp.to_bytes(4, byteorder='big')
+    result.append(full_32bit_stamp[2])
+    result.append(full_32bit_stamp[3])
+    result += audio_data
+    return result
+
+def decode_information_elements_original(data: bytes):
+    result = dict()
+    state = 0
+    working_id = 0
+    working_length = 0
+    working_data = None
+    for b in data:
+        if state == 0:
+            working_id = b
+            state = 1
+        elif state == 1:
+            working_length = b 
+            working_data = bytearray()
+            if working_length == 0:
+                result[working_id] = working_data
+                state = 0
+            else:
+                state = 2
+        elif state == 2:
+            working_data.append(b)
+            if len(working_data) == working_length:
+                result[working_id] = working_data
+                state = 0
+        else:
+            raise Exception()
+    if state != 0:
+        raise Exception("Data format error")
+    return result
+
+def parse_header_original(frame):
+    # The get_full_*() accessors the original handlers called one by one
+    source_call = ((frame[0] & 0b01111111) << 8) | frame[1]
+    dest_call = ((frame[2] & 0b01111111) << 8) | frame[3]
+    timestamp = (frame[4] << 24) | (frame[5] << 16) | (frame[6] << 8) | frame[7]
+    return source_call, dest_call, timestamp, frame[8], frame[9], frame[10], \
+        frame[11] & 0b01111111
+
+# name -> function that does one "frame" of work
+BENCHMARKS = {
+    "encode_ulaw": lambda: ulaw_encode(pcm_8k),
+    "encode_ulaw_out": lambda: ulaw_encode(pcm_8k, out=ulaw_out),
+    "decode_ulaw": lambda: ulaw_decode(ulaw_8k),
+    "decode_ulaw_out": lambda: ulaw_decode(ulaw_8k, out=pcm_out),
+    "upsample": lambda: upsampler.process(pcm_8k),
+    "upsample_fixed": lambda: upsampler_fixed.process(pcm_8k),
+    "upsample_original": lambda: upsample_original(pcm_8k),
+    "downsample": lambda: downsampler.process(pcm_48k),
+    "downsample_fixed": lambda: downsampler_fixed.process(pcm_48k),
+    "downsample_original": lambda: downsample_original(pcm_48k),
+    "make_s16_le": lambda: make_s16_le(pcm_48k_wide),
+    "make_s16_le_out": lambda: make_s16_le(pcm_48k_wide, s16_out),
+    "make_s16_le_original": lambda: make_s16_le_original(pcm_48k_wide),
+    "make_frame_header": lambda: make_frame_header(1, 2, 1000, 3, 4, 2, 4),
+    "make_frame_header_original": lambda: make_frame_header_original(1, 2, 1000, 3, 4, 2, 4),
+    "make_VOICE_miniframe": lambda: make_VOICE_miniframe(1, 1000, ulaw_bytes),
+    "make_VOICE_miniframe_original": lambda: make_VOICE_miniframe_original(1, 1000,
+        ulaw_bytes),
+    "frame_builder_mini": lambda: tx.mini(1, 1000),
+    "frame_builder_ack": lambda: tx.ack(1, 2, 1000, 3, 4),
+    "decode_information_elements": lambda: decode_information_elements(authreq,
+        FULL_HEADER_SIZE),
+    "decode_information_elements_original": lambda: decode_information_elements_original(
+        authreq[FULL_HEADER_SIZE:]),
+    "find_information_element": lambda: find_information_element(authreq, IE_USERNAME,
+        FULL_HEADER_SIZE),
+    "is_full_frame": lambda: is_full_frame(voice_frame),
+    "is_mini_voice_packet": lambda: is_mini_voice_packet(mini_frame),
+    "is_VOICE_frame": lambda: is_VOICE_frame(voice_frame),
+    "is_frame_chain": lambda: classify(voice_frame),
+    "parse_frame_full": lambda: parse_frame(voice_frame, hdr),
+    "parse_frame_mini": lambda: parse_frame(mini_frame, hdr),
+    "parse_frame_full_original": lambda: parse_header_original(voice_frame),
+}
+if audioop is not None:
+    BENCHMARKS["encode_ulaw_original"] = lambda: encode_ulaw_original(pcm_8k.tobytes())
+    BENCHMARKS["decode_ulaw_original"] = lambda: decode_ulaw_original(ulaw_bytes)
+
+def calibrate(f, min_time_s: float = 0.02):
+    """
+    How many calls of f take at least min_time_s.
+    """
+    count = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            f()
+        if time.perf_counter_ns() - start >= min_time_s * 1e9:
+            return count
+        count *= 2
+
+def time_calls(f, count: int):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        f()
+    return (time.perf_counter_ns() - start) / count
+
+def reference():
+    # A fixed mix of interpreter and NumPy work that stands in for the
+    # speed of the machine at the moment
+    total = 0
+    for i in range(200):
+        total += i
+    np.dot(pcm_8k, pcm_8k)
+    return total
+
+def measure(benchmarks: dict, rounds: int = 15):
+    """
+    Returns { name: (ns, relative) }. ns is the best time per call of 
+    each benchmark with the cost of the loop and the call itself taken 
+    off. relative is the median over the rounds of the time relative to
+    reference() timed in the same round.
+
+    The speed of a VM can easily swing by 50% from one second to the 
+    next, which swamps any change in the code, so the regression check 
+    uses relative. The rounds go round robin through all of the 
+    benchmarks so that a slow spell hurts one round of each rather than 
+    every round of one.
+    """
+    def empty():
+        pass
+    counts = { name: calibrate(f) for name, f in benchmarks.items() }
+    empty_count = calibrate(empty)
+    ref_count = calibrate(reference)
+    best = { name: float("inf") for name in benchmarks }
+    ratios = { name: [] for name in benchmarks }
+    overhead = float("inf")
+    for _ in range(rounds):
+        overhead = min(overhead, time_calls(empty, empty_count))
+        for name, f in benchmarks.items():
+            ref_ns = time_calls(reference, ref_count)
+            ns = time_calls(f, counts[name])
+            best[name] = min(best[name], ns)
+            ratios[name].append(ns / ref_ns)
+    return { name: (max(best[name] - overhead, 1.0), float(np.median(ratios[name])))
+        for name in benchmarks }
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the audio path")
+    parser.add_argument("names", nargs="*", help="only run benchmarks containing these words")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+        help="how much slower than the baseline is a regression (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR,
+        platform.node() + ".json"), help="baseline file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    selected = { name: f for name, f in BENCHMARKS.items() 
+        if not args.names or any(word in name for word in args.names) }
+    results = measure(selected)
+    regressions = []
+    print(f"{'benchmark':38s} {'ns/frame':>10s} {'frames/s':>12s} {'relative':>10s} "
+        f"{'baseline':>10s} {'change':>8s}")
+    for name, (ns, relative) in results.items():
+        line = f"{name:38s} {ns:10.0f} {1e9 / ns:12.0f} {relative:10.4f}"
+        if name in baseline:
+            change = relative / baseline[name]["relative"] - 1.0
+            line += f" {baseline[name]['relative']:10.4f} {change * 100:+7.1f}%"
+            if change > args.tolerance:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        # Keep the baseline of any benchmark that wasn't run this time
+        for name, (ns, relative) in results.items():
+            baseline[name] = { "ns": ns, "relative": relative }
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Saved baseline", args.baseline)
+    elif not baseline:
+        print("No baseline yet, run with --save to make one")
+
+    if regressions and not args.save:
+        print(f"{len(regressions)} regression(s):", ", ".join(regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Periodic registration with the AllStarLink registration server, done
+# on a background thread so that a slow or unreachable server can't
+# stall the audio or the IAX2 handling.
+#
+import random
+import threading
+import requests
+
+class Registrar(threading.Thread):
+    """
+    Posts msg to url every interval_ms. A keep-alive session is reused
+    between posts and every post has a connect and a read timeout (in
+    seconds).
+
+    A failed post is retried with exponential backoff and full jitter:
+    the n'th retry waits a random time between 0 and retry_base_s * 2^n,
+    capped at the normal interval.
+
+    The result of every attempt is handed to callback(ok, text) on the
+    event loop thread (through loop.call_soon_threadsafe()). text is the
+    response body, or the error.
+    """
+    def __init__(self, url: str, msg, interval_ms: int, loop, callback,
+        connect_timeout_s: float = 5.0, read_timeout_s: float = 10.0,
+        retry_base_s: float = 2.0):
+        super().__init__(name="registration", daemon=True)
+        self.url = url
+        self.msg = msg
+        self.interval_s = interval_ms / 1000.0
+        self.loop = loop
+        self.callback = callback
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.retry_base_s = retry_base_s
+        self.session = requests.Session()
+        # Stats for the operator
+        self.successes = 0
+        self.failures = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def register(self):
+        """
+        One attempt. Returns (ok, text).
+        """
+        try:
+            response = self.session.post(self.url, json=self.msg, timeout=self.timeout)
+            response.raise_for_status()
+            return True, response.text
+        except requests.RequestException as ex:
+            return False, str(ex)
+
+    def _publish(self, ok: bool, text: str):
+        self.loop.call_soon_threadsafe(lambda: self.callback(ok, text))
+
+    def run(self):
+        retries = 0
+        while not self._stop_event.is_set():
+            ok, text = self.register()
+            self._publish(ok, text)
+            if ok:
+                self.successes += 1
+                retries = 0
+                delay_s = self.interval_s
+            else:
+                self.failures += 1
+                delay_s = random.uniform(0, min(self.interval_s,
+                    self.retry_base_s * (2 ** retries)))
+                retries += 1
+            self._stop_event.wait(delay_s)
+        self.session.close()
@@ -0,0 +1,117 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Single-producer/single-consumer ring of fixed-size audio blocks used 
+# to pass audio between the protocol loop and the audio thread.
+#
+# There are no locks. The producer only ever moves the write counter 
+# and the consumer only ever moves the read counter, and each counter is
+# only moved after the block it covers has been filled (or used up). An
+# int attribute store is atomic under the GIL, so the other side always
+# sees a consistent count. The counters run freely and are reduced 
+# modulo the capacity when indexing.
+#
+import numpy as np
+
+class BlockRing:
+    """
+    Fixed-capacity SPSC ring of blocks, each block_size samples. All of
+    the storage is allocated up front.
+
+    The producer calls write_block() to get the next free block, fills 
+    it in place, and then calls commit(). The consumer calls read_block()
+    to get the oldest block, uses it, and then calls release(). put() 
+    and get() are copying shortcuts for the same thing.
+    """
+    def __init__(self, capacity: int, block_size: int, dtype = np.int16):
+        self.capacity = capacity
+        self.block_size = block_size
+        self._blocks = np.zeros((capacity, block_size), dtype=dtype)
+        self._write = 0
+        self._read = 0
+        # The deepest the ring has been (seen by the producer)
+        self.high_water = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    # ---- Producer side -----------------------------------------------------
+
+    def write_block(self):
+        """
+        The next free block, or None if the ring is full.
+        """
+        if self._write - self._read >= self.capacity:
+            return None
+        return self._blocks[self._write % self.capacity]
+
+    def commit(self):
+        self._write += 1
+        depth = self._write - self._read
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def put(self, data):
+        """
+        Copies a block in. Returns False (and drops the block) if the 
+        ring is full.
+        """
+        block = self.write_block()
+        if block is None:
+            return False
+        block[:] = data
+        self.commit()
+        return True
+
+    # ---- Consumer side -----------------------------------------------------
+
+    def read_block(self):
+        """
+        The oldest block, or None if the ring is empty. The block stays
+        valid until release() is called.
+        """
+        if self._write == self._read:
+            return None
+        return self._blocks[self._read % self.capacity]
+
+    def peek(self, n: int):
+        """
+        The n'th oldest block (0 is the same as read_block()), or None if
+        there aren't that many.
+        """
+        if self._write - self._read <= n:
+            return None
+        return self._blocks[(self._read + n) % self.capacity]
+
+    def release(self):
+        self._read += 1
+
+    def get(self, out):
+        """
+        Copies the oldest block into out. Returns False if the ring is 
+        empty.
+        """
+        block = self.read_block()
+        if block is None:
+            return False
+        out[:] = block
+        self.release()
+        return True
@@ -0,0 +1,93 @@
+# AllStartLink Hub Demonstration Program
+# Copyright (C) 2025, Bruce MacKinnon KC1FSZ
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# FOR AMATEUR RADIO USE ONLY.
+# NOT FOR COMMERCIAL USE WITHOUT PERMISSION.
+#
+# Overview
+# --------
+# Multi-process worker support. A single Python process is limited to 
+# one core by the GIL, so the hub can fork several workers that each 
+# bind the IAX2 port with SO_REUSEPORT. The kernel hashes the 4-tuple 
+# (peer address/port, our address/port) of every datagram onto one of 
+# the sockets, so all of the traffic from a given peer lands on the same
+# worker and that worker owns the peer's calls. The call number space is
+# split between the workers so that two workers never hand out the same
+# number.
+#
+import os
+import signal
+import socket
+import sys
+from hub import MAX_CALL_NUMBER
+
+def call_number_range(worker_index: int, workers: int):
+    """
+    The (first, last) call numbers that a worker may hand out.
+    """
+    span = MAX_CALL_NUMBER // workers
+    first = worker_index * span + 1
+    return first, first + span - 1
+
+def make_reuseport_socket(ip: str, port: int):
+    """
+    A non-blocking UDP socket bound with SO_REUSEPORT so that every 
+    worker can bind the same port.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((ip, port))
+    sock.setblocking(False)
+    return sock
+
+def fork_workers(workers: int):
+    """
+    Forks the worker processes and returns the worker index (0 to 
+    workers - 1) in each of them. The original process becomes the 
+    supervisor and never returns: it waits for the workers, and if any
+    one of them exits (or the supervisor is interrupted) it stops the 
+    rest and exits.
+
+    This must be called before any sockets, audio devices or threads 
+    are created.
+    """
+    pids = {}
+    for worker_index in range(0, workers):
+        pid = os.fork()
+        if pid == 0:
+            return worker_index
+        pids[pid] = worker_index
+
+    print("Supervisor started", workers, "workers")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        pid, status = os.wait()
+        print("Worker", pids.pop(pid), "exited with status", 
+            os.waitstatus_to_exitcode(status))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    sys.exit(0)